@@ -0,0 +1,121 @@
+# Ahead-of-time compiler: machine-code program -> cached Python module
+#
+# Every statically known block of the program is translated with BlockTranslator
+# and written to one module under compiled_programs/, named after a hash of the
+# program text. Later runs of the same program import that module (Python keeps
+# the compiled .pyc next to it) instead of decoding and dispatching again.
+#
+# Usage: python3 AheadOfTimeCompiler.py machine_code_file [machine_code_file ...]
+
+import os
+import sys
+
+# hashlib, importlib, py_compile and BlockTranslator are imported where they
+# are used: a run whose program was never compiled only looks for the cache
+
+# Bump whenever the generated code changes so stale cache entries are never used
+COMPILED_MODULE_FORMAT_VERSION = 5
+COMPILED_PROGRAM_CACHE_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'compiled_programs')
+
+def clean_program_lines(instruction_list):
+    """Program lines without surrounding whitespace or blank lines, as the decoder sees them"""
+    cleaned_lines = []
+    for instruction_line in instruction_list:
+        stripped_line = instruction_line.strip()
+        if stripped_line:
+            cleaned_lines.append(stripped_line)
+    return cleaned_lines
+
+def compute_program_hash(instruction_list):
+    """Content hash that keys the cache; .bin / hex images are keyed by their words"""
+    import hashlib
+    if not isinstance(instruction_list, (list, tuple)):
+        program_bytes = f"v{COMPILED_MODULE_FORMAT_VERSION}\nimage\n".encode() + instruction_list.astype('<u4').tobytes()
+        return hashlib.sha256(program_bytes).hexdigest()
+    program_text = f"v{COMPILED_MODULE_FORMAT_VERSION}\n" + "\n".join(clean_program_lines(instruction_list))
+    return hashlib.sha256(program_text.encode()).hexdigest()
+
+def get_compiled_module_path(program_hash, cache_directory=COMPILED_PROGRAM_CACHE_DIRECTORY):
+    return os.path.join(cache_directory, f"program_{program_hash[:32]}.py")
+
+def generate_program_module_source(decoded_program, program_hash):
+    """Source of a module holding one function per static block plus a PC -> block table"""
+    from BlockTranslator import BlockTranslator
+    block_translator = BlockTranslator(decoded_program, None, None)
+    module_lines = [
+        "# Generated by AheadOfTimeCompiler.py -- do not edit",
+        f"# Program hash: {program_hash}",
+        "",
+        "# Placeholders; the loader rebinds each block's defaults to the simulator's own",
+        'HALT = "HALT"',
+        'format_trace_line = ("0b{:032b} " * 33 + "\\n").format',
+        "",
+    ]
+    block_names = {}
+    for block_leader in block_translator.find_static_block_leaders():
+        block_source = block_translator.generate_block_source(block_leader)
+        if block_source is None:
+            continue
+        module_lines.append(block_source)
+        block_names[block_leader] = f"block_0x{block_leader:08X}"
+
+    module_lines.append("TRANSLATED_BLOCKS = {")
+    for block_leader, block_name in block_names.items():
+        module_lines.append(f"    {block_leader}: {block_name},")
+    module_lines.append("}")
+    return "\n".join(module_lines) + "\n"
+
+def compile_program(instruction_list, decoded_program, cache_directory=COMPILED_PROGRAM_CACHE_DIRECTORY):
+    """Write (or reuse) the compiled module for a program and return its path"""
+    program_hash = compute_program_hash(instruction_list)
+    module_path = get_compiled_module_path(program_hash, cache_directory)
+    if os.path.exists(module_path):
+        return module_path
+
+    os.makedirs(cache_directory, exist_ok=True)
+    module_source = generate_program_module_source(decoded_program, program_hash)
+
+    # Write to a temporary name first so a concurrent run never imports half a file
+    temporary_path = f"{module_path}.{os.getpid()}.tmp"
+    with open(temporary_path, "w") as module_file:
+        module_file.write(module_source)
+    os.replace(temporary_path, module_path)
+
+    import py_compile
+    py_compile.compile(module_path)
+    return module_path
+
+def load_compiled_program(instruction_list, format_trace_line, halt_signal, cache_directory=COMPILED_PROGRAM_CACHE_DIRECTORY):
+    """Translated blocks (PC -> function) from the cached module, or None if the program was never compiled"""
+    if not os.path.isdir(cache_directory):
+        return None
+    program_hash = compute_program_hash(instruction_list)
+    module_path = get_compiled_module_path(program_hash, cache_directory)
+    if not os.path.exists(module_path):
+        return None
+
+    import importlib.util
+    module_spec = importlib.util.spec_from_file_location(f"compiled_program_{program_hash[:16]}", module_path)
+    compiled_module = importlib.util.module_from_spec(module_spec)
+    module_spec.loader.exec_module(compiled_module)
+
+    translated_blocks = compiled_module.TRANSLATED_BLOCKS
+    for block_function in translated_blocks.values():
+        block_function.__defaults__ = (format_trace_line, halt_signal)
+    return translated_blocks
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python3 AheadOfTimeCompiler.py machine_code_file [machine_code_file ...]")
+        sys.exit(1)
+
+    from Simulator5 import decode_program
+
+    for input_file_path in sys.argv[1:]:
+        with open(input_file_path, "r") as input_file:
+            instruction_list = input_file.readlines()
+        module_path = compile_program(instruction_list, decode_program(instruction_list))
+        print(f"{input_file_path} -> {module_path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+# Lock-step NumPy engine for running many machines at once
+#
+# N machines are held as arrays: an N x 32 uint32 register matrix, an N x W
+# uint32 memory matrix covering addresses [0, W*4) of every machine, and an
+# N-length PC vector. Each step fetches every running machine's instruction
+# word from its own memory and groups the machines by that word, so all the
+# machines about to run the same instruction do its ALU, load, store or branch
+# work as one array operation. Different programs, or the same program over
+# different inputs, can share a batch; fetching from memory also keeps
+# self-modified code right.
+#
+# Every step's PC and registers are recorded and turned into per-machine trace
+# lines only at the end. A machine whose load or store falls outside the batch
+# memory, or that reaches an invalid instruction, stops with an error message.
+
+import numpy as np
+
+from BlockTranslator import get_operation_name
+
+BATCH_MEMORY_SIZE = 0x10080        # covers the program, stack and dumped data (0x10000-0x1007C)
+NUMBER_OF_REGISTERS = 32
+INITIAL_VALUE_FOR_STACK_POINTER = 0x17C
+
+# Byte offsets of one little-endian word, for unaligned accesses
+WORD_BYTE_OFFSETS = np.arange(4)
+
+class LockStepBatch:
+
+    def __init__(self, programs, decode_instruction, format_trace_line, memory_size=BATCH_MEMORY_SIZE):
+        self.decode_instruction = decode_instruction
+        self.format_trace_line = format_trace_line
+
+        program_words = [self.encode_program(instruction_list) for instruction_list in programs]
+        machine_count = len(program_words)
+        longest_program = max((len(words) for words in program_words), default=0)
+        self.memory_size = max(memory_size, longest_program * 4 + 3) & ~3
+
+        self.registers = np.zeros((machine_count, NUMBER_OF_REGISTERS), dtype=np.uint32)
+        self.registers[:, 2] = INITIAL_VALUE_FOR_STACK_POINTER
+        self.memory_words = np.zeros((machine_count, self.memory_size >> 2), dtype='<u4')
+        self.memory_bytes = self.memory_words.view(np.uint8)
+        self.pc = np.zeros(machine_count, dtype=np.int64)
+        self.program_end = np.array([len(words) * 4 for words in program_words], dtype=np.int64)
+        for machine_index, words in enumerate(program_words):
+            self.memory_words[machine_index, :len(words)] = words
+
+        self.running = np.ones(machine_count, dtype=bool)
+        self.halted = np.zeros(machine_count, dtype=bool)
+        self.instructions_retired = np.zeros(machine_count, dtype=np.int64)
+        self.errors = [None] * machine_count
+
+        # Per step: machines that ran, the PC each one traces and their registers afterwards
+        self.trace_records = []
+        # Instruction word -> (operation name, rd, rs1, rs2, immediate)
+        self.decoded_words = {}
+
+    @staticmethod
+    def encode_program(instruction_list):
+        """Instruction words of the program text (or image); unreadable lines become 0 as in load_program_into_memory"""
+        if not isinstance(instruction_list, (list, tuple)):
+            return instruction_list.tolist()
+        program_words = []
+        for instruction_line in instruction_list:
+            stripped_line = instruction_line.strip()
+            if stripped_line:
+                try:
+                    program_words.append(int(stripped_line, 2) & 0xFFFFFFFF)
+                except ValueError:
+                    program_words.append(0)
+        return program_words
+
+    def load_data_image(self, machine_index, image_path, base_address):
+        """Copy a binary file into one machine's memory at base_address"""
+        with open(image_path, 'rb') as image_file:
+            image_data = np.frombuffer(image_file.read(), dtype=np.uint8)
+        if base_address < 0 or base_address + len(image_data) > self.memory_size:
+            raise ValueError(f"Data image {image_path} does not fit in the batch memory at 0x{base_address:08X}")
+        self.memory_bytes[machine_index, base_address:base_address + len(image_data)] = image_data
+
+    def decode_word(self, instruction_word):
+        decoded_instruction = self.decoded_words.get(instruction_word)
+        if decoded_instruction is None:
+            handler, rd, rs1, rs2, immediate = self.decode_instruction(f"{instruction_word:032b}")
+            decoded_instruction = (get_operation_name(handler), rd, rs1, rs2, immediate)
+            self.decoded_words[instruction_word] = decoded_instruction
+        return decoded_instruction
+
+    def stop_with_error(self, machine_indices, error_message):
+        for machine_index in machine_indices.tolist():
+            self.errors[machine_index] = error_message
+        self.running[machine_indices] = False
+
+    def check_memory_access(self, machines, addresses):
+        """Keep the machines whose word access at addresses fits in the batch memory; the rest stop with an error"""
+        in_range = addresses <= self.memory_size - 4
+        if not in_range.all():
+            for machine_index, address in zip(machines[~in_range].tolist(), addresses[~in_range].tolist()):
+                self.stop_with_error(np.array([machine_index]), f"Memory access outside the batch memory at 0x{address:08X}")
+            return machines[in_range], addresses[in_range]
+        return machines, addresses
+
+    def load_words(self, machines, addresses):
+        aligned = (addresses & 3) == 0
+        if aligned.all():
+            return self.memory_words[machines, addresses >> 2]
+        loaded_values = np.empty(len(machines), dtype=np.uint32)
+        loaded_values[aligned] = self.memory_words[machines[aligned], addresses[aligned] >> 2]
+        unaligned = ~aligned
+        byte_addresses = addresses[unaligned, None] + WORD_BYTE_OFFSETS
+        loaded_bytes = np.ascontiguousarray(self.memory_bytes[machines[unaligned, None], byte_addresses])
+        loaded_values[unaligned] = loaded_bytes.view('<u4').ravel()
+        return loaded_values
+
+    def store_words(self, machines, addresses, values):
+        aligned = (addresses & 3) == 0
+        self.memory_words[machines[aligned], addresses[aligned] >> 2] = values[aligned]
+        unaligned = ~aligned
+        if unaligned.any():
+            byte_addresses = addresses[unaligned, None] + WORD_BYTE_OFFSETS
+            value_bytes = values[unaligned].astype('<u4').view(np.uint8).reshape(-1, 4)
+            self.memory_bytes[machines[unaligned, None], byte_addresses] = value_bytes
+
+    @staticmethod
+    def multiply_divide(operation_name, first_values, second_values):
+        """RV32M results for uint32 operand arrays, with the RISC-V divide-by-zero and overflow results"""
+        if operation_name == 'mul':
+            return first_values * second_values
+        if operation_name == 'mulhu':
+            return ((first_values.astype(np.uint64) * second_values.astype(np.uint64)) >> 32).astype(np.uint32)
+        signed_first = first_values.view(np.int32).astype(np.int64)
+        if operation_name == 'mulh':
+            return ((signed_first * second_values.view(np.int32).astype(np.int64)) >> 32).astype(np.uint32)
+        if operation_name == 'mulhsu':
+            return ((signed_first * second_values.astype(np.int64)) >> 32).astype(np.uint32)
+
+        if operation_name in ('divu', 'remu'):
+            dividends = first_values.astype(np.int64)
+            divisors = second_values.astype(np.int64)
+        else:
+            dividends = signed_first
+            divisors = second_values.view(np.int32).astype(np.int64)
+        by_zero = divisors == 0
+        # Truncating division on magnitudes, then the sign put back
+        magnitudes = np.abs(dividends), np.abs(np.where(by_zero, 1, divisors))
+        if operation_name in ('div', 'divu'):
+            results = np.where((dividends < 0) != (divisors < 0), -(magnitudes[0] // magnitudes[1]), magnitudes[0] // magnitudes[1])
+            results = np.where(by_zero, -1, results)
+        else:
+            results = np.where(dividends < 0, -(magnitudes[0] % magnitudes[1]), magnitudes[0] % magnitudes[1])
+            results = np.where(by_zero, dividends, results)
+        return results.astype(np.uint32)
+
+    def execute_group(self, machines, pcs, instruction_word):
+        """Run one instruction on every machine in the group; (machines that ran, their next PCs, halt flags) or None"""
+        operation_name, rd, rs1, rs2, immediate = self.decode_word(instruction_word)
+        registers = self.registers
+        fall_through = pcs + 4
+        next_pcs = fall_through
+        halting = np.zeros(len(machines), dtype=bool)
+
+        if operation_name == 'invalid':
+            self.stop_with_error(machines, immediate)
+            return None
+
+        if operation_name in ('add', 'sub', 'slt', 'srl', 'or', 'and'):
+            first_values = registers[machines, rs1]
+            second_values = registers[machines, rs2]
+            if operation_name == 'add':
+                results = first_values + second_values
+            elif operation_name == 'sub':
+                results = first_values - second_values
+            elif operation_name == 'slt':
+                results = (first_values.view(np.int32) < second_values.view(np.int32)).astype(np.uint32)
+            elif operation_name == 'srl':
+                results = first_values >> (second_values & 0x1F)
+            elif operation_name == 'or':
+                results = first_values | second_values
+            else:
+                results = first_values & second_values
+            registers[machines, rd] = results
+        elif operation_name in ('mul', 'mulh', 'mulhsu', 'mulhu', 'div', 'divu', 'rem', 'remu'):
+            registers[machines, rd] = self.multiply_divide(operation_name, registers[machines, rs1], registers[machines, rs2])
+        elif operation_name == 'addi':
+            registers[machines, rd] = registers[machines, rs1] + np.uint32(immediate & 0xFFFFFFFF)
+        elif operation_name in ('lw', 'sw'):
+            addresses = (registers[machines, rs1] + np.uint32(immediate & 0xFFFFFFFF)).astype(np.int64)
+            if operation_name == 'sw':
+                stored_values = registers[machines, rs2]
+            checked_machines, checked_addresses = self.check_memory_access(machines, addresses)
+            if len(checked_machines) != len(machines):
+                keep = np.isin(machines, checked_machines)
+                machines, next_pcs, halting = machines[keep], next_pcs[keep], halting[keep]
+                if operation_name == 'sw':
+                    stored_values = stored_values[keep]
+            if operation_name == 'lw':
+                registers[machines, rd] = self.load_words(machines, checked_addresses)
+            else:
+                self.store_words(machines, checked_addresses, stored_values)
+        elif operation_name == 'csrrs':
+            # cycle, time and instret (and their high halves) count retired
+            # instructions; hpmcounters have no events configured in a batch
+            counter_number = immediate & 0x7F
+            if immediate == 0xF14:
+                # mhartid: every machine in a batch is hart 0
+                registers[machines, rd] = 0
+            elif immediate >> 8 not in (0xC, 0xB) or counter_number & 0x60:
+                self.stop_with_error(machines, f"Unsupported CSR 0x{immediate:03X}")
+                return None
+            elif counter_number < 3:
+                counter_values = self.instructions_retired[machines]
+                registers[machines, rd] = (counter_values >> 32 if immediate & 0x80 else counter_values).astype(np.uint32)
+            else:
+                registers[machines, rd] = 0
+        elif operation_name == 'jalr':
+            # Target is computed before rd is written in case rd == rs1
+            targets = (registers[machines, rs1] + np.uint32(immediate & 0xFFFFFFFF)).astype(np.int64) & ~1
+            registers[machines, rd] = fall_through.astype(np.uint32)
+            next_pcs = targets
+        elif operation_name == 'jal':
+            registers[machines, rd] = fall_through.astype(np.uint32)
+            next_pcs = pcs + immediate
+        elif operation_name in ('beq', 'beq_halt', 'bne', 'blt'):
+            first_values = registers[machines, rs1]
+            second_values = registers[machines, rs2]
+            if operation_name in ('beq', 'beq_halt'):
+                taken = first_values == second_values
+            elif operation_name == 'bne':
+                taken = first_values != second_values
+            else:
+                taken = first_values.view(np.int32) < second_values.view(np.int32)
+            if operation_name == 'beq_halt':
+                halting = taken
+            else:
+                next_pcs = np.where(taken, pcs + immediate, fall_through)
+        else:
+            # Atomics only matter with several harts sharing memory
+            self.stop_with_error(machines, f"{operation_name} is not supported by the batch engine")
+            return None
+        return machines, next_pcs, halting
+
+    def run(self, max_steps=None):
+        """Step every running machine together until all have halted, left their program or run max_steps more steps"""
+        steps_taken = 0
+        while max_steps is None or steps_taken < max_steps:
+            active = np.flatnonzero(self.running)
+            if len(active) == 0:
+                break
+            pcs = self.pc[active]
+            inside_program = (pcs >= 0) & (pcs < self.program_end[active]) & ((pcs & 3) == 0)
+            if not inside_program.all():
+                self.running[active[~inside_program]] = False
+                active, pcs = active[inside_program], pcs[inside_program]
+                if len(active) == 0:
+                    break
+
+            instruction_words = self.memory_words[active, pcs >> 2]
+            unique_words, group_of_machine = np.unique(instruction_words, return_inverse=True)
+            step_machines = []
+            step_trace_pcs = []
+            for group_index, instruction_word in enumerate(unique_words.tolist()):
+                in_group = group_of_machine == group_index
+                executed = self.execute_group(active[in_group], pcs[in_group], instruction_word)
+                if executed is None:
+                    continue
+                group_machines, next_pcs, halting = executed
+                group_pcs = self.pc[group_machines]
+                # Halted machines trace (and keep) their current PC
+                self.pc[group_machines] = np.where(halting, group_pcs, next_pcs)
+                self.halted[group_machines[halting]] = True
+                self.running[group_machines[halting]] = False
+                step_machines.append(group_machines)
+                step_trace_pcs.append(self.pc[group_machines])
+
+            self.registers[:, 0] = 0
+            if step_machines:
+                step_machines = np.concatenate(step_machines)
+                self.instructions_retired[step_machines] += 1
+                self.trace_records.append((step_machines, np.concatenate(step_trace_pcs), self.registers[step_machines]))
+            steps_taken += 1
+        return steps_taken
+
+    def trace_lines(self):
+        """Trace lines of every machine, as a list per machine"""
+        machine_trace_lines = [[] for _ in range(len(self.pc))]
+        if not self.trace_records:
+            return machine_trace_lines
+        traced_machines = np.concatenate([record[0] for record in self.trace_records])
+        traced_pcs = np.concatenate([record[1] for record in self.trace_records])
+        traced_registers = np.concatenate([record[2] for record in self.trace_records])
+        # Stable sort keeps each machine's steps in order
+        order = np.argsort(traced_machines, kind='stable')
+        format_trace_line = self.format_trace_line
+        for machine_index, pc, register_values in zip(traced_machines[order].tolist(), traced_pcs[order].tolist(),
+                                                       traced_registers[order].tolist()):
+            machine_trace_lines[machine_index].append(format_trace_line(pc, *register_values))
+        return machine_trace_lines
+
+    def memory_word(self, machine_index, address):
+        return int(self.memory_words[machine_index, address >> 2])
@@ -0,0 +1,335 @@
+# Packed binary delta traces and their conversion to and from the text format
+#
+# A text trace spends 1,156 characters on every instruction, although one
+# instruction changes the PC and at most one register. A binary trace keeps,
+# per step, the PC and just the registers that changed (about 12 bytes):
+#   header   b'RVBTRACE' and the format version (u16)
+#   chunks   record count (u32) and byte length (u32), then the records; a
+#            chunk with no records ends the steps
+#   record   mask (u32) with bit n set when xn changed since the step before
+#            (registers start out zero), PC (u32), then the new value (u32) of
+#            each changed register, lowest first. x0 is never written, so bit 0
+#            instead marks a PC that does not fit in 32 bits, stored as an i64
+#   memory   word count (u32), then (address, value) pairs of u32
+# All numbers are little-endian. Every chunk but the last holds
+# BINARY_TRACE_CHUNK_RECORDS records, so equal traces give equal files and can
+# be compared byte for byte.
+#
+# The simulator's engines hand the writer a (PC, rd, value of rd) delta per
+# instruction, which is packed without any text being made. Text traces being
+# converted are encoded a chunk at a time with NumPy when every line has the
+# usual length, line by line otherwise. convert_binary_trace streams a binary
+# trace back to exactly the text the simulator writes; from the command line:
+#     python3 BinaryTrace.py trace.bin trace.txt
+#     python3 BinaryTrace.py --to-binary trace.txt trace.bin
+
+import os
+import struct
+import sys
+import time
+
+from TraceRenderer import NUMBER_OF_REGISTERS, TraceRenderer
+from TraceWriter import TRACE_BUFFER_LINES, TRACE_FLUSH_INTERVAL, TraceWriter
+
+BINARY_TRACE_MAGIC = b"RVBTRACE"
+BINARY_TRACE_VERSION = 1
+BINARY_TRACE_CHUNK_RECORDS = 4096
+WIDE_PC_FLAG = 1
+
+TRACE_FIELD_COUNT = NUMBER_OF_REGISTERS + 1
+TRACE_FIELD_WIDTH = 35                                   # "0b", 32 digits, a space
+TRACE_LINE_LENGTH = TRACE_FIELD_COUNT * TRACE_FIELD_WIDTH + 1
+
+HEADER_STRUCT = struct.Struct("<8sH")
+CHUNK_STRUCT = struct.Struct("<II")
+# Register mask and PC at the start of a record; WIDE_PC_FLAG in the mask
+# means the wide form
+RECORD_HEAD_STRUCT = struct.Struct("<II")
+WIDE_RECORD_HEAD_STRUCT = struct.Struct("<Iq")
+WORD_STRUCT = struct.Struct("<I")
+
+def encode_record(trace_line, register_values):
+    """Record for one trace line; register_values (x0 .. x31 of the line before) are brought up to date"""
+    trace_fields = trace_line.split()
+    if len(trace_fields) != TRACE_FIELD_COUNT or not all(trace_field.startswith("0b") for trace_field in trace_fields):
+        raise ValueError(f"Not a trace line: {trace_line.strip()!r}")
+    pc_value = int(trace_fields[0][2:], 2)
+    if int(trace_fields[1][2:], 2):
+        raise ValueError(f"Trace line with x0 not zero: {trace_line.strip()!r}")
+
+    register_mask = 0
+    changed_values = []
+    for register_number in range(1, NUMBER_OF_REGISTERS):
+        register_value = int(trace_fields[register_number + 1][2:], 2)
+        if register_value != register_values[register_number]:
+            register_mask |= 1 << register_number
+            changed_values.append(register_value)
+            register_values[register_number] = register_value
+
+    if 0 <= pc_value <= 0xFFFFFFFF:
+        record_head = RECORD_HEAD_STRUCT.pack(register_mask, pc_value)
+    else:
+        record_head = WIDE_RECORD_HEAD_STRUCT.pack(register_mask | WIDE_PC_FLAG, pc_value)
+    return record_head + struct.pack(f"<{len(changed_values)}I", *changed_values)
+
+def encode_deltas(trace_deltas, register_values, carried_values=None):
+    """Records for (PC, rd, value) deltas from the engines; carried_values {register: value} were set outside
+    them and go into the first record"""
+    record_words = []
+    add_words = record_words.extend
+    remaining_deltas = iter(trace_deltas)
+    first_delta = next(remaining_deltas, None) if carried_values else None
+    if first_delta is not None:
+        pc_value, rd, register_value = first_delta
+        carried_values[rd] = register_value
+        changed_registers = sorted(register for register in carried_values
+                                   if register and carried_values[register] != register_values[register])
+        register_mask = 0
+        for register in changed_registers:
+            register_mask |= 1 << register
+            register_values[register] = carried_values[register]
+        if 0 <= pc_value <= 0xFFFFFFFF:
+            add_words((register_mask, pc_value))
+        else:
+            add_words((register_mask | WIDE_PC_FLAG, pc_value & 0xFFFFFFFF, pc_value >> 32 & 0xFFFFFFFF))
+        add_words(register_values[register] for register in changed_registers)
+        carried_values.clear()
+
+    # x0 is never changed, so its bit cannot be mistaken for WIDE_PC_FLAG
+    for pc_value, rd, register_value in remaining_deltas:
+        if register_value != register_values[rd]:
+            register_values[rd] = register_value
+            if 0 <= pc_value <= 0xFFFFFFFF:
+                add_words((1 << rd, pc_value, register_value))
+            else:
+                add_words((1 << rd | WIDE_PC_FLAG, pc_value & 0xFFFFFFFF, pc_value >> 32 & 0xFFFFFFFF, register_value))
+        elif 0 <= pc_value <= 0xFFFFFFFF:
+            add_words((0, pc_value))
+        else:
+            add_words((WIDE_PC_FLAG, pc_value & 0xFFFFFFFF, pc_value >> 32 & 0xFFFFFFFF))
+    return struct.pack(f"<{len(record_words)}I", *record_words)
+
+def encode_records_in_bulk(np, trace_lines, register_values):
+    """Records for trace_lines of the usual length in a few array operations, or None to go line by line"""
+    line_count = len(trace_lines)
+    try:
+        trace_text = "".join(trace_lines).encode("ascii")
+    except UnicodeEncodeError:
+        return None
+    trace_characters = np.frombuffer(trace_text, dtype=np.uint8).reshape(line_count, TRACE_LINE_LENGTH)
+    field_characters = trace_characters[:, :-1].reshape(line_count, TRACE_FIELD_COUNT, TRACE_FIELD_WIDTH)
+    # '0'/'1' -> 0/1; any other character wraps around to more than 1
+    field_digits = field_characters[:, :, 2:-1] - ord('0')
+    if (field_digits > 1).any() or (field_characters[:, :, :2] != np.frombuffer(b"0b", dtype=np.uint8)).any():
+        return None
+    field_values = np.packbits(field_digits, axis=2).view('>u4')[:, :, 0].astype(np.uint32)
+    registers = field_values[:, 1:]
+    if registers[:, 0].any():
+        return None
+
+    previous_registers = np.vstack((np.array(register_values, dtype=np.uint32), registers[:-1]))
+    changed = registers != previous_registers
+    changed_counts = changed.sum(axis=1)
+    register_masks = changed.astype(np.uint64) @ (np.uint64(1) << np.arange(NUMBER_OF_REGISTERS, dtype=np.uint64))
+
+    # Each record is 2 + (changed registers) words: mask, PC, values
+    record_sizes = changed_counts + 2
+    record_starts = np.cumsum(record_sizes) - record_sizes
+    record_words = np.empty(int(record_sizes.sum()), dtype='<u4')
+    record_words[record_starts] = register_masks
+    record_words[record_starts + 1] = field_values[:, 0]
+    changed_rows, changed_registers = np.nonzero(changed)
+    first_changes = np.cumsum(changed_counts) - changed_counts
+    value_positions = record_starts[changed_rows] + 2 + np.arange(len(changed_rows)) - first_changes[changed_rows]
+    record_words[value_positions] = registers[changed_rows, changed_registers]
+
+    register_values[:] = registers[-1].tolist()
+    return record_words.tobytes()
+
+def encode_records(trace_lines, register_values):
+    """Records for trace_lines, in bulk when NumPy is there and every line has the usual length"""
+    if trace_lines and all(len(trace_line) == TRACE_LINE_LENGTH for trace_line in trace_lines):
+        try:
+            import numpy as np
+        except ImportError:
+            np = None
+        if np is not None:
+            record_bytes = encode_records_in_bulk(np, trace_lines, register_values)
+            if record_bytes is not None:
+                return record_bytes
+    return b"".join(encode_record(trace_line, register_values) for trace_line in trace_lines)
+
+def encode_memory_section(memory_dump_lines):
+    """Memory section for '0xADDRESS:0bVALUE' dump lines"""
+    memory_words = []
+    for memory_line in memory_dump_lines:
+        address_text, _, value_text = memory_line.strip().partition(":")
+        if not address_text.startswith("0x") or not value_text.startswith("0b"):
+            raise ValueError(f"Not a memory dump line: {memory_line.strip()!r}")
+        memory_words += (int(address_text[2:], 16), int(value_text[2:], 2))
+    return struct.pack(f"<I{len(memory_words)}I", len(memory_words) // 2, *memory_words)
+
+class BinaryTraceWriter:
+    """Trace lines written to output_file_path as a binary trace as they are produced; used like a TraceWriter"""
+
+    def __init__(self, output_file_path, trace_lines, buffer_lines=None, flush_interval=None, delta_registers=None):
+        self.output_file_path = output_file_path
+        # Text lines, or with delta_registers (the registers the run starts
+        # from) the engines' (PC, rd, value) deltas
+        self.trace_lines = trace_lines
+        self.buffer_lines = TRACE_BUFFER_LINES if buffer_lines is None else buffer_lines
+        self.flush_interval = TRACE_FLUSH_INTERVAL if flush_interval is None else flush_interval
+        self.output_file = open(output_file_path, "wb")
+        self.output_file.write(HEADER_STRUCT.pack(BINARY_TRACE_MAGIC, BINARY_TRACE_VERSION))
+        self.last_flush_time = time.monotonic()
+        self.register_values = [0] * NUMBER_OF_REGISTERS
+        self.trace_deltas = delta_registers is not None
+        self.carried_values = {register: register_value for register, register_value in enumerate(delta_registers or ())
+                               if register_value}
+
+    def write_chunk(self, chunk_lines):
+        if self.trace_deltas:
+            record_bytes = encode_deltas(chunk_lines, self.register_values, self.carried_values)
+        else:
+            record_bytes = encode_records(chunk_lines, self.register_values)
+        self.output_file.write(CHUNK_STRUCT.pack(len(chunk_lines), len(record_bytes)))
+        self.output_file.write(record_bytes)
+
+    def write_buffered(self, whole_chunks_only=True):
+        """Write out and clear the buffered trace lines, keeping back a partial chunk unless told otherwise"""
+        line_count = len(self.trace_lines)
+        if whole_chunks_only:
+            line_count -= line_count % BINARY_TRACE_CHUNK_RECORDS
+        for chunk_start in range(0, line_count, BINARY_TRACE_CHUNK_RECORDS):
+            self.write_chunk(self.trace_lines[chunk_start:min(chunk_start + BINARY_TRACE_CHUNK_RECORDS, line_count)])
+        del self.trace_lines[:line_count]
+
+    def after_slice(self, machine=None):
+        """Watchdog callback: write the buffer once it is full, flush the file every flush_interval seconds"""
+        if len(self.trace_lines) >= self.buffer_lines:
+            self.write_buffered()
+        if time.monotonic() - self.last_flush_time >= self.flush_interval:
+            self.output_file.flush()
+            self.last_flush_time = time.monotonic()
+
+    def finish(self, final_lines=()):
+        """Write the rest of the trace and the memory section from the dump lines in final_lines, and close the file"""
+        self.write_buffered(whole_chunks_only=False)
+        self.output_file.write(CHUNK_STRUCT.pack(0, 0))
+        self.output_file.write(encode_memory_section(final_lines))
+        self.output_file.close()
+
+    def abandon(self):
+        """Close and remove the file, for a run that failed"""
+        self.output_file.close()
+        os.remove(self.output_file_path)
+
+def read_exactly(binary_file, byte_count, binary_path):
+    data = binary_file.read(byte_count)
+    if len(data) != byte_count:
+        raise ValueError(f"Truncated binary trace: {binary_path}")
+    return data
+
+def decode_records(record_bytes, record_count, trace_renderer, trace_lines, binary_path):
+    """Append the text lines of record_count records, the renderer's fields holding the registers so far"""
+    fields = trace_renderer.fields
+    render_field = trace_renderer.render_field
+    unpack_word = WORD_STRUCT.unpack_from
+    record_offset = 0
+    try:
+        for _ in range(record_count):
+            register_mask, pc_value = RECORD_HEAD_STRUCT.unpack_from(record_bytes, record_offset)
+            if register_mask & WIDE_PC_FLAG:
+                register_mask, pc_value = WIDE_RECORD_HEAD_STRUCT.unpack_from(record_bytes, record_offset)
+                record_offset += WIDE_RECORD_HEAD_STRUCT.size
+                register_mask ^= WIDE_PC_FLAG
+            else:
+                record_offset += RECORD_HEAD_STRUCT.size
+            while register_mask:
+                lowest_bit = register_mask & -register_mask
+                fields[lowest_bit.bit_length()], = map(render_field, unpack_word(record_bytes, record_offset))
+                record_offset += 4
+                register_mask ^= lowest_bit
+            fields[0] = render_field(pc_value)
+            trace_lines.append("".join(fields))
+    except struct.error:
+        raise ValueError(f"Corrupt binary trace: {binary_path}") from None
+    if record_offset != len(record_bytes):
+        raise ValueError(f"Corrupt binary trace: {binary_path}")
+
+def convert_binary_trace(binary_path, text_path, buffer_lines=None):
+    """Write the text trace a binary trace was made from, one chunk at a time"""
+    trace_lines = []
+    trace_writer = TraceWriter(text_path, trace_lines, buffer_lines)
+    try:
+        with open(binary_path, "rb") as binary_file:
+            magic, version = HEADER_STRUCT.unpack(read_exactly(binary_file, HEADER_STRUCT.size, binary_path))
+            if magic != BINARY_TRACE_MAGIC:
+                raise ValueError(f"Not a binary trace: {binary_path}")
+            if version != BINARY_TRACE_VERSION:
+                raise ValueError(f"Unsupported binary trace version {version}: {binary_path}")
+
+            trace_renderer = TraceRenderer()
+            while True:
+                record_count, record_length = CHUNK_STRUCT.unpack(read_exactly(binary_file, CHUNK_STRUCT.size, binary_path))
+                if not record_count:
+                    break
+                decode_records(read_exactly(binary_file, record_length, binary_path), record_count,
+                               trace_renderer, trace_lines, binary_path)
+                trace_writer.after_slice()
+
+            memory_word_count, = WORD_STRUCT.unpack(read_exactly(binary_file, WORD_STRUCT.size, binary_path))
+            memory_words = struct.unpack(f"<{2 * memory_word_count}I",
+                                         read_exactly(binary_file, 8 * memory_word_count, binary_path))
+            if binary_file.read(1):
+                raise ValueError(f"Corrupt binary trace: {binary_path}")
+    except Exception:
+        trace_writer.abandon()
+        raise
+    trace_writer.finish(f"0x{memory_address:08X}:0b{memory_value:032b}\n"
+                        for memory_address, memory_value in zip(memory_words[0::2], memory_words[1::2]))
+
+def convert_text_trace(text_path, binary_path, buffer_lines=None):
+    """Write the binary trace of a text trace file (trace lines, then the memory dump), reading it line by line"""
+    trace_lines = []
+    memory_dump_lines = []
+    trace_writer = BinaryTraceWriter(binary_path, trace_lines, buffer_lines)
+    try:
+        with open(text_path, "r") as text_file:
+            for text_line in text_file:
+                if not text_line.strip():
+                    continue
+                if text_line.startswith("0x"):
+                    memory_dump_lines.append(text_line)
+                    continue
+                if memory_dump_lines:
+                    raise ValueError(f"Trace line after the memory dump: {text_path}")
+                # The last line of a trace file has lost its newline to .strip()
+                trace_lines.append(text_line if text_line.endswith("\n") else text_line + "\n")
+                trace_writer.after_slice()
+    except Exception:
+        trace_writer.abandon()
+        raise
+    trace_writer.finish(memory_dump_lines)
+
+def main():
+    usage_message = ("Usage: python3 BinaryTrace.py binary_trace_file text_trace_file\n"
+                     "       python3 BinaryTrace.py --to-binary text_trace_file binary_trace_file")
+    command_line_arguments = sys.argv[1:]
+    to_binary = bool(command_line_arguments) and command_line_arguments[0] == '--to-binary'
+    if to_binary:
+        command_line_arguments.pop(0)
+    if len(command_line_arguments) != 2:
+        print(usage_message)
+        sys.exit(1)
+    try:
+        if to_binary:
+            convert_text_trace(*command_line_arguments)
+        else:
+            convert_binary_trace(*command_line_arguments)
+    except (OSError, ValueError) as error:
+        print(error)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
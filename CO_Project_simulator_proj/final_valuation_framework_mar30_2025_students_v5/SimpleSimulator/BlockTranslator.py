@@ -0,0 +1,526 @@
+# Hot basic-block translator for the Simulator5 decoded program
+#
+# Cold code runs through the decoded instruction handlers one step at a time.
+# Once a block (straight-line code ending at beq/bne/blt/jal/jalr) has been
+# entered often enough it is turned into Python source, compiled, and from then
+# on the whole block runs as one function call with registers held in locals.
+# Trace lines are built from those locals so the output matches the interpreter.
+# Stores into the program's own code drop exactly the blocks built from the
+# overwritten instructions; the blocks are looked up through the code page.
+# Given a TraceRenderer, blocks build trace lines from its rendered fields and
+# only render the registers they wrote. With trace_deltas they record a (PC,
+# rd, value) delta per instruction instead of a line, for binary traces.
+# Given event_counts (a PerformanceCounters' counts), hpmcounter events are
+# counted per block run: a block is straight-line code, so its loads, stores
+# and jumps follow from where it started and how many steps it took, and a
+# branch closing it is taken if its condition holds on the registers it left.
+
+import sys
+
+from PagedMemory import PAGE_SHIFT
+from PerformanceCounters import MachineLevelInstruction
+
+BLOCK_HOTNESS_THRESHOLD = 16     # block entries before a block gets translated
+MAXIMUM_BLOCK_LENGTH = 128       # instructions per translated block
+NUMBER_OF_REGISTERS = 32
+
+# Operations that end a basic block ('beq_halt' is beq with a zero offset)
+BLOCK_TERMINATOR_OPERATIONS = {'beq', 'beq_halt', 'bne', 'blt', 'jal', 'jalr'}
+
+def get_operation_name(handler):
+    """Operation name of a decoded handler, e.g. execute_addi_instruction -> 'addi'"""
+    return handler.__name__[len('execute_'):-len('_instruction')]
+
+class BlockTranslator:
+
+    def __init__(self, decoded_program, format_trace_line, halt_signal, hotness_threshold=BLOCK_HOTNESS_THRESHOLD,
+                 trace_renderer=None, trace_deltas=False):
+        self.decoded_program = decoded_program
+        self.format_trace_line = format_trace_line
+        self.halt_signal = halt_signal
+        self.hotness_threshold = hotness_threshold
+        # Optional TraceRenderer whose fields are kept in step with the registers
+        # while this engine runs
+        self.trace_renderer = trace_renderer
+        self.trace_deltas = trace_deltas
+
+        self.operation_names = [get_operation_name(entry[0]) for entry in decoded_program]
+        self.is_block_terminator = [name in BLOCK_TERMINATOR_OPERATIONS for name in self.operation_names]
+
+        # Block entry PC -> compiled block function / number of times entered /
+        # end of the code the block was built from; code page -> block entry PCs
+        self.translated_blocks = {}
+        self.block_entry_counts = {}
+        self.block_end_addresses = {}
+        self.code_page_blocks = {}
+
+        # Set when a store rewrote part of the program; a translated block that
+        # made such a store returned right after it
+        self.code_changed = False
+
+        # Optional LoopAccelerator consulted at every block boundary
+        self.loop_accelerator = None
+        # Optional event name -> count of PerformanceCounters, and the events of
+        # each (start PC, steps) run counted so far
+        self.event_counts = None
+        self.block_events = {}
+        # Optional breakpoint bitmap, one byte per instruction; run() stops in
+        # front of a marked instruction when control enters a block there, and
+        # blocks are split so that every marked instruction starts one
+        self.breakpoint_map = None
+
+    def find_static_block_leaders(self):
+        """PCs where a block can start: PC 0, branch/jal targets and the instruction after every terminator"""
+        from ProgramVerifier import ControlFlowGraph
+        return ControlFlowGraph(self.decoded_program).block_leaders
+
+    def ends_block(self, instruction_index):
+        """True when a block ends after this instruction: it is a terminator or a breakpoint follows it"""
+        if self.operation_names[instruction_index] in BLOCK_TERMINATOR_OPERATIONS:
+            return True
+        breakpoint_map = self.breakpoint_map
+        return breakpoint_map is not None and instruction_index + 1 < len(breakpoint_map) and bool(breakpoint_map[instruction_index + 1])
+
+    def set_breakpoint_map(self, breakpoint_map):
+        """Stop run() in front of every instruction marked in breakpoint_map (None clears them all)"""
+        self.breakpoint_map = breakpoint_map
+        for instruction_index in range(len(self.decoded_program)):
+            self.is_block_terminator[instruction_index] = self.ends_block(instruction_index)
+        if breakpoint_map is None:
+            return
+
+        # Translated blocks and fast-forwarded loops running across a breakpoint
+        # would pass it by
+        for block_start, block_end_address in list(self.block_end_addresses.items()):
+            if any(breakpoint_map[(block_start >> 2) + 1:block_end_address >> 2]):
+                self.remove_translated_block(block_start)
+        if self.loop_accelerator is not None:
+            for instruction_index in range(len(breakpoint_map)):
+                if breakpoint_map[instruction_index]:
+                    self.loop_accelerator.forget_loops(instruction_index * 4, instruction_index * 4 + 4)
+
+    def find_block_end(self, start_pc):
+        """Address just past the last instruction a block starting at start_pc can cover"""
+        instruction_index = start_pc >> 2
+        last_index = min(len(self.decoded_program), instruction_index + MAXIMUM_BLOCK_LENGTH)
+        while instruction_index < last_index:
+            instruction_index += 1
+            if self.is_block_terminator[instruction_index - 1]:
+                break
+        return instruction_index * 4
+
+    def generate_block_source(self, start_pc):
+        """Python source for the block starting at start_pc, or None if there is nothing to translate"""
+        decoded_program = self.decoded_program
+        operation_names = self.operation_names
+
+        # Every write gets a fresh local name so each trace line can refer to the
+        # values as they were right after its instruction; x0 is always literal 0
+        current_names = ['0'] + [f'r{register}' for register in range(1, NUMBER_OF_REGISTERS)]
+        write_counts = [0] * NUMBER_OF_REGISTERS
+        body_lines = []
+        trace_line_calls = []
+
+        def write_register(register, expression):
+            if register == 0:
+                return
+            write_counts[register] += 1
+            new_name = f'r{register}_{write_counts[register]}'
+            body_lines.append(f'    {new_name} = {expression}')
+            current_names[register] = new_name
+
+        def record_trace_line(pc_expression):
+            trace_line_calls.append((pc_expression, tuple(current_names)))
+
+        def block_exit_lines(indent, return_expression):
+            if self.trace_renderer is not None:
+                lines = rendered_trace_lines(indent)
+            elif self.trace_deltas:
+                lines = trace_delta_lines(indent)
+            else:
+                lines = []
+                if trace_line_calls:
+                    trace_line_expressions = [f'format_trace_line({pc_expression}, {", ".join(register_names)})'
+                                              for pc_expression, register_names in trace_line_calls]
+                    lines.append(f'{indent}trace_lines.extend(({", ".join(trace_line_expressions)},))')
+            for register in range(1, NUMBER_OF_REGISTERS):
+                if write_counts[register]:
+                    lines.append(f'{indent}registers[{register}] = {current_names[register]}')
+            lines.append(f'{indent}return {return_expression}')
+            return lines
+
+        def rendered_trace_lines(indent):
+            # Each line is the renderer's fields after re-rendering the PC and the
+            # registers that changed since the line before; the fields end up
+            # matching the registers the block leaves behind
+            lines = []
+            shown_names = [f'r{register}' for register in range(NUMBER_OF_REGISTERS)]
+            for pc_expression, register_names in trace_line_calls:
+                for register in range(1, NUMBER_OF_REGISTERS):
+                    if register_names[register] != shown_names[register]:
+                        lines.append(f'{indent}fields[{register + 1}] = {field_expression(register_names[register])}')
+                        shown_names[register] = register_names[register]
+                if isinstance(pc_expression, int):
+                    lines.append(f'{indent}fields[0] = {render_field(pc_expression)!r}')
+                else:
+                    lines.append(f'{indent}fields[0] = f"0b{{{pc_expression}:032b}} " if {pc_expression} >> 32 else {field_expression(pc_expression)}')
+                lines.append(f'{indent}trace_lines.append(join_fields(fields))')
+            return lines
+
+        def trace_delta_lines(indent):
+            # One instruction writes at most one register, the one whose name
+            # changed since the line before
+            trace_deltas = []
+            shown_names = [f'r{register}' for register in range(NUMBER_OF_REGISTERS)]
+            for pc_expression, register_names in trace_line_calls:
+                written_register = 0
+                for register in range(1, NUMBER_OF_REGISTERS):
+                    if register_names[register] != shown_names[register]:
+                        written_register = register
+                        shown_names[register] = register_names[register]
+                trace_deltas.append(f'({pc_expression}, {written_register}, {register_names[written_register]})')
+            if not trace_deltas:
+                return []
+            return [f'{indent}trace_lines.extend(({", ".join(trace_deltas)},))']
+
+        if self.trace_renderer is not None:
+            from TraceRenderer import field_expression, render_field
+
+        instruction_index = start_pc >> 2
+        translated_count = 0
+        block_closed = False
+        while instruction_index < len(decoded_program) and translated_count < MAXIMUM_BLOCK_LENGTH:
+            if translated_count and self.is_block_terminator[instruction_index - 1]:
+                # A breakpoint starts the next block
+                break
+            operation_name = operation_names[instruction_index]
+            if operation_name == 'invalid':
+                # Leave it to the interpreter, which raises the decode error
+                break
+
+            handler, rd, rs1, rs2, immediate = decoded_program[instruction_index]
+            pc = instruction_index * 4
+            source1 = current_names[rs1]
+            source2 = current_names[rs2]
+            instruction_index += 1
+            translated_count += 1
+
+            if operation_name == 'add':
+                write_register(rd, f'({source1} + {source2}) & 0xFFFFFFFF')
+            elif operation_name == 'sub':
+                write_register(rd, f'({source1} - {source2}) & 0xFFFFFFFF')
+            elif operation_name == 'slt':
+                write_register(rd, f'1 if ({source1} ^ 0x80000000) < ({source2} ^ 0x80000000) else 0')
+            elif operation_name == 'srl':
+                write_register(rd, f'{source1} >> ({source2} & 0x1F)')
+            elif operation_name == 'or':
+                write_register(rd, f'{source1} | {source2}')
+            elif operation_name == 'and':
+                write_register(rd, f'{source1} & {source2}')
+            elif operation_name == 'mul':
+                write_register(rd, f'({source1} * {source2}) & 0xFFFFFFFF')
+            elif operation_name == 'mulh':
+                write_register(rd, f'((({source1} ^ 0x80000000) - 0x80000000) * (({source2} ^ 0x80000000) - 0x80000000) >> 32) & 0xFFFFFFFF')
+            elif operation_name == 'mulhsu':
+                write_register(rd, f'((({source1} ^ 0x80000000) - 0x80000000) * {source2} >> 32) & 0xFFFFFFFF')
+            elif operation_name == 'mulhu':
+                write_register(rd, f'({source1} * {source2}) >> 32')
+            elif operation_name in ('div', 'rem'):
+                signed1 = f'(({source1} ^ 0x80000000) - 0x80000000)'
+                signed2 = f'(({source2} ^ 0x80000000) - 0x80000000)'
+                if operation_name == 'div':
+                    write_register(rd, f'0xFFFFFFFF if {source2} == 0 else (abs({signed1}) // abs({signed2})'
+                                       f' * (1 if ({source1} ^ {source2}) < 0x80000000 else -1)) & 0xFFFFFFFF')
+                else:
+                    write_register(rd, f'{source1} if {source2} == 0 else (abs({signed1}) % abs({signed2})'
+                                       f' * (1 if {source1} < 0x80000000 else -1)) & 0xFFFFFFFF')
+            elif operation_name == 'divu':
+                write_register(rd, f'{source1} // {source2} if {source2} else 0xFFFFFFFF')
+            elif operation_name == 'remu':
+                write_register(rd, f'{source1} % {source2} if {source2} else {source1}')
+            elif operation_name == 'addi':
+                write_register(rd, f'({source1} + {immediate}) & 0xFFFFFFFF')
+            elif operation_name == 'lw':
+                write_register(rd, f'memory.load_word({source1} + {immediate})')
+            elif operation_name == 'sw':
+                # A store into this program's code leaves the block so the rest of
+                # it is fetched again from the updated instructions
+                body_lines.append(f'    if memory.store_word({source1} + {immediate}, {source2}):')
+                record_trace_line(pc + 4)
+                body_lines += block_exit_lines('        ', pc + 4)
+                trace_line_calls.pop()
+
+            elif operation_name == 'jal':
+                write_register(rd, pc + 4)
+                record_trace_line(pc + immediate)
+                body_lines += block_exit_lines('    ', pc + immediate)
+                block_closed = True
+                break
+            elif operation_name == 'jalr':
+                body_lines.append(f'    next_pc = ({source1} + {immediate}) & -2')
+                write_register(rd, pc + 4)
+                record_trace_line('next_pc')
+                body_lines += block_exit_lines('    ', 'next_pc')
+                block_closed = True
+                break
+            elif operation_name == 'beq_halt':
+                # Taken: the halt line repeats this PC and the run ends
+                body_lines.append(f'    if {source1} == {source2}:')
+                record_trace_line(pc)
+                body_lines += block_exit_lines('        ', 'HALT')
+                trace_line_calls.pop()
+                record_trace_line(pc + 4)
+                body_lines += block_exit_lines('    ', pc + 4)
+                block_closed = True
+                break
+            elif operation_name in ('beq', 'bne', 'blt'):
+                if operation_name == 'beq':
+                    condition = f'{source1} == {source2}'
+                elif operation_name == 'bne':
+                    condition = f'{source1} != {source2}'
+                else:
+                    condition = f'({source1} ^ 0x80000000) < ({source2} ^ 0x80000000)'
+                body_lines.append(f'    next_pc = {pc + immediate} if {condition} else {pc + 4}')
+                record_trace_line('next_pc')
+                body_lines += block_exit_lines('    ', 'next_pc')
+                block_closed = True
+                break
+            else:
+                # Unknown to the translator: end the block before this instruction
+                instruction_index -= 1
+                translated_count -= 1
+                break
+
+            record_trace_line(pc + 4)
+
+        if translated_count == 0:
+            return None
+        if not block_closed:
+            # Ran off the end of the program, hit the length limit or stopped before
+            # an instruction the translator leaves to the interpreter
+            body_lines += block_exit_lines('    ', instruction_index * 4)
+
+        register_loads = ', '.join(['_'] + [f'r{register}' for register in range(1, NUMBER_OF_REGISTERS)])
+        if self.trace_renderer is not None:
+            block_parameters = 'fields=fields, BINARY_HALFWORDS=BINARY_HALFWORDS, join_fields=join_fields, HALT=HALT'
+        elif self.trace_deltas:
+            block_parameters = 'HALT=HALT'
+        else:
+            block_parameters = 'format_trace_line=format_trace_line, HALT=HALT'
+        source_lines = [
+            f'def block_0x{start_pc:08X}(registers, memory, trace_lines, {block_parameters}):',
+            f'    {register_loads} = registers'
+        ] + body_lines + [
+            f'block_0x{start_pc:08X}.instruction_count = {translated_count}'
+        ]
+        return '\n'.join(source_lines) + '\n'
+
+    def translate_block(self, start_pc):
+        """Compile the block starting at start_pc and remember it"""
+        block_source = self.generate_block_source(start_pc)
+        if block_source is None:
+            return None
+
+        block_namespace = {'format_trace_line': self.format_trace_line, 'HALT': self.halt_signal}
+        if self.trace_renderer is not None:
+            block_namespace.update(fields=self.trace_renderer.fields, BINARY_HALFWORDS=self.trace_renderer.binary_halfwords,
+                                   join_fields="".join)
+        exec(compile(block_source, f'<block 0x{start_pc:08X}>', 'exec'), block_namespace)
+        block_function = block_namespace[f'block_0x{start_pc:08X}']
+        self.add_translated_block(start_pc, block_function)
+        return block_function
+
+    def add_translated_block(self, start_pc, block_function):
+        """Use block_function for start_pc and remember which code pages it came from"""
+        block_end_address = self.find_block_end(start_pc)
+        self.translated_blocks[start_pc] = block_function
+        self.block_end_addresses[start_pc] = block_end_address
+        for page_number in range(start_pc >> PAGE_SHIFT, ((block_end_address - 1) >> PAGE_SHIFT) + 1):
+            self.code_page_blocks.setdefault(page_number, set()).add(start_pc)
+
+    def track_code_stores(self, memory):
+        """Have memory report stores into the program's code pages to invalidate_code"""
+        program_end_address = len(self.decoded_program) * 4
+        if program_end_address:
+            for page_number in range(((program_end_address - 1) >> PAGE_SHIFT) + 1):
+                memory.add_store_listener(page_number, self.invalidate_code)
+
+    def invalidate_code(self, address, length):
+        """Store listener: forget blocks built from instructions in [address, address + length)"""
+        first_index = address >> 2
+        end_index = min((address + length + 3) >> 2, len(self.decoded_program))
+        if first_index >= end_index:
+            return False
+        self.code_changed = True
+        self.block_events.clear()
+        if self.loop_accelerator is not None:
+            self.loop_accelerator.forget_loops(first_index * 4, end_index * 4)
+
+        # The decoded entries have already been refreshed from memory
+        for instruction_index in range(first_index, end_index):
+            self.operation_names[instruction_index] = get_operation_name(self.decoded_program[instruction_index][0])
+            self.is_block_terminator[instruction_index] = self.ends_block(instruction_index)
+
+        start_address = first_index * 4
+        end_address = end_index * 4
+        for page_number in range(start_address >> PAGE_SHIFT, ((end_address - 1) >> PAGE_SHIFT) + 1):
+            page_blocks = self.code_page_blocks.get(page_number)
+            if not page_blocks:
+                continue
+            for block_start in list(page_blocks):
+                if block_start < end_address and start_address < self.block_end_addresses[block_start]:
+                    self.remove_translated_block(block_start)
+        return True
+
+    def remove_translated_block(self, start_pc):
+        block_end_address = self.block_end_addresses.pop(start_pc)
+        del self.translated_blocks[start_pc]
+        # Code that keeps rewriting itself has to get hot again before it is retranslated
+        self.block_entry_counts.pop(start_pc, None)
+        for page_number in range(start_pc >> PAGE_SHIFT, ((block_end_address - 1) >> PAGE_SHIFT) + 1):
+            self.code_page_blocks[page_number].discard(start_pc)
+
+    def summarize_events(self, pc, steps):
+        """(loads, stores, jumps, closing branch as (condition, rs1, rs2) or None) of the steps instructions from pc"""
+        from ExecutionHooks import ATOMIC_MEMORY_OPERATIONS, BRANCH_CONDITIONS, JUMP_OPERATIONS
+
+        first_index = pc >> 2
+        operation_names = self.operation_names[first_index:first_index + steps]
+        loads = operation_names.count('lw')
+        stores = operation_names.count('sw')
+        for operation_name in operation_names:
+            if operation_name in ATOMIC_MEMORY_OPERATIONS:
+                loads += 1
+                stores += 1
+        jumps = sum(operation_name in JUMP_OPERATIONS for operation_name in operation_names)
+        closing_branch = None
+        if operation_names[-1] in BRANCH_CONDITIONS:
+            _, _, rs1, rs2, _ = self.decoded_program[first_index + steps - 1]
+            closing_branch = (BRANCH_CONDITIONS[operation_names[-1]], rs1, rs2)
+        return loads, stores, jumps, closing_branch
+
+    def count_events(self, pc, steps, registers):
+        """Add the events of the steps instructions just run straight from pc to event_counts"""
+        block_events = self.block_events.get((pc, steps))
+        if block_events is None:
+            block_events = self.block_events[(pc, steps)] = self.summarize_events(pc, steps)
+        loads, stores, jumps, closing_branch = block_events
+        event_counts = self.event_counts
+        event_counts['loads'] += loads
+        event_counts['stores'] += stores
+        event_counts['jumps'] += jumps
+        # Branches write no register, so the registers still hold its operands
+        if closing_branch is not None and closing_branch[0](registers[closing_branch[1]], registers[closing_branch[2]]):
+            event_counts['taken_branches'] += 1
+
+    def interpret_block(self, pc, registers, memory, trace_lines, step_limit):
+        """Run decoded instructions one at a time until the end of the current block; returns (next PC or HALT, steps)"""
+        decoded_program = self.decoded_program
+        is_block_terminator = self.is_block_terminator
+        format_trace_line = self.format_trace_line
+        halt_signal = self.halt_signal
+        program_end_address = len(decoded_program) * 4
+        # With a renderer its fields follow every register write
+        fields = self.trace_renderer.fields if self.trace_renderer is not None else None
+        render_field = self.trace_renderer.render_field if self.trace_renderer is not None else None
+        trace_deltas = self.trace_deltas
+
+        steps_executed = 0
+        try:
+            while steps_executed < step_limit and 0 <= pc < program_end_address and not pc & 3:
+                handler, rd, rs1, rs2, immediate = decoded_program[pc >> 2]
+                next_pc = handler(registers, memory, rd, rs1, rs2, immediate, pc)
+                steps_executed += 1
+
+                if next_pc is halt_signal:
+                    trace_lines.append((pc, 0, 0) if trace_deltas else format_trace_line(pc, *registers))
+                    return halt_signal, steps_executed
+
+                registers[0] = 0
+                if trace_deltas:
+                    trace_lines.append((next_pc, rd, registers[rd]))
+                elif fields is None:
+                    trace_lines.append(format_trace_line(next_pc, *registers))
+                else:
+                    fields[rd + 1] = render_field(registers[rd])
+                    fields[0] = render_field(next_pc)
+                    trace_lines.append("".join(fields))
+                if is_block_terminator[pc >> 2]:
+                    return next_pc, steps_executed
+                pc = next_pc
+        except MachineLevelInstruction:
+            pass
+
+        return pc, steps_executed
+
+    def run(self, registers, memory, trace_lines, pc=0, max_steps=None):
+        """Execute from pc until halt, the end of the program or max_steps instructions; returns (next PC or HALT, steps, halting PC)"""
+        program_end_address = len(self.decoded_program) * 4
+        translated_blocks = self.translated_blocks
+        block_entry_counts = self.block_entry_counts
+        halt_signal = self.halt_signal
+        step_limit = sys.maxsize if max_steps is None else max_steps
+        counted_loops = self.loop_accelerator.counted_loops if self.loop_accelerator is not None else {}
+        breakpoint_map = self.breakpoint_map
+        event_counts = self.event_counts
+        # Stores made while this engine was not running (other harts, sc.w) do not count
+        self.code_changed = False
+        # Registers may have been changed since the renderer last saw them
+        if self.trace_renderer is not None:
+            self.trace_renderer.render_registers(registers)
+
+        steps_executed = 0
+        while steps_executed < step_limit and 0 <= pc < program_end_address and not pc & 3:
+            if breakpoint_map is not None and breakpoint_map[pc >> 2]:
+                break
+            if counted_loops and pc in counted_loops:
+                fast_forward_result = self.loop_accelerator.fast_forward(pc, registers, trace_lines, step_limit - steps_executed)
+                if fast_forward_result is not None:
+                    next_pc, loop_steps = fast_forward_result
+                    if event_counts is not None:
+                        # Only the loop branch counts: taken on every iteration but an exiting last one
+                        iterations = loop_steps // (((counted_loops[pc].branch_pc - pc) >> 2) + 1)
+                        event_counts['taken_branches'] += iterations - (next_pc != pc)
+                    pc = next_pc
+                    steps_executed += loop_steps
+                    if self.trace_renderer is not None:
+                        self.trace_renderer.render_registers(registers)
+                    continue
+
+            block_function = translated_blocks.get(pc)
+
+            if block_function is None:
+                entry_count = block_entry_counts.get(pc, 0) + 1
+                block_entry_counts[pc] = entry_count
+                if entry_count >= self.hotness_threshold:
+                    block_function = self.translate_block(pc)
+
+            if block_function is not None and steps_executed + block_function.instruction_count <= step_limit:
+                next_pc = block_function(registers, memory, trace_lines)
+                if self.code_changed:
+                    # The block stopped right after the store that rewrote code
+                    self.code_changed = False
+                    if event_counts is not None:
+                        self.count_events(pc, (next_pc - pc) >> 2, registers)
+                    steps_executed += (next_pc - pc) >> 2
+                else:
+                    if event_counts is not None:
+                        self.count_events(pc, block_function.instruction_count, registers)
+                    steps_executed += block_function.instruction_count
+                    if next_pc is halt_signal:
+                        # Only the block's last instruction can halt
+                        return halt_signal, steps_executed, pc + (block_function.instruction_count - 1) * 4
+            else:
+                next_pc, block_steps = self.interpret_block(pc, registers, memory, trace_lines, step_limit - steps_executed)
+                self.code_changed = False
+                if block_steps == 0:
+                    # Stopped in front of an instruction the Machine runs itself
+                    break
+                if event_counts is not None:
+                    self.count_events(pc, block_steps, registers)
+                steps_executed += block_steps
+                if next_pc is halt_signal:
+                    return halt_signal, steps_executed, pc + (block_steps - 1) * 4
+            pc = next_pc
+
+        return pc, steps_executed, None
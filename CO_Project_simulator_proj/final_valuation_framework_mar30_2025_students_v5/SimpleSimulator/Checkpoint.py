@@ -0,0 +1,133 @@
+# Checkpoint and resume for Machine runs
+#
+# A checkpoint holds everything needed to carry on with a run: PC, halt flag,
+# instruction count, registers, hpmcounter event counts, every allocated
+# memory page (program pages included, so self-modified code survives) and the
+# point the trace file had been written up to when it was taken
+# (TraceWriter.sync). The file is a short header followed by one
+# zlib-compressed payload; untouched pages are not stored and zero-filled
+# pages compress to almost nothing.
+#
+# The trace streams through a TraceWriter as in any other run and is synced at
+# every checkpoint. Resuming truncates the trace file back to the checkpoint's
+# position and appends from there, so lines traced after the checkpoint by a
+# run that later died are dropped and produced again.
+
+import hashlib
+import os
+import struct
+import zlib
+
+from PagedMemory import PAGE_SHIFT
+from PerformanceCounters import HPM_EVENTS
+
+CHECKPOINT_MAGIC = b'RVSIMCKP'
+CHECKPOINT_FORMAT_VERSION = 3
+
+# program digest, PC, instructions retired, halted, trace position, held-back
+# trace whitespace length, 32 registers, count of each HPM_EVENTS event, page
+# count; the whitespace follows
+CHECKPOINT_STATE_FORMAT = f'<32sIQ?QH32I{len(HPM_EVENTS)}QI'
+CHECKPOINT_PAGE_NUMBER_FORMAT = '<I'
+
+def compute_program_digest(instruction_list):
+    """Digest of the program text (or image words), so a checkpoint is never resumed with a different program"""
+    if not isinstance(instruction_list, (list, tuple)):
+        return hashlib.sha256(instruction_list.astype('<u4').tobytes()).digest()
+    program_lines = [instruction_line.strip() for instruction_line in instruction_list if instruction_line.strip()]
+    return hashlib.sha256("\n".join(program_lines).encode()).digest()
+
+def save_checkpoint(checkpoint_path, machine, trace_resume_point):
+    """Write machine's state and the trace's resume point (from TraceWriter.sync) to checkpoint_path (atomically)"""
+    trace_position, trace_whitespace = trace_resume_point
+    trace_whitespace = trace_whitespace.encode()
+    memory_pages = machine.memory.page_contents()
+    if machine.performance_counters is None:
+        event_counts = [0] * len(HPM_EVENTS)
+    else:
+        event_counts = [machine.performance_counters.event_counts[event_name] for event_name in HPM_EVENTS]
+    payload_parts = [struct.pack(CHECKPOINT_STATE_FORMAT, compute_program_digest(machine.instruction_list),
+                                 machine.pc, machine.instructions_retired, machine.halted, trace_position,
+                                 len(trace_whitespace), *machine.registers, *event_counts, len(memory_pages)),
+                     trace_whitespace]
+    for page_number in sorted(memory_pages):
+        payload_parts.append(struct.pack(CHECKPOINT_PAGE_NUMBER_FORMAT, page_number))
+        payload_parts.append(memory_pages[page_number])
+
+    temporary_path = f"{checkpoint_path}.{os.getpid()}.tmp"
+    with open(temporary_path, "wb") as checkpoint_file:
+        checkpoint_file.write(CHECKPOINT_MAGIC + struct.pack('<H', CHECKPOINT_FORMAT_VERSION))
+        checkpoint_file.write(zlib.compress(b"".join(payload_parts)))
+    os.replace(temporary_path, checkpoint_path)
+
+def load_checkpoint(checkpoint_path, machine):
+    """Restore a checkpoint into machine (which must already have the same program loaded); returns the trace's resume point"""
+    with open(checkpoint_path, "rb") as checkpoint_file:
+        checkpoint_data = checkpoint_file.read()
+
+    header_size = len(CHECKPOINT_MAGIC) + 2
+    if checkpoint_data[:len(CHECKPOINT_MAGIC)] != CHECKPOINT_MAGIC:
+        raise ValueError(f"Not a simulator checkpoint: {checkpoint_path}")
+    format_version, = struct.unpack('<H', checkpoint_data[len(CHECKPOINT_MAGIC):header_size])
+    if format_version != CHECKPOINT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported checkpoint format version {format_version}: {checkpoint_path}")
+    payload = zlib.decompress(checkpoint_data[header_size:])
+
+    state_size = struct.calcsize(CHECKPOINT_STATE_FORMAT)
+    state_fields = struct.unpack(CHECKPOINT_STATE_FORMAT, payload[:state_size])
+    program_digest, pc, instructions_retired, halted, trace_position, trace_whitespace_length = state_fields[:6]
+    registers_end = 6 + len(machine.registers)
+    registers = state_fields[6:registers_end]
+    event_counts = state_fields[registers_end:-1]
+    page_count = state_fields[-1]
+    if program_digest != compute_program_digest(machine.instruction_list):
+        raise ValueError(f"Checkpoint {checkpoint_path} was taken for a different program")
+
+    machine.pc = pc
+    machine.instructions_retired = instructions_retired
+    machine.halted = halted
+    machine.registers[:] = registers
+    # Counted events carry on from where they were, so hpmcounter reads agree
+    # with an uninterrupted run
+    if machine.performance_counters is not None or any(event_counts):
+        machine.get_performance_counters().event_counts.update(zip(HPM_EVENTS, event_counts))
+
+    trace_whitespace = payload[state_size:state_size + trace_whitespace_length].decode()
+
+    # Pages go back through write_bytes so stores into code re-decode it
+    page_offset = state_size + trace_whitespace_length
+    page_record_size = struct.calcsize(CHECKPOINT_PAGE_NUMBER_FORMAT)
+    for _ in range(page_count):
+        page_number, = struct.unpack(CHECKPOINT_PAGE_NUMBER_FORMAT, payload[page_offset:page_offset + page_record_size])
+        page_offset += page_record_size
+        page_end = page_offset + (1 << PAGE_SHIFT)
+        machine.memory.write_bytes(page_number << PAGE_SHIFT, payload[page_offset:page_end])
+        page_offset = page_end
+    return trace_position, trace_whitespace
+
+class CheckpointedTrace:
+    """Checkpoints every checkpoint_interval instructions of a run whose trace streams through trace_writer"""
+
+    def __init__(self, trace_writer, checkpoint_path, checkpoint_interval=None):
+        self.trace_writer = trace_writer
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_interval = checkpoint_interval
+        self.next_checkpoint_at = None
+
+    def save(self, machine):
+        save_checkpoint(self.checkpoint_path, machine, self.trace_writer.sync())
+
+    def after_slice(self, machine):
+        """Watchdog callback: stream the trace, and checkpoint once another checkpoint_interval instructions have run"""
+        self.trace_writer.after_slice(machine)
+        if not self.checkpoint_interval:
+            return
+        if self.next_checkpoint_at is None:
+            self.next_checkpoint_at = machine.instructions_retired - machine.instructions_retired % self.checkpoint_interval + self.checkpoint_interval
+        if machine.instructions_retired >= self.next_checkpoint_at:
+            self.save(machine)
+            self.next_checkpoint_at = machine.instructions_retired + self.checkpoint_interval
+
+    def finish(self, final_lines):
+        """Write the rest of the trace and final_lines and close the file"""
+        self.trace_writer.finish(final_lines)
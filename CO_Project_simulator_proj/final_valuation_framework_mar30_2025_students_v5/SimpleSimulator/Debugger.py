@@ -0,0 +1,438 @@
+# Interactive debugger for Simulator5 programs
+#
+#   python3 Debugger.py input_machine_code_file
+#
+# Breakpoints live in a bitmap with one byte per instruction. The block engine
+# only looks at it when control enters a block, and blocks are split so that
+# every breakpoint starts one, so "continue" runs translated blocks at full
+# speed and stops in front of the first breakpoint reached; nothing is checked
+# per instruction. "step" runs single instructions through the interpreter.
+#
+# Watchpoints mark the pages they cover in PagedMemory, so only loads and
+# stores to those pages leave the fast path. An engine slice that touched a
+# watched range is replayed from the nearest snapshot one instruction at a
+# time to find the access, and the run stops right after it with the PC and
+# the old and new values.
+#
+# Every SNAPSHOT_INTERVAL instructions the machine state (PC, registers,
+# memory pages, reservation) is saved. Reverse-stepping restores the latest
+# snapshot at or before the target instruction count and replays forward from
+# it, so going back costs at most one interval of interpretation. Only the
+# latest SNAPSHOT_HISTORY_DEPTH snapshots are kept, which bounds both memory
+# and how far back a session can go.
+#
+# Registers are shown and read by their ABI names from register_name_mapping
+# (x0..x31 work as well).
+
+import bisect
+import cmd
+import sys
+from collections import deque
+
+from BlockTranslator import get_operation_name
+from PagedMemory import PAGE_SHIFT
+from Watchdog import RUN_HALTED, RUN_LEFT_PROGRAM, RUN_STEP_BUDGET
+
+SNAPSHOT_INTERVAL = 16384
+SNAPSHOT_HISTORY_DEPTH = 64
+
+# Reasons a debugger run ends besides the Watchdog ones
+STOP_BREAKPOINT = 'breakpoint'
+STOP_WATCHPOINT = 'watchpoint'
+
+class Debugger:
+
+    def __init__(self, machine, snapshot_interval=SNAPSHOT_INTERVAL, history_depth=SNAPSHOT_HISTORY_DEPTH):
+        from Simulator5 import register_name_mapping
+
+        self.machine = machine
+        self.snapshot_interval = snapshot_interval
+        self.register_names = list(register_name_mapping.values())
+        self.register_numbers = {register_name: register_number for register_number, register_name in enumerate(self.register_names)}
+        self.register_numbers.update({f'x{register_number}': register_number for register_number in range(len(self.register_names))})
+
+        self.breakpoint_map = bytearray(len(machine.decoded_program))
+        machine.get_block_engine().set_breakpoint_map(self.breakpoint_map)
+        # Trace lines are not kept; the engines just need somewhere to put them
+        self.trace_sink = []
+
+        # (start address, end address, stop on loads, stop on stores); accesses
+        # seen while armed, and the (pc, is_store, address, length, old value,
+        # new value) accesses the last run stopped for
+        self.watchpoints = []
+        self.watched_pages = set()
+        self.watch_armed = True
+        self.pending_accesses = []
+        self.watch_hits = []
+
+        # Instructions retired -> saved state, and the sorted counts of the
+        # latest history_depth snapshots
+        self.snapshots = {}
+        self.snapshot_counts = deque(maxlen=history_depth)
+        self.next_snapshot_at = machine.instructions_retired
+        self.take_due_snapshot()
+
+    def add_breakpoint(self, pc):
+        if not (0 <= pc < len(self.breakpoint_map) * 4 and not pc & 3):
+            raise ValueError(f"No instruction at 0x{pc:08X}")
+        self.breakpoint_map[pc >> 2] = 1
+        self.machine.get_block_engine().set_breakpoint_map(self.breakpoint_map)
+
+    def remove_breakpoint(self, pc):
+        if not (0 <= pc < len(self.breakpoint_map) * 4 and not pc & 3) or not self.breakpoint_map[pc >> 2]:
+            raise ValueError(f"No breakpoint at 0x{pc:08X}")
+        self.breakpoint_map[pc >> 2] = 0
+        self.machine.get_block_engine().set_breakpoint_map(self.breakpoint_map)
+
+    def breakpoints(self):
+        return [instruction_index * 4 for instruction_index, is_set in enumerate(self.breakpoint_map) if is_set]
+
+    def add_watchpoint(self, address, length=4, on_load=False, on_store=True):
+        """Stop after any load (on_load) or store (on_store) touching [address, address + length)"""
+        if length <= 0 or not (on_load or on_store):
+            raise ValueError("A watchpoint needs a length and an access kind")
+        self.watchpoints.append((address, address + length, on_load, on_store))
+        self.update_watched_pages()
+
+    def remove_watchpoint(self, address):
+        remaining_watchpoints = [watchpoint for watchpoint in self.watchpoints if watchpoint[0] != address]
+        if len(remaining_watchpoints) == len(self.watchpoints):
+            raise ValueError(f"No watchpoint at 0x{address:08X}")
+        self.watchpoints = remaining_watchpoints
+        self.update_watched_pages()
+
+    def update_watched_pages(self):
+        memory = self.machine.memory
+        watched_pages = set()
+        for start_address, end_address, _, _ in self.watchpoints:
+            watched_pages.update(range(start_address >> PAGE_SHIFT, ((end_address - 1) >> PAGE_SHIFT) + 1))
+        for page_number in self.watched_pages - watched_pages:
+            memory.remove_access_watcher(page_number, self.record_access)
+        for page_number in watched_pages - self.watched_pages:
+            memory.add_access_watcher(page_number, self.record_access)
+        self.watched_pages = watched_pages
+
+    def record_access(self, is_store, address, length, old_value, new_value):
+        """PagedMemory watcher: note accesses that hit a watchpoint"""
+        if not self.watch_armed:
+            return
+        for start_address, end_address, on_load, on_store in self.watchpoints:
+            if address < end_address and start_address < address + length and (on_store if is_store else on_load):
+                self.pending_accesses.append((is_store, address, length, old_value, new_value))
+                return
+
+    def is_running(self):
+        return not self.machine.halted and not self.machine.left_program()
+
+    def take_due_snapshot(self):
+        machine = self.machine
+        if machine.instructions_retired < self.next_snapshot_at:
+            return
+        if machine.instructions_retired not in self.snapshots:
+            if len(self.snapshot_counts) == self.snapshot_counts.maxlen:
+                del self.snapshots[self.snapshot_counts.popleft()]
+            self.snapshots[machine.instructions_retired] = (machine.pc, machine.halted, tuple(machine.registers),
+                                                            machine.reservation_address, machine.memory.page_contents())
+            bisect.insort(self.snapshot_counts, machine.instructions_retired)
+        self.next_snapshot_at = machine.instructions_retired - machine.instructions_retired % self.snapshot_interval + self.snapshot_interval
+
+    def restore_snapshot(self, instructions_retired):
+        """Put the machine back in the state saved after instructions_retired instructions"""
+        pc, halted, registers, reservation_address, memory_pages = self.snapshots[instructions_retired]
+        machine = self.machine
+        memory = machine.memory
+
+        # Only pages that changed are written back, so untouched code keeps its
+        # translated blocks; pages allocated since are zeroed
+        self.watch_armed = False
+        current_pages = memory.page_contents()
+        for page_number, page_bytes in memory_pages.items():
+            if current_pages.get(page_number) != page_bytes:
+                memory.write_bytes(page_number << PAGE_SHIFT, page_bytes)
+        for page_number in current_pages.keys() - memory_pages.keys():
+            memory.write_bytes(page_number << PAGE_SHIFT, bytes(1 << PAGE_SHIFT))
+        self.watch_armed = True
+
+        # The reservation goes last, as the writes above would drop it
+        machine.drop_reservation()
+        if reservation_address is not None:
+            machine.reservation_address = reservation_address
+            machine.reservation_page = reservation_address >> PAGE_SHIFT
+            memory.add_store_listener(machine.reservation_page, machine.break_reservation)
+
+        machine.pc = pc
+        machine.halted = halted
+        machine.registers[:] = registers
+        machine.instructions_retired = instructions_retired
+        self.next_snapshot_at = instructions_retired - instructions_retired % self.snapshot_interval + self.snapshot_interval
+
+    def step(self, count=1):
+        """Run up to count instructions one at a time, stopping after one that hits a watchpoint; returns how many ran"""
+        machine = self.machine
+        steps_executed = 0
+        self.watch_hits = []
+        while steps_executed < count and self.is_running():
+            pc = machine.pc
+            retired_before = machine.instructions_retired
+            self.pending_accesses.clear()
+            machine.run(trace_sink=self.trace_sink, max_steps=1, engine='interpreter')
+            self.trace_sink.clear()
+            steps_executed += machine.instructions_retired - retired_before
+            self.take_due_snapshot()
+            if self.pending_accesses:
+                self.watch_hits = [(pc,) + access for access in self.pending_accesses]
+                self.pending_accesses.clear()
+                break
+        return steps_executed
+
+    def find_watched_access(self, slice_start, slice_steps):
+        """Rewind to slice_start and step through the slice up to the first instruction that hits a watchpoint"""
+        machine = self.machine
+        snapshot_count = self.snapshot_counts[bisect.bisect_right(self.snapshot_counts, slice_start) - 1]
+        self.restore_snapshot(snapshot_count)
+        self.watch_armed = False
+        machine.run(trace_sink=self.trace_sink, max_steps=slice_start - snapshot_count, engine='interpreter')
+        self.trace_sink.clear()
+        self.watch_armed = True
+        self.step(slice_steps)
+
+    def continue_running(self, max_steps=None):
+        """Run on the block engine until a breakpoint, halt, leaving the program or max_steps instructions; returns why it stopped"""
+        machine = self.machine
+        block_engine = machine.get_block_engine()
+        steps_left = sys.maxsize if max_steps is None else max_steps
+
+        # The breakpoint stopped at is stepped over, not hit again
+        self.watch_hits = []
+        if steps_left and self.is_running() and self.breakpoint_map[machine.pc >> 2]:
+            steps_left -= self.step()
+
+        while self.is_running():
+            if self.watch_hits:
+                return STOP_WATCHPOINT
+            if self.breakpoint_map[machine.pc >> 2]:
+                return STOP_BREAKPOINT
+            if steps_left <= 0:
+                return RUN_STEP_BUDGET
+
+            # Slices end at snapshot points so snapshots stay evenly spaced
+            slice_steps = min(steps_left, self.next_snapshot_at - machine.instructions_retired)
+            slice_start = machine.instructions_retired
+            self.pending_accesses.clear()
+            next_pc, steps_executed, halt_pc = block_engine.run(machine.registers, machine.memory, self.trace_sink, machine.pc, slice_steps)
+            self.trace_sink.clear()
+            if self.pending_accesses:
+                # Somewhere in this slice; replay it to find the instruction
+                self.find_watched_access(slice_start, steps_executed)
+                return STOP_WATCHPOINT
+            if steps_executed == 0:
+                # Stopped in front of an instruction the Machine runs itself
+                steps_left -= self.step()
+                continue
+
+            machine.instructions_retired += steps_executed
+            steps_left -= steps_executed
+            if next_pc is block_engine.halt_signal:
+                machine.pc = halt_pc
+                machine.halted = True
+            else:
+                machine.pc = next_pc
+            self.take_due_snapshot()
+
+        if self.watch_hits:
+            return STOP_WATCHPOINT
+        return RUN_HALTED if machine.halted else RUN_LEFT_PROGRAM
+
+    def reverse_step(self, count=1):
+        """Go back count instructions (not past the oldest snapshot) by replaying from the nearest snapshot; returns how many"""
+        machine = self.machine
+        target_count = max(machine.instructions_retired - count, self.snapshot_counts[0])
+        steps_back = machine.instructions_retired - target_count
+        snapshot_count = self.snapshot_counts[bisect.bisect_right(self.snapshot_counts, target_count) - 1]
+        self.restore_snapshot(snapshot_count)
+        # Replaying is deterministic; the interpreter stops exactly at the count
+        self.watch_armed = False
+        machine.run(trace_sink=self.trace_sink, max_steps=target_count - snapshot_count, engine='interpreter')
+        self.trace_sink.clear()
+        self.watch_armed = True
+        self.watch_hits = []
+        self.take_due_snapshot()
+        return steps_back
+
+    def read_register(self, register_name):
+        """Value of a register given by ABI name (or x0..x31), or of 'pc'"""
+        if register_name == 'pc':
+            return self.machine.pc
+        if register_name not in self.register_numbers:
+            raise ValueError(f"Unknown register: {register_name}")
+        return self.machine.registers[self.register_numbers[register_name]]
+
+    def format_registers(self):
+        register_lines = [f"pc   0x{self.machine.pc:08X}  retired {self.machine.instructions_retired}\n"]
+        for register_number, register_name in enumerate(self.register_names):
+            register_value = self.machine.registers[register_number]
+            register_lines.append(f"{register_name:<5}0x{register_value:08X}  {register_value - ((register_value & 0x80000000) << 1)}\n")
+        return register_lines
+
+    def format_instruction(self, pc):
+        """'0x00000010  addi rd=a0 rs1=a0 rs2=zero imm=1' for the decoded instruction at pc"""
+        handler, rd, rs1, rs2, immediate = self.machine.decoded_program[pc >> 2]
+        marker = '*' if self.breakpoint_map[pc >> 2] else ' '
+        operation_name = get_operation_name(handler)
+        if operation_name == 'invalid':
+            return f"{marker}0x{pc:08X}  invalid ({immediate})"
+        return (f"{marker}0x{pc:08X}  {operation_name} rd={self.register_names[rd]} rs1={self.register_names[rs1]}"
+                f" rs2={self.register_names[rs2]} imm={immediate}")
+
+    def format_watch_hits(self):
+        return [f"{'store' if is_store else 'load'} 0x{address:08X} at pc 0x{pc:08X}: 0x{old_value:0{length * 2}X}"
+                + (f" -> 0x{new_value:0{length * 2}X}" if is_store else "") + "\n"
+                for pc, is_store, address, length, old_value, new_value in self.watch_hits]
+
+    def format_location(self):
+        machine = self.machine
+        if machine.halted:
+            return f"halted at 0x{machine.pc:08X} after {machine.instructions_retired} instructions"
+        if machine.left_program():
+            return f"left the program at 0x{machine.pc:08X} after {machine.instructions_retired} instructions"
+        return f"{self.format_instruction(machine.pc)}  (retired {machine.instructions_retired})"
+
+def parse_address(text):
+    return int(text, 0)
+
+class DebuggerShell(cmd.Cmd):
+    """Command loop over a Debugger"""
+
+    prompt = "(rvdb) "
+
+    def __init__(self, debugger):
+        super().__init__()
+        self.debugger = debugger
+        self.intro = "Simulator5 debugger; 'help' lists commands\n" + debugger.format_location()
+
+    def onecmd(self, line):
+        try:
+            return super().onecmd(line)
+        except ValueError as error:
+            print(error)
+            return False
+
+    def emptyline(self):
+        return False
+
+    def do_break(self, argument):
+        """break [ADDR]: stop in front of the instruction at ADDR; lists the breakpoints without ADDR"""
+        if not argument:
+            for pc in self.debugger.breakpoints():
+                print(self.debugger.format_instruction(pc))
+            return
+        self.debugger.add_breakpoint(parse_address(argument))
+
+    def do_delete(self, argument):
+        """delete ADDR: remove the breakpoint at ADDR"""
+        self.debugger.remove_breakpoint(parse_address(argument))
+
+    def add_watchpoint(self, argument, on_load, on_store):
+        argument_fields = argument.split()
+        if not argument_fields:
+            raise ValueError("A watchpoint needs an address")
+        length = int(argument_fields[1], 0) if len(argument_fields) > 1 else 4
+        self.debugger.add_watchpoint(parse_address(argument_fields[0]), length, on_load, on_store)
+
+    def do_watch(self, argument):
+        """watch ADDR [BYTES]: stop after any store into BYTES (default 4) bytes from ADDR"""
+        self.add_watchpoint(argument, False, True)
+
+    def do_rwatch(self, argument):
+        """rwatch ADDR [BYTES]: stop after any load from the range"""
+        self.add_watchpoint(argument, True, False)
+
+    def do_awatch(self, argument):
+        """awatch ADDR [BYTES]: stop after any load from or store into the range"""
+        self.add_watchpoint(argument, True, True)
+
+    def do_unwatch(self, argument):
+        """unwatch ADDR: remove the watchpoints starting at ADDR"""
+        self.debugger.remove_watchpoint(parse_address(argument))
+
+    def do_continue(self, argument):
+        """continue [N]: run until a breakpoint, a watchpoint, the end of the program or N instructions"""
+        stop_reason = self.debugger.continue_running(int(argument) if argument else None)
+        sys.stdout.write("".join(self.debugger.format_watch_hits()))
+        print(f"[{stop_reason}] {self.debugger.format_location()}")
+
+    def do_step(self, argument):
+        """step [N]: run N instructions (default 1), stopping early at a watchpoint"""
+        self.debugger.step(int(argument) if argument else 1)
+        sys.stdout.write("".join(self.debugger.format_watch_hits()))
+        print(self.debugger.format_location())
+
+    def do_rstep(self, argument):
+        """rstep [N]: go back N instructions (default 1)"""
+        step_count = int(argument) if argument else 1
+        steps_back = self.debugger.reverse_step(step_count)
+        if steps_back < step_count and self.debugger.machine.instructions_retired:
+            print(f"History only reaches back {steps_back} instructions")
+        print(self.debugger.format_location())
+
+    def do_regs(self, argument):
+        """regs: every register by ABI name, in hex and signed decimal"""
+        sys.stdout.write("".join(self.debugger.format_registers()))
+
+    def do_print(self, argument):
+        """print NAME ...: registers by ABI name (a0, sp, ...), xN or pc"""
+        for register_name in argument.split():
+            register_value = self.debugger.read_register(register_name)
+            print(f"{register_name} = 0x{register_value:08X} ({register_value - ((register_value & 0x80000000) << 1)})")
+
+    def do_mem(self, argument):
+        """mem ADDR [WORDS]: memory words from ADDR"""
+        argument_fields = argument.split()
+        if not argument_fields:
+            raise ValueError("mem needs an address")
+        address = parse_address(argument_fields[0])
+        word_count = int(argument_fields[1]) if len(argument_fields) > 1 else 1
+        for word_index in range(word_count):
+            word_address = (address + word_index * 4) & 0xFFFFFFFF
+            print(f"0x{word_address:08X}: 0x{self.debugger.machine.memory.load_word(word_address):08X}")
+
+    def do_list(self, argument):
+        """list [ADDR [COUNT]]: decoded instructions, from the PC by default"""
+        argument_fields = argument.split()
+        start_pc = parse_address(argument_fields[0]) if argument_fields else self.debugger.machine.pc
+        instruction_count = int(argument_fields[1]) if len(argument_fields) > 1 else 8
+        program_end_address = len(self.debugger.breakpoint_map) * 4
+        for pc in range(start_pc & ~3, min(start_pc + instruction_count * 4, program_end_address), 4):
+            print(self.debugger.format_instruction(pc))
+
+    def do_where(self, argument):
+        """where: the current instruction and instruction count"""
+        print(self.debugger.format_location())
+
+    def do_quit(self, argument):
+        """quit: leave the debugger"""
+        return True
+
+    do_EOF = do_quit
+    do_b = do_break
+    do_c = do_continue
+    do_s = do_step
+    do_p = do_print
+    do_q = do_quit
+
+def main():
+    if len(sys.argv) != 2:
+        print("Usage: python3 Debugger.py input_machine_code_file")
+        sys.exit(1)
+    from Simulator5 import Machine, read_program_file
+    try:
+        instruction_list = read_program_file(sys.argv[1])
+    except ValueError as error:
+        print(error)
+        sys.exit(1)
+    machine = Machine()
+    machine.load_program(instruction_list)
+    DebuggerShell(Debugger(machine)).cmdloop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+# Registry of simulator engines behind one program-in/trace-out interface
+#
+# An engine is a function run_engine(input_file_path, output_file_path,
+# **run_options) that reads a machine-code file, writes its trace file and
+# returns why the run ended (a Watchdog RUN_* reason), which is all SimGrader
+# asks of Simulator.py. Run options are simulate_program's keywords (budgets,
+# data images, checkpoints, trace format); engines that cannot honour an
+# option refuse it. Every implementation in this directory is registered:
+#   simulator1, simulator2   the decimal-string scripts, unsupported (see below)
+#   simulator3               a binary-string module, unsupported (see below)
+#   simulator4               the binary-string module driven by the decode loop
+#                            Simulator5 started from
+#   interpreter, blocks, compiled, fast-forward, batch
+#                            the Simulator5 engines
+# Simulator1-3 never produced a trace, so they are registered as unsupported
+# with the reason: running one raises ValueError, and compare_engines reports
+# the reason instead of running it. Each run of Simulator4 gets freshly loaded
+# module globals, as it keeps registers and memory at module level. Modules
+# are found through the import system, so the registry also works from the
+# zipapp.
+#
+# compare_engines runs every engine on a directory of tests and reports, side
+# by side, how many traces agree with the reference traces and how many
+# instructions per second each engine retired (one trace line per instruction).
+
+import io
+import os
+import sys
+import time
+
+from Watchdog import RUN_HALTED
+
+# contextlib, importlib and tempfile are only imported by the paths
+# that need them, to keep the default engine's startup short
+
+SIMULATOR_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_ENGINE = 'compiled'
+
+# Engine name -> (run function, one-line description), in registration order
+SIMULATION_ENGINE_REGISTRY = {}
+# Engine name -> why it cannot run programs
+UNSUPPORTED_ENGINES = {}
+
+def register_engine(engine_name, description):
+    """Decorator adding run_engine(input_file_path, output_file_path, **run_options) to the registry under engine_name"""
+    def register(run_engine):
+        SIMULATION_ENGINE_REGISTRY[engine_name] = (run_engine, description)
+        return run_engine
+    return register
+
+def run_engine(engine_name, input_file_path, output_file_path, **run_options):
+    """Run one program on engine_name; returns why the run ended"""
+    if engine_name not in SIMULATION_ENGINE_REGISTRY:
+        raise ValueError(f"Unknown engine: {engine_name}")
+    return SIMULATION_ENGINE_REGISTRY[engine_name][0](input_file_path, output_file_path, **run_options)
+
+def register_unsupported_engine(engine_name, description, reason):
+    """Register an implementation that cannot run programs; running it raises ValueError with the reason"""
+    UNSUPPORTED_ENGINES[engine_name] = reason
+
+    @register_engine(engine_name, description)
+    def run_unsupported(input_file_path, output_file_path, **run_options):
+        raise ValueError(f"Engine {engine_name} is unsupported: {reason}")
+
+def refuse_run_options(engine_name, run_options):
+    if run_options:
+        raise ValueError(f"Engine {engine_name} does not support: {', '.join(sorted(run_options))}")
+
+def read_program(input_file_path):
+    with open(input_file_path, "r") as input_file:
+        return input_file.readlines()
+
+def run_binary_string_simulator(module_name, input_file_path, output_file_path):
+    """Drive a Simulator3/4-style module (binary-string registers, execute_<type>_type_instruction functions)"""
+    import importlib.util
+    module_spec = importlib.util.find_spec(module_name)
+    simulator = importlib.util.module_from_spec(module_spec)
+    module_spec.loader.exec_module(simulator)
+    registers = simulator.register_current_values
+
+    program_lines = [instruction_line.strip() for instruction_line in read_program(input_file_path) if instruction_line.strip()]
+    trace_lines = []
+    pc_value = 0
+    while 0 <= pc_value < len(program_lines) * 4 and not pc_value & 3:
+        instruction = program_lines[pc_value >> 2]
+        opcode_value = instruction[-7:]
+        if opcode_value not in simulator.instruction_definitions:
+            raise ValueError("Invalid opcode in instruction")
+        instruction_type = simulator.instruction_type_categories[opcode_value]
+        rs2_value = instruction[7:12]
+        rs1_value = instruction[12:17]
+        funct3_value = instruction[17:20]
+        rd_value = instruction[20:25]
+
+        if instruction_type == 'R':
+            if not simulator.validate_R_type_instruction(opcode_value, instruction[:7], funct3_value):
+                raise ValueError("Invalid R-type instruction")
+            simulator.execute_R_type_instruction(opcode_value, instruction[:7], rs2_value, rs1_value, funct3_value, rd_value)
+            next_pc_value = pc_value + 4
+        elif instruction_type == 'I':
+            if not simulator.validate_I_type_instruction(opcode_value, funct3_value):
+                raise ValueError("Invalid I-type instruction")
+            next_pc_value = simulator.execute_I_type_instruction(instruction[:12], rs1_value, funct3_value, rd_value,
+                                                                 opcode_value, pc_value, instruction)
+        elif instruction_type == 'S':
+            if not simulator.validate_S_type_instruction(opcode_value, funct3_value):
+                raise ValueError("Invalid S-type instruction")
+            next_pc_value = simulator.execute_S_type_instruction(opcode_value, instruction[:7] + instruction[20:25],
+                                                                 rs1_value, rs2_value, funct3_value, pc_value)
+        elif instruction_type == 'B':
+            if not simulator.validate_B_type_instruction(opcode_value, funct3_value):
+                raise ValueError("Invalid B-type instruction")
+            branch_immediate = instruction[0] + instruction[24] + instruction[1:7] + instruction[20:24]
+            next_pc_value = simulator.execute_B_type_instruction(opcode_value, branch_immediate, rs1_value, rs2_value,
+                                                                 pc_value, funct3_value)
+        else:
+            if not simulator.validate_J_type_instruction(opcode_value):
+                raise ValueError("Invalid J-type instruction")
+            jump_immediate = instruction[0] + instruction[12:20] + instruction[11] + instruction[1:11] + '0'
+            next_pc_value = simulator.execute_J_type_instruction(opcode_value, jump_immediate, rd_value, pc_value)
+
+        registers['00000'] = '0' * 32
+        halted = next_pc_value == 'HALT'
+        trace_pc_value = pc_value if halted else next_pc_value
+        trace_lines.append(f"0b{trace_pc_value:032b} " + "".join(f"0b{registers[register_code]} " for register_code in registers) + "\n")
+        if halted:
+            break
+        pc_value = next_pc_value
+
+    for mem_address in range(simulator.STARTING_MEMORY_ADDRESS, simulator.ENDING_MEMORY_ADDRESS + 1, simulator.MEMORY_ADDRESS_INCREMENT):
+        trace_lines.append(f"0x{mem_address:08X}:0b{simulator.memory_data_storage[f'0x{mem_address:08X}']:032b}\n")
+    with open(output_file_path, "w") as output_file:
+        output_file.write("".join(trace_lines).strip())
+
+register_unsupported_engine('simulator1', "Simulator1.py, decimal-string registers",
+                            "it indexes its register table with a slice and fails on the first instruction")
+register_unsupported_engine('simulator2', "Simulator2.py, decimal-string registers",
+                            "its script decodes the program but never executes it or writes a trace")
+register_unsupported_engine('simulator3', "Simulator3.py, binary-string registers",
+                            "it has no I-type or B-type execution functions")
+
+# Simulator4 has no watchdog and runs until it stops
+@register_engine('simulator4', "Simulator4.py, binary-string registers")
+def run_simulator4(input_file_path, output_file_path, **run_options):
+    refuse_run_options('simulator4', run_options)
+    run_binary_string_simulator('Simulator4', input_file_path, output_file_path)
+    return RUN_HALTED
+
+def register_simulator5_engine(engine_name, description, **simulation_options):
+    @register_engine(engine_name, description)
+    def run_simulator5(input_file_path, output_file_path, **run_options):
+        from Simulator5 import read_program_file, simulate_program
+        return simulate_program(read_program_file(input_file_path), output_file_path, **simulation_options, **run_options)
+
+register_simulator5_engine('interpreter', "Simulator5, decoded-instruction interpreter", engine='interpreter')
+register_simulator5_engine('blocks', "Simulator5, hot basic blocks translated to Python", engine='blocks')
+register_simulator5_engine('compiled', "Simulator5, ahead-of-time compiled blocks when cached, else the interpreter", engine='compiled')
+register_simulator5_engine('fast-forward', "Simulator5, translated blocks with counted loops fast-forwarded",
+                           engine='blocks', fast_forward_loops=True)
+
+@register_engine('batch', "Simulator5, NumPy lock-step batch engine (one machine)")
+def run_batch(input_file_path, output_file_path, data_images=(), max_steps=None, **run_options):
+    refuse_run_options('batch', run_options)
+    from Simulator5 import read_program_file, simulate_batch
+    run_end_reason, = simulate_batch([read_program_file(input_file_path)], [output_file_path], data_images, max_steps)
+    if not os.path.exists(output_file_path):
+        raise RuntimeError(run_end_reason)
+    return run_end_reason
+
+def read_trace_lines(trace_file_path):
+    """Non-blank lines without surrounding whitespace, as SimGrader compares them"""
+    with open(trace_file_path, "r") as trace_file:
+        return [trace_line.strip() for trace_line in trace_file if trace_line.strip()]
+
+def compare_engines(test_directory, engine_names=None, reference_directory=None, reference_engine='interpreter'):
+    """Run every engine on every test; one (engine, agreeing tests, total tests, instructions, seconds, failed tests) row per engine"""
+    import contextlib
+    import tempfile
+    test_names = sorted(file_name for file_name in os.listdir(test_directory) if file_name.endswith(".txt"))
+    engine_names = list(SIMULATION_ENGINE_REGISTRY) if engine_names is None else engine_names
+    scratch_file_descriptor, scratch_path = tempfile.mkstemp(suffix=".txt")
+    os.close(scratch_file_descriptor)
+
+    comparison_rows = []
+    try:
+        # Reference traces come from reference_directory when it has one for the
+        # test, from reference_engine otherwise
+        reference_traces = {}
+        for test_name in test_names:
+            reference_path = None if reference_directory is None else os.path.join(reference_directory, test_name)
+            if reference_path is None or not os.path.exists(reference_path):
+                run_engine(reference_engine, os.path.join(test_directory, test_name), scratch_path)
+                reference_path = scratch_path
+            reference_traces[test_name] = read_trace_lines(reference_path)
+
+        for engine_name in engine_names:
+            if engine_name in UNSUPPORTED_ENGINES:
+                comparison_rows.append((engine_name, 0, len(test_names), 0, 0.0,
+                                        [f"unsupported: {UNSUPPORTED_ENGINES[engine_name]}"]))
+                continue
+            agreeing_tests = 0
+            instructions_retired = 0
+            run_seconds = 0.0
+            failed_tests = []
+            for test_name in test_names:
+                if os.path.exists(scratch_path):
+                    os.remove(scratch_path)
+                run_start = time.perf_counter()
+                try:
+                    with contextlib.redirect_stderr(io.StringIO()):
+                        run_engine(engine_name, os.path.join(test_directory, test_name), scratch_path)
+                except Exception as error:
+                    failed_tests.append(f"{test_name} ({type(error).__name__})")
+                    continue
+                run_seconds += time.perf_counter() - run_start
+
+                trace_lines = read_trace_lines(scratch_path)
+                instructions_retired += sum(1 for trace_line in trace_lines if trace_line.startswith("0b"))
+                if trace_lines == reference_traces[test_name]:
+                    agreeing_tests += 1
+                else:
+                    failed_tests.append(test_name)
+            comparison_rows.append((engine_name, agreeing_tests, len(test_names), instructions_retired, run_seconds, failed_tests))
+    finally:
+        if os.path.exists(scratch_path):
+            os.remove(scratch_path)
+    return comparison_rows
+
+def format_comparison(comparison_rows):
+    report_lines = [f"{'engine':<14}{'agree':>8}{'steps':>10}{'seconds':>10}{'steps/s':>12}  mismatches\n"]
+    for engine_name, agreeing_tests, test_count, instructions_retired, run_seconds, failed_tests in comparison_rows:
+        steps_per_second = f"{instructions_retired / run_seconds:,.0f}" if run_seconds else "-"
+        report_lines.append(f"{engine_name:<14}{f'{agreeing_tests}/{test_count}':>8}{instructions_retired:>10}"
+                            f"{run_seconds:>10.3f}{steps_per_second:>12}  {', '.join(failed_tests)}\n")
+    return report_lines
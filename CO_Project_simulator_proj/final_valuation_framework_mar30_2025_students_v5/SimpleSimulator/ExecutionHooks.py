@@ -0,0 +1,162 @@
+# Execution hooks: live observers for Machine runs
+#
+# Callbacks are registered per event:
+#   on_step(callback)         callback(pc, next_pc, operation_name, rd, rs1, rs2, immediate, registers)
+#                             after every instruction; next_pc is None when it halted
+#   on_load(callback)         callback(pc, address, value) after every lw, lr.w and
+#                             AMO, with the word it read
+#   on_store(callback)        callback(pc, address, value) after every sw, successful
+#                             sc.w and AMO, with the word it wrote
+#   on_branch_taken(callback) callback(pc, target) when beq/bne/blt is taken
+#   on_jump(callback)         callback(pc, target, rd) after every jal/jalr
+# registers is the live register file after the instruction ran.
+#
+# Machine only runs the hooked loop below while at least one callback is
+# registered; otherwise the engines run exactly as before and pay nothing for
+# hooks. The hooked loop steps one instruction at a time whatever the engine,
+# since translated blocks and loop fast-forwarding would skip the events. The
+# exception is hooks registered only by PerformanceCounters: the block engine
+# counts those events per block itself (see BlockTranslator).
+
+import sys
+
+from BlockTranslator import get_operation_name
+from PerformanceCounters import MachineLevelInstruction
+
+REGISTER_VALUE_MASK = 0xFFFFFFFF
+REGISTER_SIGN_BIT = 0x80000000
+
+# Taken-condition of each branch from its two (unsigned) register values
+BRANCH_CONDITIONS = {
+    'beq': lambda first_value, second_value: first_value == second_value,
+    'beq_halt': lambda first_value, second_value: first_value == second_value,
+    'bne': lambda first_value, second_value: first_value != second_value,
+    'blt': lambda first_value, second_value: (first_value ^ REGISTER_SIGN_BIT) < (second_value ^ REGISTER_SIGN_BIT),
+}
+JUMP_OPERATIONS = {'jal', 'jalr'}
+# Read-modify-write instructions: a load and a store each (lr.w/sc.w are run
+# by Machine, which reports them itself)
+ATOMIC_MEMORY_OPERATIONS = {'amoswap', 'amoadd', 'amoxor', 'amoand', 'amoor', 'amomin', 'amomax', 'amominu', 'amomaxu'}
+
+class ExecutionHooks:
+
+    def __init__(self, format_trace_line, halt_signal):
+        self.format_trace_line = format_trace_line
+        self.halt_signal = halt_signal
+        self.step_hooks = []
+        self.load_hooks = []
+        self.store_hooks = []
+        self.branch_hooks = []
+        self.jump_hooks = []
+        # Handler -> operation name, filled in as handlers are met
+        self.operation_names = {}
+
+    # Registration returns the callback, so these also work as decorators
+    def on_step(self, callback):
+        self.step_hooks.append(callback)
+        return callback
+
+    def on_load(self, callback):
+        self.load_hooks.append(callback)
+        return callback
+
+    def on_store(self, callback):
+        self.store_hooks.append(callback)
+        return callback
+
+    def on_branch_taken(self, callback):
+        self.branch_hooks.append(callback)
+        return callback
+
+    def on_jump(self, callback):
+        self.jump_hooks.append(callback)
+        return callback
+
+    def remove(self, callback):
+        """Unregister callback from every event it was registered for"""
+        for hook_list in (self.step_hooks, self.load_hooks, self.store_hooks, self.branch_hooks, self.jump_hooks):
+            while callback in hook_list:
+                hook_list.remove(callback)
+
+    def is_active(self, ignored_callbacks=()):
+        """True while any callback besides ignored_callbacks is registered"""
+        return any(callback not in ignored_callbacks
+                   for hook_list in (self.step_hooks, self.load_hooks, self.store_hooks, self.branch_hooks, self.jump_hooks)
+                   for callback in hook_list)
+
+    def run(self, decoded_program, registers, memory, trace_lines, pc_value=0, max_steps=None, trace_deltas=False):
+        """Hooked interpreter loop, same results as run_decoded_program (or run_delta_program) plus the events; returns (next PC or HALT, steps, halting PC)"""
+        format_trace_line = self.format_trace_line
+        halt_signal = self.halt_signal
+        operation_names = self.operation_names
+        step_hooks = self.step_hooks
+        load_hooks = self.load_hooks
+        store_hooks = self.store_hooks
+        branch_hooks = self.branch_hooks
+        jump_hooks = self.jump_hooks
+
+        program_end_address = len(decoded_program) * 4
+        step_limit = sys.maxsize if max_steps is None else max_steps
+        steps_executed = 0
+
+        try:
+            while steps_executed < step_limit and 0 <= pc_value < program_end_address and not pc_value & 3:
+                handler, rd_value, rs1_value, rs2_value, immediate_value = decoded_program[pc_value >> 2]
+                operation_name = operation_names.get(handler)
+                if operation_name is None:
+                    operation_name = operation_names[handler] = get_operation_name(handler)
+
+                # Effective address and stored value are read before the instruction can change them
+                is_atomic = operation_name in ATOMIC_MEMORY_OPERATIONS
+                if operation_name == 'lw' or operation_name == 'sw' or is_atomic:
+                    access_address = (registers[rs1_value] + immediate_value) & REGISTER_VALUE_MASK
+                    stored_value = registers[rs2_value]
+
+                next_pc_value = handler(registers, memory, rd_value, rs1_value, rs2_value, immediate_value, pc_value)
+                steps_executed += 1
+
+                if operation_name == 'lw' or is_atomic:
+                    loaded_value = registers[rd_value]
+                halted = next_pc_value is halt_signal
+                if not halted:
+                    registers[0] = 0
+
+                if operation_name == 'lw':
+                    for callback in load_hooks:
+                        callback(pc_value, access_address, loaded_value)
+                elif operation_name == 'sw':
+                    for callback in store_hooks:
+                        callback(pc_value, access_address, stored_value)
+                elif is_atomic:
+                    for callback in load_hooks:
+                        callback(pc_value, access_address, loaded_value)
+                    if store_hooks:
+                        # The word written back, read without counting as another access
+                        stored_value = int.from_bytes(memory.read_bytes(access_address, 4), 'little')
+                        for callback in store_hooks:
+                            callback(pc_value, access_address, stored_value)
+                elif operation_name in BRANCH_CONDITIONS:
+                    if branch_hooks and BRANCH_CONDITIONS[operation_name](registers[rs1_value], registers[rs2_value]):
+                        for callback in branch_hooks:
+                            callback(pc_value, pc_value + immediate_value)
+                elif operation_name in JUMP_OPERATIONS:
+                    for callback in jump_hooks:
+                        callback(pc_value, next_pc_value, rd_value)
+
+                for callback in step_hooks:
+                    callback(pc_value, None if halted else next_pc_value, operation_name,
+                             rd_value, rs1_value, rs2_value, immediate_value, registers)
+
+                if halted:
+                    trace_lines.append((pc_value, 0, 0) if trace_deltas else format_trace_line(pc_value, *registers))
+                    return halt_signal, steps_executed, pc_value
+                if trace_deltas:
+                    trace_lines.append((next_pc_value, rd_value, registers[rd_value]))
+                else:
+                    trace_lines.append(format_trace_line(next_pc_value, *registers))
+                pc_value = next_pc_value
+        except MachineLevelInstruction:
+            # Stop in front of it; Machine.run executes it
+            pass
+
+        return pc_value, steps_executed, None
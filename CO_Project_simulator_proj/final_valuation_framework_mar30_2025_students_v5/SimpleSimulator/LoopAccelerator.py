@@ -0,0 +1,214 @@
+# Fast-forwarding of simple counted loops for the block engine
+#
+# A counted loop here is straight-line code closed by a bne/blt back to its
+# first instruction, where every register the body writes only ever moves by a
+# fixed amount per iteration (addi rd, rd, imm / add rd, rd, rs / sub rd, rd, rs
+# with rs not written in the loop). Register values are then linear in the
+# iteration number, so the number of iterations until the branch falls through
+# can be solved for directly. Trace lines (or deltas, for a binary trace) for
+# every iteration are still produced from the per-step increments without
+# running the body through the engine: the fields the loop never writes are
+# joined once, so each line only renders the register just written. With the
+# trace off (only the final state is written) the registers go straight to
+# their exit values.
+
+from math import gcd
+
+from BlockTranslator import get_operation_name
+from TraceRenderer import BINARY_HALFWORDS, render_field
+
+REGISTER_VALUE_MASK = 0xFFFFFFFF
+REGISTER_MODULUS = 1 << 32
+SIGNED_MINIMUM = -(1 << 31)
+SIGNED_MAXIMUM = (1 << 31) - 1
+
+def to_signed(register_value):
+    return register_value - REGISTER_MODULUS if register_value & 0x80000000 else register_value
+
+class CountedLoop:
+    __slots__ = ('start_pc', 'branch_pc', 'branch_operation', 'branch_rs1', 'branch_rs2', 'body_steps', 'written_registers')
+
+    def __init__(self, start_pc, branch_pc, branch_operation, branch_rs1, branch_rs2, body_steps):
+        self.start_pc = start_pc
+        self.branch_pc = branch_pc
+        self.branch_operation = branch_operation
+        self.branch_rs1 = branch_rs1
+        self.branch_rs2 = branch_rs2
+        # (rd, immediate, invariant source register or None, sign) per body instruction
+        self.body_steps = body_steps
+        self.written_registers = {step[0] for step in body_steps if step[0]}
+
+class LoopAccelerator:
+
+    def __init__(self, decoded_program, trace_deltas=False, trace_steps=True):
+        self.decoded_program = decoded_program
+        # Record (PC, rd, value) deltas instead of trace lines / record nothing
+        # for the steps of a loop
+        self.trace_deltas = trace_deltas
+        self.trace_steps = trace_steps
+        # Loop start PC -> CountedLoop
+        self.counted_loops = {}
+        self.find_counted_loops()
+
+    def find_counted_loops(self):
+        """Scan the decoded program for bne/blt back-edges closing a loop the solver can handle"""
+        decoded_program = self.decoded_program
+        self.counted_loops = {}
+        for branch_index, (handler, rd, rs1, rs2, immediate) in enumerate(decoded_program):
+            branch_operation = get_operation_name(handler)
+            if branch_operation not in ('bne', 'blt') or immediate > 0:
+                continue
+            branch_pc = branch_index * 4
+            start_pc = branch_pc + immediate
+            if start_pc < 0:
+                continue
+            counted_loop = self.analyse_loop(start_pc, branch_pc, branch_operation, rs1, rs2)
+            if counted_loop is not None:
+                self.counted_loops[start_pc] = counted_loop
+
+    def analyse_loop(self, start_pc, branch_pc, branch_operation, branch_rs1, branch_rs2):
+        """CountedLoop for the body [start_pc, branch_pc), or None if it is not a simple counted loop"""
+        body_steps = []
+        for instruction_index in range(start_pc >> 2, branch_pc >> 2):
+            handler, rd, rs1, rs2, immediate = self.decoded_program[instruction_index]
+            operation_name = get_operation_name(handler)
+            if rd == 0 and operation_name in ('addi', 'add', 'sub'):
+                body_steps.append((0, 0, None, 1))
+            elif operation_name == 'addi' and rs1 == rd:
+                body_steps.append((rd, immediate, None, 1))
+            elif operation_name == 'add' and rs1 == rd and rs2 != rd:
+                body_steps.append((rd, 0, rs2, 1))
+            elif operation_name == 'add' and rs2 == rd and rs1 != rd:
+                body_steps.append((rd, 0, rs1, 1))
+            elif operation_name == 'sub' and rs1 == rd and rs2 != rd:
+                body_steps.append((rd, 0, rs2, -1))
+            else:
+                return None
+
+        # Registers added or subtracted must not change inside the loop
+        counted_loop = CountedLoop(start_pc, branch_pc, branch_operation, branch_rs1, branch_rs2, body_steps)
+        for rd, immediate, source_register, sign in body_steps:
+            if source_register is not None and source_register in counted_loop.written_registers:
+                return None
+        return counted_loop
+
+    def forget_loops(self, start_address, end_address):
+        """Drop loops that include code in [start_address, end_address) after it was overwritten"""
+        for start_pc, counted_loop in list(self.counted_loops.items()):
+            if start_pc < end_address and start_address <= counted_loop.branch_pc:
+                del self.counted_loops[start_pc]
+
+    def count_iterations(self, counted_loop, registers, increments):
+        """Iterations (at least 1) until the loop branch falls through, or None if it never provably does"""
+        first_value = registers[counted_loop.branch_rs1]
+        second_value = registers[counted_loop.branch_rs2]
+        first_increment = increments.get(counted_loop.branch_rs1, 0)
+        second_increment = increments.get(counted_loop.branch_rs2, 0)
+
+        if counted_loop.branch_operation == 'bne':
+            # Smallest k >= 1 with difference + k * step == 0 (mod 2**32)
+            difference = (first_value - second_value) % REGISTER_MODULUS
+            step = (first_increment - second_increment) % REGISTER_MODULUS
+            if step == 0:
+                return 1 if difference == 0 else None
+            step_gcd = gcd(step, REGISTER_MODULUS)
+            if difference % step_gcd:
+                return None
+            reduced_modulus = REGISTER_MODULUS // step_gcd
+            iterations = (-difference // step_gcd) * pow(step // step_gcd, -1, reduced_modulus) % reduced_modulus
+            return iterations or reduced_modulus
+
+        # blt: only solved when neither operand wraps around before the exit
+        first_signed = to_signed(first_value)
+        second_signed = to_signed(second_value)
+        difference = first_signed - second_signed
+        step = first_increment - second_increment
+        if difference + step >= 0:
+            iterations = 1
+        elif step <= 0:
+            return None
+        else:
+            iterations = (-difference + step - 1) // step
+        for operand_start, operand_increment in ((first_signed, first_increment), (second_signed, second_increment)):
+            for checked_iteration in (1, iterations):
+                operand_value = operand_start + checked_iteration * operand_increment
+                if not SIGNED_MINIMUM <= operand_value <= SIGNED_MAXIMUM:
+                    return None
+        return iterations
+
+    def fast_forward(self, pc, registers, trace_lines, step_limit):
+        """Run the counted loop starting at pc in closed form; (next PC, steps) or None to leave it to the engine"""
+        counted_loop = self.counted_loops.get(pc)
+        if counted_loop is None:
+            return None
+
+        # Per-step increments with the loop-invariant source registers read now,
+        # as signed amounts so the blt solver sees the true direction
+        resolved_steps = []
+        increments = {}
+        for rd, immediate, source_register, sign in counted_loop.body_steps:
+            increment = immediate if source_register is None else sign * to_signed(registers[source_register])
+            resolved_steps.append((rd, increment))
+            if rd:
+                increments[rd] = increments.get(rd, 0) + increment
+
+        iterations = self.count_iterations(counted_loop, registers, increments)
+        if iterations is None:
+            return None
+        steps_per_iteration = len(resolved_steps) + 1
+        loop_exits = True
+        if iterations * steps_per_iteration > step_limit:
+            # Stop on a loop boundary inside the budget; the engine does the rest
+            iterations = step_limit // steps_per_iteration
+            loop_exits = False
+            if iterations == 0:
+                return None
+
+        start_pc = counted_loop.start_pc
+        next_pc = counted_loop.branch_pc + 4 if loop_exits else start_pc
+        loop_steps = iterations * steps_per_iteration
+        if not self.trace_steps:
+            for rd, increment in increments.items():
+                registers[rd] = (registers[rd] + iterations * increment) & REGISTER_VALUE_MASK
+            return next_pc, loop_steps
+
+        step_pcs = range(start_pc + 4, counted_loop.branch_pc + 4, 4)
+        body = [(rd, increment & REGISTER_VALUE_MASK, step_pc) for (rd, increment), step_pc in zip(resolved_steps, step_pcs)]
+        if self.trace_deltas:
+            for iteration in range(iterations):
+                for rd, increment, step_pc in body:
+                    if rd:
+                        registers[rd] = (registers[rd] + increment) & REGISTER_VALUE_MASK
+                    trace_lines.append((step_pc, rd, registers[rd]))
+                trace_lines.append((start_pc, 0, 0))
+            trace_lines[-1] = (next_pc, 0, 0)
+            return next_pc, loop_steps
+
+        # A line is the PC field, then the fields of the registers the loop
+        # writes with the unchanging fields between them joined once
+        line_parts = [None]
+        register_parts = {}
+        unchanged_start = 0
+        for register in sorted(counted_loop.written_registers):
+            line_parts.append("".join(map(render_field, registers[unchanged_start:register])))
+            register_parts[register] = len(line_parts)
+            line_parts.append(render_field(registers[register]))
+            unchanged_start = register + 1
+        line_parts.append("".join(map(render_field, registers[unchanged_start:])) + "\n")
+        body = [(rd, increment, register_parts.get(rd), render_field(step_pc)) for rd, increment, step_pc in body]
+        branch_field = render_field(start_pc)
+
+        join_parts = "".join
+        append_line = trace_lines.append
+        for iteration in range(iterations):
+            for rd, increment, part_index, pc_field in body:
+                if rd:
+                    register_value = registers[rd] = (registers[rd] + increment) & REGISTER_VALUE_MASK
+                    line_parts[part_index] = f"0b{BINARY_HALFWORDS[register_value >> 16]}{BINARY_HALFWORDS[register_value & 0xFFFF]} "
+                line_parts[0] = pc_field
+                append_line(join_parts(line_parts))
+            line_parts[0] = branch_field
+            append_line(join_parts(line_parts))
+        line_parts[0] = render_field(next_pc)
+        trace_lines[-1] = join_parts(line_parts)
+        return next_pc, loop_steps
@@ -0,0 +1,87 @@
+# Several harts running over one shared memory
+#
+# The harts are Machines built on the same PagedMemory, each with its own PC,
+# register file and engine state. They take turns in a fixed round-robin order,
+# each running a quantum of instructions per turn, so a run is fully
+# deterministic. Every instruction is atomic with respect to the other harts;
+# lr.w/sc.w reservations are broken by a store to the reserved word from any
+# hart, and stores into code are re-decoded by every hart.
+#
+# The combined trace interleaves the harts' lines in execution order, in the
+# single-hart line format. Per-hart streams can be kept as well.
+#
+# MultiHartSystem offers the parts of the Machine interface the Watchdog uses,
+# so budgets and livelock detection work the same way.
+
+import sys
+
+DEFAULT_HART_QUANTUM = 64      # instructions per turn
+
+class MultiHartSystem:
+
+    def __init__(self, harts, quantum=DEFAULT_HART_QUANTUM, keep_hart_traces=False):
+        self.harts = harts
+        self.memory = harts[0].memory
+        self.quantum = quantum
+        # Hart whose turn is next, so slices of a run carry on the rotation
+        self.next_hart = 0
+        # Lines of each hart alone, when kept
+        self.hart_traces = [[] for _ in harts] if keep_hart_traces else None
+
+    @property
+    def halted(self):
+        return all(hart.halted for hart in self.harts)
+
+    @property
+    def instructions_retired(self):
+        return sum(hart.instructions_retired for hart in self.harts)
+
+    @property
+    def pc(self):
+        """PC of the next hart still running (of hart 0 once all have stopped)"""
+        hart_count = len(self.harts)
+        for offset in range(hart_count):
+            hart = self.harts[(self.next_hart + offset) % hart_count]
+            if not (hart.halted or hart.left_program()):
+                return hart.pc
+        return self.harts[0].pc
+
+    def left_program(self):
+        """True once every hart has stopped and at least one of them did so by leaving the program"""
+        return not self.halted and all(hart.halted or hart.left_program() for hart in self.harts)
+
+    def capture_state(self):
+        return (self.next_hart,) + tuple(hart.capture_state() for hart in self.harts)
+
+    def run(self, trace_sink=None, max_steps=None, **run_options):
+        """Give the harts quantum-sized turns until all have stopped or max_steps instructions ran in total"""
+        if trace_sink is None:
+            trace_sink = []
+        steps_left = sys.maxsize if max_steps is None else max_steps
+        hart_count = len(self.harts)
+
+        while steps_left > 0:
+            any_progress = False
+            for _ in range(hart_count):
+                hart_index = self.next_hart
+                hart = self.harts[hart_index]
+                self.next_hart = (hart_index + 1) % hart_count
+                if hart.halted or hart.left_program():
+                    continue
+
+                hart_lines = []
+                steps_before = hart.instructions_retired
+                hart.run(trace_sink=hart_lines, max_steps=min(self.quantum, steps_left), **run_options)
+                trace_sink.extend(hart_lines)
+                if self.hart_traces is not None:
+                    self.hart_traces[hart_index].extend(hart_lines)
+
+                hart_steps = hart.instructions_retired - steps_before
+                steps_left -= hart_steps
+                if hart_steps:
+                    any_progress = True
+                if steps_left <= 0:
+                    break
+            if not any_progress:
+                break
+        return trace_sink
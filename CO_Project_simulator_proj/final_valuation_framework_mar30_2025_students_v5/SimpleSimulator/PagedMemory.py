@@ -0,0 +1,228 @@
+# Byte-addressable simulated memory for the whole 32-bit address space
+#
+# Memory is split into 4 KiB pages backed by bytearrays that are only allocated
+# the first time a page is written; reading an untouched page gives zeros.
+# Words are little-endian. On little-endian hosts every page also has a uint32
+# view so aligned word loads and stores are a single index operation.
+# Binary files can be mapped in copy-on-write with mmap, so large preloaded
+# images are only read from disk as their pages are touched.
+#
+# Pages can carry store listeners (e.g. pages holding program code). Those
+# pages get no uint32 view, so every store to them takes the slow path, which
+# calls each listener as listener(address, length) after the bytes are written.
+#
+# Pages can also be watched (watchpoints). Watched pages likewise lose their
+# uint32 view, and every load from or store to them calls each watcher as
+# watcher(is_store, address, length, old_value, new_value) with the little-endian
+# values before and after the access (the same value twice for a load). Loads
+# and stores to every other page stay on the fast path.
+#
+# The numbers of the pages that have been stored to are kept in written_pages,
+# so comparing or saving memory state only has to look at those: a mapped page
+# that was only ever read still holds exactly what was mapped.
+
+import os
+import struct
+import sys
+
+PAGE_SHIFT = 12
+PAGE_SIZE = 1 << PAGE_SHIFT            # 4096 bytes
+PAGE_OFFSET_MASK = PAGE_SIZE - 1
+ADDRESS_MASK = 0xFFFFFFFF
+
+# Aligned word access through memoryview.cast('I') only matches RISC-V byte order
+# when the host is little-endian and a C unsigned int is 4 bytes
+USE_WORD_VIEWS = sys.byteorder == 'little' and struct.calcsize('I') == 4
+
+class PagedMemory:
+    __slots__ = ('byte_pages', 'word_pages', 'store_listeners', 'access_watchers', 'written_pages')
+
+    def __init__(self):
+        # Page number -> page bytes / uint32 view of the same page / store listeners / watchers
+        self.byte_pages = {}
+        self.word_pages = {}
+        self.store_listeners = {}
+        self.access_watchers = {}
+        # Page numbers of every page stored to so far
+        self.written_pages = set()
+
+    def get_page(self, page_number):
+        """Page bytes for page_number, allocating a zeroed page on first use"""
+        page = self.byte_pages.get(page_number)
+        if page is None:
+            page = bytearray(PAGE_SIZE)
+            self.add_page(page_number, page)
+        return page
+
+    def add_page(self, page_number, page):
+        """Install a writable PAGE_SIZE buffer (bytearray or memoryview) as a page"""
+        self.byte_pages[page_number] = page
+        if USE_WORD_VIEWS and page_number not in self.store_listeners and page_number not in self.access_watchers:
+            self.word_pages[page_number] = memoryview(page).cast('I')
+        else:
+            self.word_pages.pop(page_number, None)
+
+    def add_store_listener(self, page_number, listener):
+        """Call listener(address, length) after every store into page_number"""
+        self.store_listeners.setdefault(page_number, []).append(listener)
+        # Drop the fast path so stores to this page always reach write_bytes
+        self.word_pages.pop(page_number, None)
+
+    def remove_store_listener(self, page_number, listener):
+        listeners = self.store_listeners.get(page_number)
+        if listeners is None or listener not in listeners:
+            return
+        listeners.remove(listener)
+        if not listeners:
+            del self.store_listeners[page_number]
+            page = self.byte_pages.get(page_number)
+            if page is not None:
+                self.add_page(page_number, page)
+
+    def add_access_watcher(self, page_number, watcher):
+        """Call watcher(is_store, address, length, old_value, new_value) on every load from and store to page_number"""
+        self.access_watchers.setdefault(page_number, []).append(watcher)
+        # Drop the fast path so loads and stores to this page are seen
+        self.word_pages.pop(page_number, None)
+
+    def remove_access_watcher(self, page_number, watcher):
+        watchers = self.access_watchers.get(page_number)
+        if watchers is None or watcher not in watchers:
+            return
+        watchers.remove(watcher)
+        if not watchers:
+            del self.access_watchers[page_number]
+            page = self.byte_pages.get(page_number)
+            if page is not None:
+                self.add_page(page_number, page)
+
+    def map_file(self, file_path, base_address):
+        """Map a binary file copy-on-write at base_address; returns the number of bytes mapped"""
+        import mmap
+        with open(file_path, 'rb') as image_file:
+            image_size = os.fstat(image_file.fileno()).st_size
+            if image_size == 0:
+                return 0
+            # ACCESS_COPY: stores change the mapped pages but never the file
+            image_view = memoryview(mmap.mmap(image_file.fileno(), 0, access=mmap.ACCESS_COPY))
+
+        base_address &= ADDRESS_MASK
+        image_offset = 0
+        while image_offset < image_size:
+            address = (base_address + image_offset) & ADDRESS_MASK
+            page_offset = address & PAGE_OFFSET_MASK
+            chunk_size = min(PAGE_SIZE - page_offset, image_size - image_offset)
+            chunk = image_view[image_offset:image_offset + chunk_size]
+            if chunk_size == PAGE_SIZE:
+                # Whole page: use the mapping itself, nothing is read until it is touched
+                self.add_page(address >> PAGE_SHIFT, chunk)
+                self.notify_store_listeners(address, PAGE_SIZE)
+            else:
+                # Partial page at either end of the image: copy into a normal page
+                self.write_bytes(address, chunk)
+            image_offset += chunk_size
+        return image_size
+
+    def load_word(self, address):
+        """32-bit little-endian load; untouched memory reads as zero"""
+        address &= ADDRESS_MASK
+        if address & 3 == 0:
+            word_page = self.word_pages.get(address >> PAGE_SHIFT)
+            if word_page is not None:
+                return word_page[(address & PAGE_OFFSET_MASK) >> 2]
+            page = self.byte_pages.get(address >> PAGE_SHIFT)
+            if page is None:
+                value = 0
+            else:
+                offset = address & PAGE_OFFSET_MASK
+                value = int.from_bytes(page[offset:offset + 4], 'little')
+        else:
+            value = int.from_bytes(self.read_bytes(address, 4), 'little')
+        if self.access_watchers:
+            self.notify_access_watchers(False, address, 4, value, value)
+        return value
+
+    def store_word(self, address, value):
+        """32-bit little-endian store; True if a store listener reported that it changed something"""
+        address &= ADDRESS_MASK
+        if address & 3 == 0:
+            page_number = address >> PAGE_SHIFT
+            word_page = self.word_pages.get(page_number)
+            if word_page is not None:
+                word_page[(address & PAGE_OFFSET_MASK) >> 2] = value & 0xFFFFFFFF
+                self.written_pages.add(page_number)
+                return False
+        return self.write_bytes(address, (value & 0xFFFFFFFF).to_bytes(4, 'little'))
+
+    def load_byte(self, address):
+        address &= ADDRESS_MASK
+        page = self.byte_pages.get(address >> PAGE_SHIFT)
+        if page is None:
+            return 0
+        return page[address & PAGE_OFFSET_MASK]
+
+    def store_byte(self, address, value):
+        return self.write_bytes(address, bytes((value & 0xFF,)))
+
+    def read_bytes(self, address, length):
+        """length bytes starting at address (may cross pages and wrap around)"""
+        return bytes(self.load_byte(address + index) for index in range(length))
+
+    def write_bytes(self, address, data):
+        """Store data starting at address, a page at a time; True if a store listener reported a change"""
+        listener_reported = False
+        data_offset = 0
+        while data_offset < len(data):
+            address &= ADDRESS_MASK
+            page_offset = address & PAGE_OFFSET_MASK
+            chunk_size = min(PAGE_SIZE - page_offset, len(data) - data_offset)
+            page = self.get_page(address >> PAGE_SHIFT)
+            self.written_pages.add(address >> PAGE_SHIFT)
+            watchers = self.access_watchers.get(address >> PAGE_SHIFT)
+            if watchers:
+                old_value = int.from_bytes(page[page_offset:page_offset + chunk_size], 'little')
+            page[page_offset:page_offset + chunk_size] = data[data_offset:data_offset + chunk_size]
+            if watchers:
+                new_value = int.from_bytes(page[page_offset:page_offset + chunk_size], 'little')
+                for watcher in list(watchers):
+                    watcher(True, address, chunk_size, old_value, new_value)
+            if self.notify_store_listeners(address, chunk_size):
+                listener_reported = True
+            address += chunk_size
+            data_offset += chunk_size
+        return listener_reported
+
+    def notify_store_listeners(self, address, length):
+        """Tell the listeners of the page holding address about a store; True if any reported a change"""
+        listener_reported = False
+        for listener in self.store_listeners.get(address >> PAGE_SHIFT, ()):
+            if listener(address, length):
+                listener_reported = True
+        return listener_reported
+
+    def notify_access_watchers(self, is_store, address, length, old_value, new_value):
+        """Tell the watchers of the pages holding [address, address + length) about an access"""
+        first_page_number = address >> PAGE_SHIFT
+        last_page_number = ((address + length - 1) & ADDRESS_MASK) >> PAGE_SHIFT
+        watchers = list(self.access_watchers.get(first_page_number, ()))
+        if last_page_number != first_page_number:
+            watchers += [watcher for watcher in self.access_watchers.get(last_page_number, ()) if watcher not in watchers]
+        for watcher in watchers:
+            watcher(is_store, address, length, old_value, new_value)
+
+    def touched_page_numbers(self):
+        """Numbers of the pages that have been allocated, in address order"""
+        return sorted(self.byte_pages)
+
+    def page_contents(self):
+        """Copy of every allocated page as page number -> bytes"""
+        return {page_number: bytes(page) for page_number, page in self.byte_pages.items()}
+
+    def written_page_contents(self):
+        """Copy of every page stored to so far as page number -> bytes; pages only mapped or read are left out"""
+        return {page_number: bytes(self.byte_pages[page_number]) for page_number in self.written_pages}
+
+    def written_pages_match(self, page_contents):
+        """True if the pages stored to so far are exactly those of page_contents (from written_page_contents) and hold the same bytes"""
+        return (self.written_pages == page_contents.keys()
+                and all(self.byte_pages[page_number] == page_bytes for page_number, page_bytes in page_contents.items()))
@@ -0,0 +1,230 @@
+# Program loaders and bulk instruction decoding with NumPy
+#
+# Programs come as text (one instruction per line as 32 '0'/'1' characters),
+# as raw little-endian .bin images, or as hex: Intel HEX records or
+# $readmemh-style word lists (one hex word per token, '@ADDR' setting the word
+# address, '//' comments). Every format ends up as a uint32 array of
+# instruction words, the word at index i being the instruction at PC i*4.
+# Images are decoded and loaded straight from that array; hex addresses past
+# PROGRAM_IMAGE_LIMIT are rejected rather than zero-filled up to.
+#
+# Text is converted in bulk: all lines are joined into one byte buffer and the
+# bits packed into words in a few array operations. Instruction fields for the
+# whole program are likewise extracted with shifts and masks on the word
+# array. decode_program_words turns those into the decoded program Simulator5
+# runs, decoding each distinct opcode/funct3/funct7 combination once through
+# Simulator5's own decoder so both always agree.
+
+import gc
+
+import numpy as np
+
+from BlockTranslator import get_operation_name
+
+INSTRUCTION_BITS = 32
+# Hex images may place words below this byte address (16M instructions)
+PROGRAM_IMAGE_LIMIT = 1 << 26
+
+def parse_text_program(instruction_list):
+    """Words of a text program as a uint32 array, or None if any non-blank line is not 32 binary digits"""
+    program_lines = "".join(instruction_list).split()
+    if len(program_lines) != sum(map(bool, map(str.strip, instruction_list))):
+        # A line holding several words
+        return None
+    if set(map(len, program_lines)) - {INSTRUCTION_BITS}:
+        return None
+    try:
+        program_text = "".join(program_lines).encode("ascii")
+    except UnicodeEncodeError:
+        return None
+
+    # '0'/'1' -> 0/1; any other character wraps around to more than 1
+    program_bits = np.frombuffer(program_text, dtype=np.uint8).reshape(len(program_lines), INSTRUCTION_BITS) - ord('0')
+    if (program_bits > 1).any():
+        return None
+    return np.packbits(program_bits, axis=1).view('>u4').ravel().astype(np.uint32)
+
+def format_text_program(program_words):
+    """Program lines in the text format for a uint32 word array, built in bulk"""
+    program_bits = np.unpackbits(program_words.astype('>u4').view(np.uint8).reshape(-1, 4), axis=1) + ord('0')
+    line_ends = np.full((len(program_words), 1), ord('\n'), dtype=np.uint8)
+    return np.hstack((program_bits, line_ends)).tobytes().decode("ascii").splitlines(True)
+
+def read_binary_program(file_path):
+    """Words of a raw little-endian program image"""
+    image_bytes = open(file_path, "rb").read()
+    if len(image_bytes) % 4:
+        raise ValueError(f"Program image is not a whole number of 32-bit words: {file_path}")
+    return np.frombuffer(image_bytes, dtype='<u4').astype(np.uint32)
+
+def parse_intel_hex(hex_lines, file_path):
+    """Bytes of an Intel HEX image from address 0, gaps zero-filled"""
+    data_records = []
+    address_base = 0
+    for line_number, hex_line in enumerate(hex_lines, 1):
+        hex_line = hex_line.strip()
+        if not hex_line:
+            continue
+        try:
+            if not hex_line.startswith(':'):
+                raise ValueError
+            record = bytes.fromhex(hex_line[1:])
+            if len(record) < 5 or len(record) != record[0] + 5 or sum(record) & 0xFF:
+                raise ValueError
+        except ValueError:
+            raise ValueError(f"Bad Intel HEX record at line {line_number}: {file_path}") from None
+
+        record_type = record[3]
+        if record_type == 0x00:
+            address = address_base + (record[1] << 8 | record[2])
+            data = record[4:-1]
+            if address + len(data) > PROGRAM_IMAGE_LIMIT:
+                raise ValueError(f"Intel HEX record at line {line_number} is past the program area "
+                                 f"(0x{PROGRAM_IMAGE_LIMIT:X} bytes) at 0x{address:08X}: {file_path}")
+            data_records.append((address, data))
+        elif record_type == 0x01:
+            break
+        elif record_type == 0x02:
+            address_base = (record[4] << 8 | record[5]) << 4
+        elif record_type == 0x04:
+            address_base = (record[4] << 8 | record[5]) << 16
+        # 0x03/0x05 start addresses do not apply: programs start at PC 0
+
+    # One allocation for the whole image, rounded up to whole words
+    image_end = max((address + len(data) for address, data in data_records), default=0)
+    image_bytes = bytearray(image_end + -image_end % 4)
+    for address, data in data_records:
+        image_bytes[address:address + len(data)] = data
+    return image_bytes
+
+def parse_readmemh(hex_lines, file_path):
+    """Words of a $readmemh-style hex word list"""
+    word_values = {}
+    word_address = 0
+    for line_number, hex_line in enumerate(hex_lines, 1):
+        for token in hex_line.split('//', 1)[0].split():
+            try:
+                if token.startswith('@'):
+                    word_address = int(token[1:], 16)
+                    continue
+                word_value = int(token.replace('_', ''), 16)
+            except ValueError:
+                raise ValueError(f"Bad hex word '{token}' at line {line_number}: {file_path}") from None
+            if word_address >= PROGRAM_IMAGE_LIMIT // 4:
+                raise ValueError(f"Hex word '{token}' at line {line_number} is past the program area "
+                                 f"(0x{PROGRAM_IMAGE_LIMIT:X} bytes) at word address 0x{word_address:X}: {file_path}")
+            if word_value > 0xFFFFFFFF:
+                raise ValueError(f"Hex word '{token}' at line {line_number} is wider than 32 bits: {file_path}")
+            word_values[word_address] = word_value
+            word_address += 1
+
+    program_words = np.zeros(max(word_values, default=-1) + 1, dtype=np.uint32)
+    if word_values:
+        program_words[np.fromiter(word_values.keys(), dtype=np.int64)] = np.fromiter(word_values.values(), dtype=np.uint32)
+    return program_words
+
+def read_hex_program(file_path):
+    """Words of an Intel HEX (first record starting with ':') or $readmemh-style program"""
+    with open(file_path, "r") as hex_file:
+        hex_lines = hex_file.readlines()
+    first_line = next((hex_line.strip() for hex_line in hex_lines if hex_line.strip()), "")
+    if first_line.startswith(':'):
+        return np.frombuffer(bytes(parse_intel_hex(hex_lines, file_path)), dtype='<u4').astype(np.uint32)
+    return parse_readmemh(hex_lines, file_path)
+
+def extract_instruction_fields(program_words):
+    """Every field of every instruction at once; immediates come sign-extended, as int64 arrays"""
+    words = program_words.astype(np.int64)
+    signed_words = program_words.astype(np.uint32).view(np.int32).astype(np.int64)
+    return {
+        'opcode': words & 0x7F,
+        'rd': (words >> 7) & 0x1F,
+        'funct3': (words >> 12) & 0x7,
+        'rs1': (words >> 15) & 0x1F,
+        'rs2': (words >> 20) & 0x1F,
+        'funct7': words >> 25,
+        'immediate_i': signed_words >> 20,
+        'immediate_s': (signed_words >> 25 << 5) | ((words >> 7) & 0x1F),
+        'immediate_b': (signed_words >> 31 << 12) | ((words >> 7) & 0x1) << 11 | ((words >> 25) & 0x3F) << 5 | ((words >> 8) & 0xF) << 1,
+        'immediate_j': (signed_words >> 31 << 20) | (words & 0xFF000) | ((words >> 20) & 0x1) << 11 | ((words >> 21) & 0x3FF) << 1,
+    }
+
+# Which fields each instruction format puts in the decoded (rd, rs1, rs2, immediate)
+OPERAND_LAYOUTS = {
+    'R': (True, True, True, None),
+    'A': (True, True, True, None),
+    'I': (True, True, False, 'immediate_i'),
+    'S': (False, True, True, 'immediate_s'),
+    'B': (False, True, True, 'immediate_b'),
+    'J': (True, False, False, 'immediate_j'),
+}
+# Operations whose legality also depends on a register field; they are rare
+# and decoded one instruction at a time
+FIELD_CHECKED_OPERATIONS = {'csrrs', 'lr'}
+
+def decode_program_words(program_words, decode_instruction, instruction_type_categories):
+    """Decoded program for a uint32 word array: the same entries decode_instruction gives word by word"""
+    if not len(program_words):
+        return []
+    fields = extract_instruction_fields(program_words)
+
+    # The handler only depends on opcode, funct3 and funct7; decode each
+    # distinct combination once from a word holding just those fields
+    selector_keys = fields['opcode'] | fields['funct3'] << 7 | fields['funct7'] << 10
+    distinct_keys, key_indices = np.unique(selector_keys, return_inverse=True)
+    key_indices = key_indices.ravel()
+
+    key_entries = []
+    key_uses_rd = np.zeros(len(distinct_keys), dtype=bool)
+    key_uses_rs1 = np.zeros(len(distinct_keys), dtype=bool)
+    key_uses_rs2 = np.zeros(len(distinct_keys), dtype=bool)
+    key_immediate_kinds = np.zeros(len(distinct_keys), dtype=np.int64)
+    immediate_kinds = [None, 'immediate_i', 'immediate_s', 'immediate_b', 'immediate_j']
+    for key_index, selector_key in enumerate(distinct_keys.tolist()):
+        opcode = selector_key & 0x7F
+        selector_word = opcode | (selector_key >> 7 & 0x7) << 12 | (selector_key >> 10) << 25
+        key_entries.append(decode_instruction(f"{selector_word:0{INSTRUCTION_BITS}b}"))
+        operand_layout = OPERAND_LAYOUTS.get(instruction_type_categories.get(f"{opcode:07b}"))
+        if operand_layout is not None:
+            key_uses_rd[key_index], key_uses_rs1[key_index], key_uses_rs2[key_index] = operand_layout[:3]
+            key_immediate_kinds[key_index] = immediate_kinds.index(operand_layout[3])
+
+    # Operands straight from the field arrays
+    rd_values = np.where(key_uses_rd[key_indices], fields['rd'], 0)
+    rs1_values = np.where(key_uses_rs1[key_indices], fields['rs1'], 0)
+    rs2_values = np.where(key_uses_rs2[key_indices], fields['rs2'], 0)
+    instruction_immediate_kinds = key_immediate_kinds[key_indices]
+    immediate_values = np.zeros(len(program_words), dtype=np.int64)
+    for kind_index in range(1, len(immediate_kinds)):
+        immediate_values = np.where(instruction_immediate_kinds == kind_index, fields[immediate_kinds[kind_index]], immediate_values)
+
+    # beq with a zero offset is the halt; its handler comes from decoding one
+    key_handlers = [key_entry[0] for key_entry in key_entries]
+    handler_indices = key_indices.copy()
+    key_names = [get_operation_name(handler) for handler in key_handlers]
+    beq_keys = [key_index for key_index, operation_name in enumerate(key_names) if operation_name in ('beq', 'beq_halt')]
+    if beq_keys:
+        beq_handler = decode_instruction(f"{0x463:0{INSTRUCTION_BITS}b}")[0]           # beq x0, x0, 8
+        beq_halt_handler = decode_instruction(f"{0x63:0{INSTRUCTION_BITS}b}")[0]       # beq x0, x0, 0
+        key_handlers += [beq_handler, beq_halt_handler]
+        is_beq = np.isin(key_indices, beq_keys)
+        handler_indices[is_beq] = np.where(immediate_values[is_beq] == 0, len(key_handlers) - 1, len(key_handlers) - 2)
+
+    # Millions of new tuples would otherwise set off repeated full collections
+    collector_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        decoded_program = list(zip(map(key_handlers.__getitem__, handler_indices.tolist()), rd_values.tolist(),
+                                   rs1_values.tolist(), rs2_values.tolist(), immediate_values.tolist()))
+    finally:
+        if collector_was_enabled:
+            gc.enable()
+
+    # Invalid combinations carry their error message, whatever the other fields
+    key_is_invalid = np.array([operation_name == 'invalid' for operation_name in key_names])
+    for instruction_index in np.flatnonzero(key_is_invalid[key_indices]).tolist():
+        decoded_program[instruction_index] = key_entries[key_indices[instruction_index]]
+    key_is_field_checked = np.array([operation_name in FIELD_CHECKED_OPERATIONS for operation_name in key_names])
+    for instruction_index in np.flatnonzero(key_is_field_checked[key_indices]).tolist():
+        decoded_program[instruction_index] = decode_instruction(f"{int(program_words[instruction_index]):0{INSTRUCTION_BITS}b}")
+    return decoded_program
@@ -0,0 +1,119 @@
+# Load-time program verifier and control-flow graph
+#
+# verify_program checks the whole program once, before anything runs, and
+# reports every illegal encoding with its line number in the input file. The
+# engines never validate while running: each word is decoded once, and an
+# invalid one only raises when it is reached, so a program whose bad words are
+# never executed still runs exactly as before. --verify makes such programs
+# fail up front instead.
+#
+# ControlFlowGraph splits a decoded program into basic blocks. A block starts
+# at PC 0, at a static branch/jal target or right after a block terminator, and
+# ends at its terminator or just before the next leader. Successors are the
+# static targets and the fall-through; a jalr's target is only known at run
+# time, and a taken beq with a zero offset halts.
+
+import bisect
+
+from BlockTranslator import BLOCK_TERMINATOR_OPERATIONS, get_operation_name
+
+# Terminators whose target is PC + immediate
+STATIC_TARGET_OPERATIONS = {'beq', 'bne', 'blt', 'jal'}
+
+def verify_program(instruction_list, decode_instruction):
+    """Every problem in the program as (line number, PC, message); empty when it is clean"""
+    program_issues = []
+    pc = 0
+    for line_number, instruction_line in enumerate(instruction_list, 1):
+        stripped_line = instruction_line.strip()
+        if not stripped_line:
+            continue
+        if len(stripped_line) != 32 or stripped_line.strip('01'):
+            program_issues.append((line_number, pc, "Not a 32-bit binary instruction"))
+        else:
+            handler, rd, rs1, rs2, immediate = decode_instruction(stripped_line)
+            operation_name = get_operation_name(handler)
+            if operation_name == 'invalid':
+                program_issues.append((line_number, pc, immediate))
+            elif operation_name in STATIC_TARGET_OPERATIONS and (pc + immediate) & 3:
+                program_issues.append((line_number, pc, f"{operation_name} target 0x{(pc + immediate) & 0xFFFFFFFF:08X} is not word aligned"))
+        pc += 4
+    return program_issues
+
+def format_program_issues(program_issues):
+    return [f"line {line_number} (PC 0x{pc:08X}): {message}\n" for line_number, pc, message in program_issues]
+
+class BasicBlock:
+    __slots__ = ('start_pc', 'end_pc', 'terminator', 'successors')
+
+    def __init__(self, start_pc, end_pc, terminator, successors):
+        self.start_pc = start_pc
+        self.end_pc = end_pc              # address just past the last instruction
+        self.terminator = terminator      # operation name of the last instruction, None if it falls through
+        self.successors = successors      # static successor PCs; may lie outside the program
+
+class ControlFlowGraph:
+
+    def __init__(self, decoded_program):
+        self.program_end_address = len(decoded_program) * 4
+        operation_names = [get_operation_name(entry[0]) for entry in decoded_program]
+
+        # Static branch/jal targets inside the program
+        self.branch_targets = set()
+        block_leaders = {0}
+        for instruction_index, operation_name in enumerate(operation_names):
+            if operation_name not in BLOCK_TERMINATOR_OPERATIONS:
+                continue
+            pc = instruction_index * 4
+            block_leaders.add(pc + 4)
+            if operation_name in STATIC_TARGET_OPERATIONS:
+                target_pc = pc + decoded_program[instruction_index][4]
+                if self.contains(target_pc):
+                    self.branch_targets.add(target_pc)
+        block_leaders |= self.branch_targets
+        self.block_leaders = sorted(pc for pc in block_leaders if self.contains(pc))
+
+        # Block start PC -> BasicBlock
+        self.blocks = {}
+        for leader_index, start_pc in enumerate(self.block_leaders):
+            if leader_index + 1 < len(self.block_leaders):
+                end_pc = self.block_leaders[leader_index + 1]
+            else:
+                end_pc = self.program_end_address
+            last_pc = end_pc - 4
+            terminator = operation_names[last_pc >> 2]
+            if terminator in STATIC_TARGET_OPERATIONS:
+                target_pc = last_pc + decoded_program[last_pc >> 2][4]
+                successors = [target_pc] if terminator == 'jal' else [target_pc, end_pc]
+            elif terminator == 'jalr':
+                successors = []
+            elif terminator == 'beq_halt':
+                successors = [end_pc]
+            else:
+                terminator = None
+                successors = [end_pc]
+            self.blocks[start_pc] = BasicBlock(start_pc, end_pc, terminator, successors)
+
+    def contains(self, pc):
+        """True for a word-aligned PC inside the program"""
+        return 0 <= pc < self.program_end_address and not pc & 3
+
+    def block_containing(self, pc):
+        """BasicBlock holding the instruction at pc, or None outside the program"""
+        if not self.contains(pc):
+            return None
+        return self.blocks[self.block_leaders[bisect.bisect_right(self.block_leaders, pc) - 1]]
+
+    def format_lines(self):
+        """One line per block: its range, terminator and successors"""
+        graph_lines = []
+        for start_pc in self.block_leaders:
+            block = self.blocks[start_pc]
+            if block.terminator == 'jalr':
+                successor_text = "(dynamic)"
+            elif block.terminator == 'beq_halt':
+                successor_text = f"0x{block.successors[0]:08X} (halt)"
+            else:
+                successor_text = ", ".join(f"0x{successor_pc & 0xFFFFFFFF:08X}" for successor_pc in block.successors)
+            graph_lines.append(f"0x{block.start_pc:08X}-0x{block.end_pc - 4:08X} {block.terminator or 'fall-through'} -> {successor_text}\n")
+        return graph_lines
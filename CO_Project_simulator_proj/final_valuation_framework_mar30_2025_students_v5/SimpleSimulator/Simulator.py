@@ -0,0 +1,127 @@
+# One entry point for every simulator implementation (see EngineRegistry)
+#
+#   python3 Simulator.py input_machine_code_file output_trace_file [--engine NAME] [run options]
+#   python3 Simulator.py --compare [TEST_DIRECTORY] [--engine NAME ...]
+#   python3 Simulator.py --list-engines
+#
+# SimGrader runs this file, so any registered engine can be graded without
+# renaming it. The run options are those of Simulator5.py (--max-steps=N,
+# --time-limit=SECONDS, --data-image FILE@ADDR, --trace-format=FORMAT,
+# checkpoints, ...) and are passed on to the engine; the exit status says why
+# the run ended, as Simulator5.py's does. --compare runs the engines (all of them unless some are named)
+# on TEST_DIRECTORY, by default the simple tests, checking their traces against
+# the expected traces next to it.
+
+import os
+import sys
+
+from EngineRegistry import (DEFAULT_ENGINE, SIMULATION_ENGINE_REGISTRY, SIMULATOR_DIRECTORY, UNSUPPORTED_ENGINES,
+                            compare_engines, format_comparison, run_engine)
+from Watchdog import RUN_EXIT_STATUSES
+
+DEFAULT_TEST_DIRECTORY = os.path.join(SIMULATOR_DIRECTORY, "..", "automatedTesting", "tests", "bin", "simple")
+
+# --OPTION=VALUE run options -> (simulate_program keyword, value parser)
+RUN_OPTIONS = {
+    '--max-steps': ('max_steps', int),
+    '--time-limit': ('time_limit', float),
+    '--checkpoint': ('checkpoint_path', str),
+    '--checkpoint-every': ('checkpoint_interval', int),
+    '--resume': ('resume_path', str),
+    '--summary': ('summary_path', str),
+    '--harts': ('hart_count', int),
+    '--hart-quantum': ('hart_quantum', int),
+    '--trace-buffer': ('trace_buffer_lines', int),
+    '--trace-flush': ('trace_flush_interval', float),
+    '--trace-format': ('trace_format', str),
+}
+
+def parse_data_image_argument(argument):
+    from Simulator5 import parse_data_image_argument
+    return parse_data_image_argument(argument)
+
+def parse_hpm_event_argument(argument):
+    from PerformanceCounters import parse_hpm_event_argument
+    return parse_hpm_event_argument(argument)
+
+def main():
+    usage_message = ("Usage: python3 Simulator.py input_machine_code_file output_trace_file [--engine NAME]"
+                     " [--max-steps=N] [--time-limit=SECONDS] [--checkpoint=FILE] [--checkpoint-every=N] [--resume=FILE]"
+                     " [--hpm-event=N:EVENT ...] [--summary=FILE|-] [--harts=N] [--hart-quantum=N] [--hart-traces]"
+                     " [--trace-buffer=LINES] [--trace-flush=SECONDS] [--trace-format=text|binary|final] [--data-image FILE@ADDR ...]\n"
+                     "       python3 Simulator.py --compare [TEST_DIRECTORY] [--engine NAME ...]\n"
+                     "       python3 Simulator.py --list-engines\n"
+                     "Engines: " + ", ".join(SIMULATION_ENGINE_REGISTRY))
+    positional_arguments = []
+    engine_names = []
+    run_comparison = False
+    run_options = {}
+    command_line_arguments = sys.argv[1:]
+    try:
+        while command_line_arguments:
+            argument = command_line_arguments.pop(0)
+            option_name, separator, option_value = argument.partition('=')
+            if argument.startswith('--engine='):
+                engine_names.append(argument[len('--engine='):])
+            elif argument == '--engine' and command_line_arguments:
+                engine_names.append(command_line_arguments.pop(0))
+            elif argument == '--compare':
+                run_comparison = True
+            elif argument == '--list-engines':
+                for engine_name, (_, description) in SIMULATION_ENGINE_REGISTRY.items():
+                    if engine_name in UNSUPPORTED_ENGINES:
+                        description += f" (unsupported: {UNSUPPORTED_ENGINES[engine_name]})"
+                    print(f"{engine_name:<14}{description}")
+                return
+            elif option_name in RUN_OPTIONS and separator:
+                keyword, parse_value = RUN_OPTIONS[option_name]
+                run_options[keyword] = parse_value(option_value)
+            elif argument == '--hart-traces':
+                run_options['hart_traces'] = True
+            elif argument.startswith('--hpm-event='):
+                run_options.setdefault('counter_events', []).append(parse_hpm_event_argument(option_value))
+            elif argument.startswith('--data-image='):
+                run_options.setdefault('data_images', []).append(parse_data_image_argument(option_value))
+            elif argument == '--data-image':
+                data_image_argument = command_line_arguments.pop(0) if command_line_arguments else ''
+                run_options.setdefault('data_images', []).append(parse_data_image_argument(data_image_argument))
+            else:
+                positional_arguments.append(argument)
+    except ValueError as error:
+        print(error)
+        print(usage_message)
+        sys.exit(1)
+
+    if any(engine_name not in SIMULATION_ENGINE_REGISTRY for engine_name in engine_names):
+        print(usage_message)
+        sys.exit(1)
+
+    if run_comparison:
+        test_directory = positional_arguments[0] if positional_arguments else DEFAULT_TEST_DIRECTORY
+        # tests/bin/<set> is checked against tests/traces/<set>
+        reference_directory = os.path.join(test_directory, "..", "..", "traces", os.path.basename(os.path.normpath(test_directory)))
+        comparison_rows = compare_engines(test_directory, engine_names or None, reference_directory)
+        sys.stdout.write("".join(format_comparison(comparison_rows)))
+        return
+
+    # The grader also passes a readable-trace path, which is ignored
+    if len(positional_arguments) < 2 or len(engine_names) > 1:
+        print(usage_message)
+        sys.exit(1)
+    output_file_path = positional_arguments[1]
+    if 'checkpoint_interval' in run_options and 'checkpoint_path' not in run_options and 'resume_path' not in run_options:
+        run_options['checkpoint_path'] = output_file_path + ".checkpoint"
+    try:
+        run_end_reason = run_engine(engine_names[0] if engine_names else DEFAULT_ENGINE, positional_arguments[0],
+                                    output_file_path, **run_options)
+    except (ValueError, RuntimeError) as error:
+        print(error)
+        sys.exit(1)
+
+    # A stop by the watchdog or a budget is not a clean halt
+    if RUN_EXIT_STATUSES[run_end_reason]:
+        print(f"Stopped: {run_end_reason.replace('_', ' ')}; partial trace written to {output_file_path}", file=sys.stderr)
+    sys.exit(RUN_EXIT_STATUSES[run_end_reason])
+
+if __name__ == "__main__":
+    main()
@@ -313,38 +313,12 @@ def jal_instr(pc, instruc):
 def handle_instruction_error():
     print("error: instruction not found")
 
-if len(sys.argv) != 3:
-    print("Usage: python Simulator.py <input_file> <output_file>")
-    sys.exit(1)
-
-input_file = sys.argv[1]
-output_file = sys.argv[2]
-
-executing = []
-instr_list = read_file(input_file)
-
-instruction_memory = create_instr(instr_list)
-
-execute(instr_list, instruction_memory)
-final_memory_output = []
-
 def format_memory_values(memory_list):
     for memory_key, memory_value in data_mem.items():
         memory_string = memory_key + ":" + "0b" + dec_to_bin(memory_value)
         memory_list.append(memory_string)
     return
 
-for instruction in instr_list:
-    if len(instruction) != 32:
-        executing.clear()
-        executing.append("Error: Instruction Length is not 32 bits at line" + str(instr_list.index(instruction) + 1))
-        break
-    else:
-        if len(executing) == 1:
-            pass
-        else:
-            format_memory_values(final_memory_output)
-
 def write_output_to_file(file, trace_data, memory_data):
     with open(file, "w") as output_file_handle:
         for trace_line in trace_data:
@@ -355,4 +329,31 @@ def write_output_to_file(file, trace_data, memory_data):
             output_file_handle.write("\n")
     return
 
-write_output_to_file(output_file, executing, final_memory_output)
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python Simulator.py <input_file> <output_file>")
+        sys.exit(1)
+
+    input_file = sys.argv[1]
+    output_file = sys.argv[2]
+
+    executing = []
+    instr_list = read_file(input_file)
+
+    instruction_memory = create_instr(instr_list)
+
+    execute(instr_list, instruction_memory)
+    final_memory_output = []
+
+    for instruction in instr_list:
+        if len(instruction) != 32:
+            executing.clear()
+            executing.append("Error: Instruction Length is not 32 bits at line" + str(instr_list.index(instruction) + 1))
+            break
+        else:
+            if len(executing) == 1:
+                pass
+            else:
+                format_memory_values(final_memory_output)
+
+    write_output_to_file(output_file, executing, final_memory_output)
@@ -234,15 +234,16 @@ def jal_instr(pc, instruc):
 def handle_instruction_error():
     print("error: instruction not found")
 
-if len(sys.argv) != 3:
-    print("Usage: python Simulator.py <input_file> <output_file>")
-    sys.exit(1)
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python Simulator.py <input_file> <output_file>")
+        sys.exit(1)
 
-input_file = sys.argv[1]
-output_file = sys.argv[2]
+    input_file = sys.argv[1]
+    output_file = sys.argv[2]
 
-executing = []
-instr_list = read_file(input_file)
+    executing = []
+    instr_list = read_file(input_file)
 
-instruction_memory = create_instr(instr_list)
+    instruction_memory = create_instr(instr_list)
 
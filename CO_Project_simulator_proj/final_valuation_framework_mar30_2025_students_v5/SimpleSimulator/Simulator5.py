@@ -1,5 +1,8 @@
 import sys
 
+from PagedMemory import PAGE_SHIFT, PagedMemory
+from PerformanceCounters import MachineLevelInstruction
+
 # Changed variable names to be more descriptive but kept same structure
 register_name_mapping = {
     '00000': 'zero', '00001': 'ra',   '00010': 'sp',   '00011': 'gp',
@@ -12,28 +15,20 @@ register_name_mapping = {
     '11100': 't3',   '11101': 't4',   '11110': 't5',   '11111': 't6'
 }
 
-# Memory configuration with more verbose names
+# Memory configuration with more verbose names; this range is dumped after the trace
 STARTING_MEMORY_ADDRESS = 65536   # 0x10000
 ENDING_MEMORY_ADDRESS = 65660     # 0x1007C
 MEMORY_ADDRESS_INCREMENT = 4
 
-# Changed to use more basic data structure and initialization
-memory_data_storage = {}
-for memory_location in range(STARTING_MEMORY_ADDRESS, ENDING_MEMORY_ADDRESS + 1, MEMORY_ADDRESS_INCREMENT):
-    memory_data_storage[f"0x{memory_location:08X}"] = 0
-
 # Register configuration with more basic initialization
 NUMBER_OF_BITS_IN_REGISTER = 32
+REGISTER_VALUE_MASK = 0xFFFFFFFF
+REGISTER_SIGN_BIT = 0x80000000
 INITIAL_VALUE_FOR_STACK_POINTER = 0x17C  # 380 in decimal
 
-# Changed to use more basic initialization
-register_current_values = {}
-for register_code in register_name_mapping.keys():
-    register_current_values[register_code] = '0' * NUMBER_OF_BITS_IN_REGISTER
-
-# Initialize stack pointer separately for clarity
-stack_pointer_binary = bin(INITIAL_VALUE_FOR_STACK_POINTER)[2:].zfill(NUMBER_OF_BITS_IN_REGISTER)
-register_current_values['00010'] = stack_pointer_binary
+# One trace line: PC followed by all 32 registers, each as a 0b-prefixed 32-bit field
+TRACE_LINE_TEMPLATE = "0b{:032b} " * (len(register_name_mapping) + 1) + "\n"
+format_trace_line = TRACE_LINE_TEMPLATE.format
 
 # Instruction definitions with more verbose structure
 instruction_definitions = {
@@ -48,6 +43,17 @@ instruction_definitions = {
         },
         '0100000': {
             '000': 'sub'   # Subtract
+        },
+        # RV32M
+        '0000001': {
+            '000': 'mul',     # Multiply (low 32 bits)
+            '001': 'mulh',    # Multiply high, signed x signed
+            '010': 'mulhsu',  # Multiply high, signed x unsigned
+            '011': 'mulhu',   # Multiply high, unsigned x unsigned
+            '100': 'div',     # Divide, signed
+            '101': 'divu',    # Divide, unsigned
+            '110': 'rem',     # Remainder, signed
+            '111': 'remu'     # Remainder, unsigned
         }
     },
     # I-type instructions
@@ -65,17 +71,35 @@ instruction_definitions = {
         }
     },
     # J-type instructions
-    '1101111': {'': 'jal'}  # Jump and link
+    '1101111': {'': 'jal'},  # Jump and link
+    # Zicsr (counter reads only, see PerformanceCounters)
+    '1110011': {'': {'010': 'csrrs'}},  # Read and set CSR
+    # A extension, word forms only (funct3 010); keyed by funct5, the aq/rl
+    # bits are ignored since harts interleave one whole instruction at a time
+    '0101111': {
+        '': {
+            '00010': 'lr',       # Load reserved
+            '00011': 'sc',       # Store conditional
+            '00001': 'amoswap',  # Atomic swap
+            '00000': 'amoadd',   # Atomic add
+            '00100': 'amoxor',   # Atomic XOR
+            '01100': 'amoand',   # Atomic AND
+            '01000': 'amoor',    # Atomic OR
+            '10000': 'amomin',   # Atomic signed minimum
+            '10100': 'amomax',   # Atomic signed maximum
+            '11000': 'amominu',  # Atomic unsigned minimum
+            '11100': 'amomaxu'   # Atomic unsigned maximum
+        }
+    }
 }
 
-def generate_state_snapshot(current_program_counter, memory_range_to_show=None):
+def generate_state_snapshot(machine, current_program_counter, memory_range_to_show=None):
     """Generate state snapshot including memory context - made more verbose"""
     snapshot_output = f"0b{current_program_counter:032b}"
     
     # Add register values in order
-    sorted_register_codes = sorted(register_current_values.keys())
-    for register_code in sorted_register_codes:
-        snapshot_output += ' ' + f'0b{register_current_values[register_code]}'
+    for register_value in machine.registers:
+        snapshot_output += ' ' + f'0b{register_value:032b}'
     
     snapshot_output += '\n'
     
@@ -86,10 +110,8 @@ def generate_state_snapshot(current_program_counter, memory_range_to_show=None):
         memory_end_address = memory_range_to_show[1]
         
         for memory_address in range(memory_start_address, memory_end_address + 1, 4):
-            memory_address_hex = f"0x{memory_address:08X}"
-            if memory_address_hex in memory_data_storage:
-                memory_value = memory_data_storage[memory_address_hex]
-                snapshot_output += f"{memory_address_hex}: 0b{memory_value:032b}\n"
+            memory_value = machine.memory.load_word(memory_address)
+            snapshot_output += f"0x{memory_address:08X}: 0b{memory_value:032b}\n"
     
     return snapshot_output
 
@@ -178,196 +200,408 @@ instruction_type_categories = {
     '1100111': 'I',  # I-type (jalr)
     '0100011': 'S',  # S-type
     '1100011': 'B',  # B-type
-    '1101111': 'J'   # J-type
+    '1101111': 'J',  # J-type
+    '1110011': 'I',  # I-type (CSR)
+    '0101111': 'A'   # Atomic (R-type layout, funct5 selects the operation)
 }
 
-def perform_sign_extension(binary_string_value, total_bits=32):
-    """Sign extension with more basic implementation"""
-    if len(binary_string_value) >= total_bits:
-        return binary_string_value[-total_bits:]
-    
-    sign_bit = binary_string_value[0]
-    extension_bits = sign_bit * (total_bits - len(binary_string_value))
-    return extension_bits + binary_string_value
-
-def compare_signed_binary_values(binary_value1, binary_value2):
-    """Compare signed values with more basic implementation"""
-    if len(binary_value1) != 32 or len(binary_value2) != 32:
-        raise ValueError("Both values must be 32-bit binary strings")
-        
-    for char in binary_value1 + binary_value2:
-        if char not in ['0', '1']:
-            raise ValueError("Binary strings can only contain 0s and 1s")
-    
-    # Convert to integers
-    int_value1 = int(binary_value1, 2)
-    int_value2 = int(binary_value2, 2)
-    
-    # Handle two's complement negative numbers
-    if binary_value1[0] == '1':
-        int_value1 -= (1 << 32)
-    if binary_value2[0] == '1':
-        int_value2 -= (1 << 32)
-        
-    return int_value1 < int_value2
+def sign_extend_immediate(binary_string_value):
+    """Turn an immediate bit string into a signed integer (done once per field)"""
+    immediate_number = int(binary_string_value, 2)
+    if binary_string_value[0] == '1':
+        immediate_number -= 1 << len(binary_string_value)
+    return immediate_number
 
-def convert_binary_string_to_integer(binary_string):
-    """Binary to integer conversion with more basic implementation"""
-    if not isinstance(binary_string, str):
-        raise TypeError("Input must be a string")
-        
-    if not binary_string:
-        return 0
-        
-    for char in binary_string:
-        if char not in ['0', '1']:
-            raise ValueError("Binary string can only contain 0s and 1s")
-    
-    if binary_string[0] == '0':
-        return int(binary_string, 2)
+def convert_register_value_to_signed(register_value):
+    """Interpret a masked 32-bit register value as a two's complement integer"""
+    if register_value & REGISTER_SIGN_BIT:
+        return register_value - (1 << NUMBER_OF_BITS_IN_REGISTER)
+    return register_value
+
+# Sentinel returned by a handler when the virtual halt (beq zero,zero,0) is taken
+HALT = "HALT"
+
+# Instruction handlers: each one executes a decoded instruction and returns the next PC.
+# Signature is handler(registers, memory, rd, rs1, rs2, immediate, pc)
+def execute_add_instruction(registers, memory, rd, rs1, rs2, immediate, pc):
+    registers[rd] = (registers[rs1] + registers[rs2]) & REGISTER_VALUE_MASK
+    return pc + 4
+
+def execute_sub_instruction(registers, memory, rd, rs1, rs2, immediate, pc):
+    registers[rd] = (registers[rs1] - registers[rs2]) & REGISTER_VALUE_MASK
+    return pc + 4
+
+def execute_slt_instruction(registers, memory, rd, rs1, rs2, immediate, pc):
+    # Flipping the sign bit turns a signed comparison into an unsigned one
+    registers[rd] = 1 if (registers[rs1] ^ REGISTER_SIGN_BIT) < (registers[rs2] ^ REGISTER_SIGN_BIT) else 0
+    return pc + 4
+
+def execute_srl_instruction(registers, memory, rd, rs1, rs2, immediate, pc):
+    registers[rd] = registers[rs1] >> (registers[rs2] & 0x1F)
+    return pc + 4
+
+def execute_or_instruction(registers, memory, rd, rs1, rs2, immediate, pc):
+    registers[rd] = registers[rs1] | registers[rs2]
+    return pc + 4
+
+def execute_and_instruction(registers, memory, rd, rs1, rs2, immediate, pc):
+    registers[rd] = registers[rs1] & registers[rs2]
+    return pc + 4
+
+def execute_mul_instruction(registers, memory, rd, rs1, rs2, immediate, pc):
+    registers[rd] = (registers[rs1] * registers[rs2]) & REGISTER_VALUE_MASK
+    return pc + 4
+
+def execute_mulh_instruction(registers, memory, rd, rs1, rs2, immediate, pc):
+    product = convert_register_value_to_signed(registers[rs1]) * convert_register_value_to_signed(registers[rs2])
+    registers[rd] = (product >> 32) & REGISTER_VALUE_MASK
+    return pc + 4
+
+def execute_mulhsu_instruction(registers, memory, rd, rs1, rs2, immediate, pc):
+    product = convert_register_value_to_signed(registers[rs1]) * registers[rs2]
+    registers[rd] = (product >> 32) & REGISTER_VALUE_MASK
+    return pc + 4
+
+def execute_mulhu_instruction(registers, memory, rd, rs1, rs2, immediate, pc):
+    registers[rd] = (registers[rs1] * registers[rs2]) >> 32
+    return pc + 4
+
+def execute_div_instruction(registers, memory, rd, rs1, rs2, immediate, pc):
+    # Rounds toward zero; dividing by zero gives -1 and the overflow case
+    # (-2**31 / -1) gives -2**31, so no trap is ever raised
+    dividend = convert_register_value_to_signed(registers[rs1])
+    divisor = convert_register_value_to_signed(registers[rs2])
+    if divisor == 0:
+        registers[rd] = REGISTER_VALUE_MASK
     else:
-        # For negative numbers in two's complement
-        positive_part = int(binary_string[1:], 2)
-        return -((1 << (len(binary_string)-1)) - positive_part)
+        quotient = abs(dividend) // abs(divisor)
+        registers[rd] = (quotient if (dividend < 0) == (divisor < 0) else -quotient) & REGISTER_VALUE_MASK
+    return pc + 4
 
-def execute_R_type_instruction(opcode_part, funct7_part, source_register2, source_register1, funct3_part, destination_register):
-    """Execute R-type instruction with more basic implementation"""
-    operation_name = instruction_definitions[opcode_part][funct7_part][funct3_part]
-    
-    # Get register values as integers
-    source1_value = int(register_current_values[source_register1], 2)
-    source2_value = int(register_current_values[source_register2], 2)
-    
-    result = 0
-    
-    if operation_name == 'add':
-        result = source1_value + source2_value
-    elif operation_name == 'sub':
-        result = source1_value - source2_value
-    elif operation_name == 'slt':
-        if compare_signed_binary_values(register_current_values[source_register1], register_current_values[source_register2]):
-            result = 1
-        else:
-            result = 0
-    elif operation_name == 'srl':
-        shift_amount = int(register_current_values[source_register2][-5:], 2)
-        result = source1_value >> shift_amount
-    elif operation_name == 'or':
-        result = source1_value | source2_value
-    elif operation_name == 'and':
-        result = source1_value & source2_value
+def execute_divu_instruction(registers, memory, rd, rs1, rs2, immediate, pc):
+    divisor = registers[rs2]
+    registers[rd] = registers[rs1] // divisor if divisor else REGISTER_VALUE_MASK
+    return pc + 4
+
+def execute_rem_instruction(registers, memory, rd, rs1, rs2, immediate, pc):
+    # Takes the dividend's sign; remainder by zero is the dividend, overflow gives 0
+    dividend = convert_register_value_to_signed(registers[rs1])
+    divisor = convert_register_value_to_signed(registers[rs2])
+    if divisor == 0:
+        registers[rd] = registers[rs1]
     else:
-        return
-    
-    # Store result in destination register (32-bit)
-    register_current_values[destination_register] = format(result & 0xFFFFFFFF, '032b')
-
-def execute_S_type_instruction(opcode_part, immediate_value, source_register1, source_register2, funct3_part, program_counter_value):
-    """Execute S-type instruction with more basic implementation"""
-    if instruction_definitions[opcode_part][''][funct3_part] == 'sw':
-        # Sign extend immediate value
-        extended_immediate = perform_sign_extension(immediate_value)
-        immediate_number = convert_binary_string_to_integer(extended_immediate)
-        
-        # Calculate memory address
-        base_address = int(register_current_values[source_register1], 2)
-        memory_address = base_address + immediate_number
-        
-        # Store value in memory
-        memory_address_hex = f"0x{memory_address:08X}"
-        value_to_store = int(register_current_values[source_register2], 2)
-        memory_data_storage[memory_address_hex] = value_to_store
+        remainder = abs(dividend) % abs(divisor)
+        registers[rd] = (-remainder if dividend < 0 else remainder) & REGISTER_VALUE_MASK
+    return pc + 4
+
+def execute_remu_instruction(registers, memory, rd, rs1, rs2, immediate, pc):
+    divisor = registers[rs2]
+    registers[rd] = registers[rs1] % divisor if divisor else registers[rs1]
+    return pc + 4
+
+def execute_addi_instruction(registers, memory, rd, rs1, rs2, immediate, pc):
+    registers[rd] = (registers[rs1] + immediate) & REGISTER_VALUE_MASK
+    return pc + 4
+
+def execute_lw_instruction(registers, memory, rd, rs1, rs2, immediate, pc):
+    registers[rd] = memory.load_word(registers[rs1] + immediate)
+    return pc + 4
+
+def execute_jalr_instruction(registers, memory, rd, rs1, rs2, immediate, pc):
+    # Target is computed before rd is written in case rd == rs1
+    new_pc_value = (registers[rs1] + immediate) & ~1
+    registers[rd] = pc + 4
+    return new_pc_value
+
+def execute_sw_instruction(registers, memory, rd, rs1, rs2, immediate, pc):
+    memory.store_word(registers[rs1] + immediate, registers[rs2])
+    return pc + 4
+
+def execute_beq_instruction(registers, memory, rd, rs1, rs2, immediate, pc):
+    if registers[rs1] == registers[rs2]:
+        return pc + immediate
+    return pc + 4
+
+def execute_beq_halt_instruction(registers, memory, rd, rs1, rs2, immediate, pc):
+    # beq with a zero offset is the virtual halt when taken
+    if registers[rs1] == registers[rs2]:
+        return HALT
+    return pc + 4
+
+def execute_bne_instruction(registers, memory, rd, rs1, rs2, immediate, pc):
+    if registers[rs1] != registers[rs2]:
+        return pc + immediate
+    return pc + 4
+
+def execute_blt_instruction(registers, memory, rd, rs1, rs2, immediate, pc):
+    if (registers[rs1] ^ REGISTER_SIGN_BIT) < (registers[rs2] ^ REGISTER_SIGN_BIT):
+        return pc + immediate
+    return pc + 4
+
+def execute_jal_instruction(registers, memory, rd, rs1, rs2, immediate, pc):
+    registers[rd] = pc + 4
+    return pc + immediate
+
+def execute_csrrs_instruction(registers, memory, rd, rs1, rs2, immediate, pc):
+    # Counters belong to the machine: the engine stops here and Machine.run
+    # executes the read (execute_counter_read) with the exact instruction count
+    raise MachineLevelInstruction
+
+def execute_lr_instruction(registers, memory, rd, rs1, rs2, immediate, pc):
+    # Reservations belong to the hart: Machine.run executes lr/sc
+    raise MachineLevelInstruction
+
+def execute_sc_instruction(registers, memory, rd, rs1, rs2, immediate, pc):
+    raise MachineLevelInstruction
+
+def execute_atomic_memory_operation(registers, memory, rd, rs1, rs2, combine_values):
+    """Shared body of the AMOs: rd gets the old word, memory gets combine_values(old word, rs2)"""
+    address = registers[rs1]
+    if address & 3:
+        raise ValueError(f"Misaligned atomic memory access at 0x{address:08X}")
+    original_value = memory.load_word(address)
+    memory.store_word(address, combine_values(original_value, registers[rs2]))
+    registers[rd] = original_value
+
+def execute_amoswap_instruction(registers, memory, rd, rs1, rs2, immediate, pc):
+    execute_atomic_memory_operation(registers, memory, rd, rs1, rs2, lambda old_value, source_value: source_value)
+    return pc + 4
+
+def execute_amoadd_instruction(registers, memory, rd, rs1, rs2, immediate, pc):
+    execute_atomic_memory_operation(registers, memory, rd, rs1, rs2,
+                                    lambda old_value, source_value: (old_value + source_value) & REGISTER_VALUE_MASK)
+    return pc + 4
+
+def execute_amoxor_instruction(registers, memory, rd, rs1, rs2, immediate, pc):
+    execute_atomic_memory_operation(registers, memory, rd, rs1, rs2, lambda old_value, source_value: old_value ^ source_value)
+    return pc + 4
+
+def execute_amoand_instruction(registers, memory, rd, rs1, rs2, immediate, pc):
+    execute_atomic_memory_operation(registers, memory, rd, rs1, rs2, lambda old_value, source_value: old_value & source_value)
+    return pc + 4
+
+def execute_amoor_instruction(registers, memory, rd, rs1, rs2, immediate, pc):
+    execute_atomic_memory_operation(registers, memory, rd, rs1, rs2, lambda old_value, source_value: old_value | source_value)
+    return pc + 4
+
+def execute_amomin_instruction(registers, memory, rd, rs1, rs2, immediate, pc):
+    execute_atomic_memory_operation(registers, memory, rd, rs1, rs2,
+                                    lambda old_value, source_value: min(old_value, source_value, key=convert_register_value_to_signed))
+    return pc + 4
+
+def execute_amomax_instruction(registers, memory, rd, rs1, rs2, immediate, pc):
+    execute_atomic_memory_operation(registers, memory, rd, rs1, rs2,
+                                    lambda old_value, source_value: max(old_value, source_value, key=convert_register_value_to_signed))
+    return pc + 4
+
+def execute_amominu_instruction(registers, memory, rd, rs1, rs2, immediate, pc):
+    execute_atomic_memory_operation(registers, memory, rd, rs1, rs2, min)
+    return pc + 4
+
+def execute_amomaxu_instruction(registers, memory, rd, rs1, rs2, immediate, pc):
+    execute_atomic_memory_operation(registers, memory, rd, rs1, rs2, max)
+    return pc + 4
+
+def execute_invalid_instruction(registers, memory, rd, rs1, rs2, immediate, pc):
+    # Decoding errors are only reported once the instruction is actually reached;
+    # the immediate slot carries the error message
+    raise ValueError(immediate)
+
+# Operation name (from instruction_definitions) to handler
+instruction_handlers = {
+    'add': execute_add_instruction,
+    'sub': execute_sub_instruction,
+    'slt': execute_slt_instruction,
+    'srl': execute_srl_instruction,
+    'or': execute_or_instruction,
+    'and': execute_and_instruction,
+    'mul': execute_mul_instruction,
+    'mulh': execute_mulh_instruction,
+    'mulhsu': execute_mulhsu_instruction,
+    'mulhu': execute_mulhu_instruction,
+    'div': execute_div_instruction,
+    'divu': execute_divu_instruction,
+    'rem': execute_rem_instruction,
+    'remu': execute_remu_instruction,
+    'lw': execute_lw_instruction,
+    'addi': execute_addi_instruction,
+    'jalr': execute_jalr_instruction,
+    'sw': execute_sw_instruction,
+    'beq': execute_beq_instruction,
+    'bne': execute_bne_instruction,
+    'blt': execute_blt_instruction,
+    'jal': execute_jal_instruction,
+    'csrrs': execute_csrrs_instruction,
+    'lr': execute_lr_instruction,
+    'sc': execute_sc_instruction,
+    'amoswap': execute_amoswap_instruction,
+    'amoadd': execute_amoadd_instruction,
+    'amoxor': execute_amoxor_instruction,
+    'amoand': execute_amoand_instruction,
+    'amoor': execute_amoor_instruction,
+    'amomin': execute_amomin_instruction,
+    'amomax': execute_amomax_instruction,
+    'amominu': execute_amominu_instruction,
+    'amomaxu': execute_amomaxu_instruction
+}
+
+# Instructions the engines stop in front of and Machine.run executes itself
+MACHINE_LEVEL_OPERATIONS = {
+    execute_csrrs_instruction: 'csrrs',
+    execute_lr_instruction: 'lr',
+    execute_sc_instruction: 'sc'
+}
+
+def decode_instruction(instruction_string):
+    """Decode one 32-character instruction into (handler, rd, rs1, rs2, immediate)"""
+    opcode_value = instruction_string[-7:]
     
-    return program_counter_value + 4
-
-def execute_J_type_instruction(opcode_part, immediate_value, destination_register, program_counter_value):
-    """Execute J-type instruction with more basic implementation"""
-    if instruction_definitions[opcode_part][''] == 'jal':
-        # Sign extend and adjust immediate value
-        extended_immediate = perform_sign_extension(immediate_value)
-        immediate_number = convert_binary_string_to_integer(extended_immediate)
-        
-        # Save return address (PC+4)
-        return_address = program_counter_value + 4
-        register_current_values[destination_register] = format(return_address, '032b')
+    if opcode_value not in instruction_definitions:
+        return (execute_invalid_instruction, 0, 0, 0, "Invalid opcode in instruction")
         
-        # Calculate new PC
-        return program_counter_value + immediate_number
+    instruction_type = instruction_type_categories[opcode_value]
+    funct7_value = instruction_string[:7]
+    rs2_value = instruction_string[7:12]
+    rs1_value = instruction_string[12:17]
+    funct3_value = instruction_string[17:20]
+    rd_value = instruction_string[20:25]
     
-    return program_counter_value
+    if instruction_type == 'R':
+        if not validate_R_type_instruction(opcode_value, funct7_value, funct3_value):
+            return (execute_invalid_instruction, 0, 0, 0, "Invalid R-type instruction")
+        if rs1_value not in register_name_mapping:
+            return (execute_invalid_instruction, 0, 0, 0, "Invalid source register 1")
+        if rs2_value not in register_name_mapping:
+            return (execute_invalid_instruction, 0, 0, 0, "Invalid source register 2")
+        if rd_value not in register_name_mapping:
+            return (execute_invalid_instruction, 0, 0, 0, "Invalid destination register")
+        operation_name = instruction_definitions[opcode_value][funct7_value][funct3_value]
+        return (instruction_handlers[operation_name], int(rd_value, 2), int(rs1_value, 2), int(rs2_value, 2), 0)
 
-def execute_I_type_instruction(immediate_value, source_register1, funct3_part, destination_register, opcode_part, program_counter_value, instruction_string):
-    """Execute I-type instruction with more basic implementation"""
-    # Sign extend immediate value
-    extended_immediate = perform_sign_extension(immediate_value)
-    immediate_number = convert_binary_string_to_integer(extended_immediate)
-    
-    operation_name = instruction_definitions[opcode_part][''][funct3_part]
-    
-    if operation_name == 'addi':
-        # Get source register value
-        source_value = int(register_current_values[source_register1], 2)
-        
-        # Perform addition
-        result = source_value + immediate_number
-        
-        # Store result (32-bit)
-        register_current_values[destination_register] = format(result & 0xFFFFFFFF, '032b')
-        return program_counter_value + 4
-
-    elif operation_name == 'jalr':
-        # Calculate new PC
-        base_address = int(register_current_values[source_register1], 2)
-        new_pc_value = (base_address + immediate_number) & ~1
-        
-        # Save return address
-        return_address = program_counter_value + 4
-        register_current_values[destination_register] = format(return_address, '032b')
-        
-        return new_pc_value
+    elif instruction_type == 'I':
+        if not validate_I_type_instruction(opcode_value, funct3_value):
+            return (execute_invalid_instruction, 0, 0, 0, "Invalid I-type instruction")
+        if rs1_value not in register_name_mapping:
+            return (execute_invalid_instruction, 0, 0, 0, "Invalid source register")
+        operation_name = instruction_definitions[opcode_value][''][funct3_value]
+        if operation_name == 'csrrs':
+            # The counters are read-only, so only csrrs rd, CSR, x0 is legal; the
+            # CSR number is unsigned
+            if rs1_value != '00000':
+                return (execute_invalid_instruction, 0, 0, 0, "CSR counters are read-only (csrrs needs rs1 = x0)")
+            return (execute_csrrs_instruction, int(rd_value, 2), 0, 0, int(instruction_string[:12], 2))
+        immediate_number = sign_extend_immediate(instruction_string[:12])
+        return (instruction_handlers[operation_name], int(rd_value, 2), int(rs1_value, 2), 0, immediate_number)
 
-    elif operation_name == 'lw':
-        # Calculate memory address
-        base_address = int(register_current_values[source_register1], 2)
-        memory_address = base_address + immediate_number
-        
-        # Load value from memory
-        memory_address_hex = f"0x{memory_address:08X}"
-        loaded_value = memory_data_storage[memory_address_hex]
-        
-        # Store in destination register
-        register_current_values[destination_register] = format(loaded_value, '032b')
-        return program_counter_value + 4
-
-def execute_B_type_instruction(opcode_part, immediate_value, source_register1, source_register2, program_counter_value, funct3_part):
-    """Execute B-type instruction with more basic implementation"""
-    # Immediate value needs to be multiplied by 2 (add 0 at end)
-    adjusted_immediate = immediate_value + '0'
-    
-    # Sign extend
-    extended_immediate = perform_sign_extension(adjusted_immediate)
-    immediate_number = convert_binary_string_to_integer(extended_immediate)
-    
-    operation_name = instruction_definitions[opcode_part][''][funct3_part]
-    
-    if operation_name == 'beq':
-        if register_current_values[source_register1] == register_current_values[source_register2]:
-            if immediate_number == 0:
-                return "HALT"
-            else:
-                return program_counter_value + immediate_number
-    elif operation_name == 'bne':
-        if register_current_values[source_register1] != register_current_values[source_register2]:
-            return program_counter_value + immediate_number
-    elif operation_name == 'blt':
-        value1 = convert_binary_string_to_integer(register_current_values[source_register1])
-        value2 = convert_binary_string_to_integer(register_current_values[source_register2])
-        if value1 < value2:
-            return program_counter_value + immediate_number
-
-    return program_counter_value + 4
-
-def generate_full_state_dump(current_pc_value, show_memory=False, memory_address_range=None):
+    elif instruction_type == 'S':
+        if not validate_S_type_instruction(opcode_value, funct3_value):
+            return (execute_invalid_instruction, 0, 0, 0, "Invalid S-type instruction")
+        if rs1_value not in register_name_mapping:
+            return (execute_invalid_instruction, 0, 0, 0, "Invalid source register 1")
+        if rs2_value not in register_name_mapping:
+            return (execute_invalid_instruction, 0, 0, 0, "Invalid source register 2")
+        operation_name = instruction_definitions[opcode_value][''][funct3_value]
+        immediate_number = sign_extend_immediate(instruction_string[:7] + instruction_string[20:25])
+        return (instruction_handlers[operation_name], 0, int(rs1_value, 2), int(rs2_value, 2), immediate_number)
+
+    elif instruction_type == 'B':
+        if not validate_B_type_instruction(opcode_value, funct3_value):
+            return (execute_invalid_instruction, 0, 0, 0, "Invalid B-type instruction")
+        if rs1_value not in register_name_mapping:
+            return (execute_invalid_instruction, 0, 0, 0, "Invalid source register 1")
+        if rs2_value not in register_name_mapping:
+            return (execute_invalid_instruction, 0, 0, 0, "Invalid source register 2")
+        operation_name = instruction_definitions[opcode_value][''][funct3_value]
+        # Immediate value needs to be multiplied by 2 (add 0 at end)
+        immediate_number = sign_extend_immediate(instruction_string[0] + instruction_string[24] + instruction_string[1:7] + instruction_string[20:24] + '0')
+        handler = instruction_handlers[operation_name]
+        if handler is execute_beq_instruction and immediate_number == 0:
+            handler = execute_beq_halt_instruction
+        return (handler, 0, int(rs1_value, 2), int(rs2_value, 2), immediate_number)
+
+    elif instruction_type == 'A':
+        funct5_value = instruction_string[:5]
+        if funct3_value != '010' or funct5_value not in instruction_definitions[opcode_value]['']:
+            return (execute_invalid_instruction, 0, 0, 0, "Invalid A-type instruction")
+        operation_name = instruction_definitions[opcode_value][''][funct5_value]
+        if operation_name == 'lr' and rs2_value != '00000':
+            return (execute_invalid_instruction, 0, 0, 0, "Invalid A-type instruction")
+        return (instruction_handlers[operation_name], int(rd_value, 2), int(rs1_value, 2), int(rs2_value, 2), 0)
+
+    elif instruction_type == 'J':
+        if not validate_J_type_instruction(opcode_value):
+            return (execute_invalid_instruction, 0, 0, 0, "Invalid J-type instruction")
+        if rd_value not in register_name_mapping:
+            return (execute_invalid_instruction, 0, 0, 0, "Invalid destination register")
+        immediate_number = sign_extend_immediate(instruction_string[0] + instruction_string[12:20] + instruction_string[11] + instruction_string[1:11] + '0')
+        return (execute_jal_instruction, int(rd_value, 2), 0, 0, immediate_number)
+
+    return (execute_invalid_instruction, 0, 0, 0, "Unknown instruction type")
+
+def decode_program(instruction_list):
+    """One-time decode of the program text; entry i holds the instruction at PC i*4"""
+    decoded_program = []
+    for instruction_line in instruction_list:
+        stripped_line = instruction_line.strip()
+        if stripped_line:
+            decoded_program.append(decode_instruction(stripped_line))
+    return decoded_program
+
+def is_program_image(instruction_list):
+    """True for the word array of a .bin / hex image (see read_program_file), False for program text lines"""
+    return not isinstance(instruction_list, (list, tuple))
+
+def decode_and_load_program(instruction_list, memory):
+    """Decode the program and place its words in memory; images and large programs are converted in bulk with NumPy"""
+    program_words = None
+    if is_program_image(instruction_list):
+        from ProgramLoader import decode_program_words
+        program_words = instruction_list
+    # Importing NumPy and decoding in bulk costs about 0.08 s up front against
+    # about 2.3 us per line one at a time, so it only pays for itself from
+    # BULK_LOADING_MINIMUM_LINES lines unless NumPy is loaded already
+    elif len(instruction_list) >= BULK_LOADING_MINIMUM_LINES or 'numpy' in sys.modules:
+        try:
+            from ProgramLoader import decode_program_words, parse_text_program
+        except ImportError:
+            pass
+        else:
+            program_words = parse_text_program(instruction_list)
+    if program_words is not None:
+        memory.write_bytes(0, program_words.astype('<u4').tobytes())
+        return decode_program_words(program_words, decode_instruction, instruction_type_categories)
+    load_program_into_memory(instruction_list, memory)
+    return decode_program(instruction_list)
+
+def load_program_into_memory(instruction_list, memory):
+    """Place the instruction words in memory from address 0, where instruction fetch reads them"""
+    instruction_address = 0
+    for instruction_line in instruction_list:
+        stripped_line = instruction_line.strip()
+        if stripped_line:
+            try:
+                instruction_word = int(stripped_line, 2) & 0xFFFFFFFF
+            except ValueError:
+                instruction_word = 0
+            memory.store_word(instruction_address, instruction_word)
+            instruction_address += 4
+
+def track_code_stores(decoded_program, memory):
+    """Re-decode instructions from memory whenever a store overwrites them"""
+    program_end_address = len(decoded_program) * 4
+
+    def refresh_decoded_instructions(address, length):
+        first_index = address >> 2
+        end_index = min((address + length + 3) >> 2, len(decoded_program))
+        for instruction_index in range(first_index, end_index):
+            decoded_program[instruction_index] = decode_instruction(f"{memory.load_word(instruction_index * 4):032b}")
+        return first_index < end_index
+
+    if program_end_address:
+        for page_number in range(((program_end_address - 1) >> PAGE_SHIFT) + 1):
+            memory.add_store_listener(page_number, refresh_decoded_instructions)
+
+def generate_full_state_dump(machine, current_pc_value, show_memory=False, memory_address_range=None):
     """Generate full state dump with more basic implementation"""
     state_lines = []
     
@@ -377,8 +611,8 @@ def generate_full_state_dump(current_pc_value, show_memory=False, memory_address
     
     # Add register values
     register_line_parts = []
-    for register_code in sorted(register_current_values.keys()):
-        register_line_parts.append(f'0b{register_current_values[register_code]}')
+    for register_value in machine.registers:
+        register_line_parts.append(f'0b{register_value:032b}')
     register_line = "Registers: " + ' '.join(register_line_parts)
     state_lines.append(register_line)
     
@@ -393,174 +627,711 @@ def generate_full_state_dump(current_pc_value, show_memory=False, memory_address
             mem_start, mem_end = memory_address_range
             
         for mem_address in range(mem_start, mem_end + 1, 4):
-            mem_address_hex = f"0x{mem_address:08X}"
-            if mem_address_hex in memory_data_storage:
-                mem_value = memory_data_storage[mem_address_hex]
-                mem_line = f"{mem_address_hex}: 0b{mem_value:032b}"
-                state_lines.append(mem_line)
+            mem_value = machine.memory.load_word(mem_address)
+            mem_line = f"0x{mem_address:08X}: 0b{mem_value:032b}"
+            state_lines.append(mem_line)
     
     return '\n'.join(state_lines) + '\n'
 
-def simulate_program(instruction_list, output_file_path):
-    """Main simulation function with more basic implementation"""
-    simulation_output = ""
-
-    # Clean and prepare instructions
-    cleaned_instructions = []
-    for instruction_line in instruction_list:
-        stripped_line = instruction_line.strip()
-        if stripped_line:
-            cleaned_instructions.append(stripped_line)
-    
-    # Load instructions into memory
-    instruction_memory_map = {}
-    for instruction_index in range(len(cleaned_instructions)):
-        instruction_address = instruction_index * 4
-        instruction_memory_map[instruction_address] = cleaned_instructions[instruction_index]
-    
-    # Initialize program counter
-    pc_value = 0
+def run_decoded_program(decoded_program, registers, memory, trace_lines, pc_value=0, max_steps=None):
+    """Interpreter engine: one indexed dispatch per step, one trace line per instruction; returns (next PC or HALT, steps, halting PC)"""
+    program_end_address = len(decoded_program) * 4
+    step_limit = sys.maxsize if max_steps is None else max_steps
+    steps_executed = 0
     
     # Main simulation loop
-    while pc_value in instruction_memory_map:
-        previous_pc_value = pc_value
-        current_instruction = instruction_memory_map[pc_value]
-        
-        # Extract opcode
-        opcode_value = current_instruction[-7:]
-        
-        if opcode_value not in instruction_definitions:
-            raise ValueError("Invalid opcode in instruction")
-            
-        instruction_type = instruction_type_categories[opcode_value]
-        
-        if instruction_type == 'R':
-            # R-type instruction
-            funct7_value = current_instruction[:7]
-            rs2_value = current_instruction[7:12]
-            rs1_value = current_instruction[12:17]
-            funct3_value = current_instruction[17:20]
-            rd_value = current_instruction[20:25]
+    try:
+        while steps_executed < step_limit and 0 <= pc_value < program_end_address and not pc_value & 3:
+            handler, rd_value, rs1_value, rs2_value, immediate_value = decoded_program[pc_value >> 2]
+            next_pc_value = handler(registers, memory, rd_value, rs1_value, rs2_value, immediate_value, pc_value)
+            steps_executed += 1
             
-            if not validate_R_type_instruction(opcode_value, funct7_value, funct3_value):
-                raise ValueError("Invalid R-type instruction")
-                
-            if rs1_value not in register_name_mapping:
-                raise ValueError("Invalid source register 1")
-                
-            if rs2_value not in register_name_mapping:
-                raise ValueError("Invalid source register 2")
-                
-            if rd_value not in register_name_mapping:
-                raise ValueError("Invalid destination register")
-                
-            execute_R_type_instruction(opcode_value, funct7_value, rs2_value, rs1_value, funct3_value, rd_value)
-            pc_value += 4
-
-        elif instruction_type == 'I':
-            # I-type instruction
-            immediate_value = current_instruction[:12]
-            rs1_value = current_instruction[12:17]
-            funct3_value = current_instruction[17:20]
-            rd_value = current_instruction[20:25]
+            if next_pc_value is HALT:
+                trace_lines.append(format_trace_line(pc_value, *registers))
+                return HALT, steps_executed, pc_value
             
-            if not validate_I_type_instruction(opcode_value, funct3_value):
-                raise ValueError("Invalid I-type instruction")
-                
-            if rs1_value not in register_name_mapping:
-                raise ValueError("Invalid source register")
-                
-            pc_value = execute_I_type_instruction(immediate_value, rs1_value, funct3_value, rd_value, opcode_value, pc_value, current_instruction)
-
-        elif instruction_type == 'S':
-            # S-type instruction
-            immediate_value = current_instruction[:7] + current_instruction[20:25]
-            rs2_value = current_instruction[7:12]
-            rs1_value = current_instruction[12:17]
-            funct3_value = current_instruction[17:20]
+            # Ensure zero register stays zero
+            registers[0] = 0
             
-            if not validate_S_type_instruction(opcode_value, funct3_value):
-                raise ValueError("Invalid S-type instruction")
-                
-            if rs1_value not in register_name_mapping:
-                raise ValueError("Invalid source register 1")
-                
-            if rs2_value not in register_name_mapping:
-                raise ValueError("Invalid source register 2")
-                
-            pc_value = execute_S_type_instruction(opcode_value, immediate_value, rs1_value, rs2_value, funct3_value, pc_value)
-
-        elif instruction_type == 'B':
-            # B-type instruction
-            immediate_value = current_instruction[0] + current_instruction[24] + current_instruction[1:7] + current_instruction[20:24]
-            rs2_value = current_instruction[7:12]
-            rs1_value = current_instruction[12:17]
-            funct3_value = current_instruction[17:20]
+            # Generate output line (PC followed by every register)
+            trace_lines.append(format_trace_line(next_pc_value, *registers))
+            pc_value = next_pc_value
+    except MachineLevelInstruction:
+        # Stop in front of it; Machine.run executes it
+        pass
+    
+    return pc_value, steps_executed, None
+
+def run_rendered_program(decoded_program, registers, memory, trace_lines, trace_renderer, pc_value=0, max_steps=None):
+    """Interpreter engine re-rendering only the PC and destination register fields of each trace line (see TraceRenderer)"""
+    program_end_address = len(decoded_program) * 4
+    step_limit = sys.maxsize if max_steps is None else max_steps
+    steps_executed = 0
+    fields = trace_renderer.fields
+    binary_halfwords = trace_renderer.binary_halfwords
+    join_fields = "".join
+    trace_renderer.render_registers(registers)
+    
+    try:
+        while steps_executed < step_limit and 0 <= pc_value < program_end_address and not pc_value & 3:
+            handler, rd_value, rs1_value, rs2_value, immediate_value = decoded_program[pc_value >> 2]
+            next_pc_value = handler(registers, memory, rd_value, rs1_value, rs2_value, immediate_value, pc_value)
+            steps_executed += 1
             
-            if not validate_B_type_instruction(opcode_value, funct3_value):
-                raise ValueError("Invalid B-type instruction")
-                
-            if rs1_value not in register_name_mapping:
-                raise ValueError("Invalid source register 1")
-                
-            if rs2_value not in register_name_mapping:
-                raise ValueError("Invalid source register 2")
-                
-            old_pc_value = pc_value
-            pc_value = execute_B_type_instruction(opcode_value, immediate_value, rs1_value, rs2_value, pc_value, funct3_value)
+            if next_pc_value is HALT:
+                fields[0] = f"0b{binary_halfwords[pc_value >> 16]}{binary_halfwords[pc_value & 0xFFFF]} "
+                trace_lines.append(join_fields(fields))
+                return HALT, steps_executed, pc_value
             
-            if pc_value == "HALT":
-                simulation_output += f"0b{format(previous_pc_value, '032b')} "
-                for reg_code in register_current_values.keys():
-                    simulation_output += f"0b{register_current_values[reg_code]} "
-                simulation_output += "\n"
-                break
+            registers[0] = 0
+            register_value = registers[rd_value]
+            fields[rd_value + 1] = f"0b{binary_halfwords[register_value >> 16]}{binary_halfwords[register_value & 0xFFFF]} "
+            if next_pc_value >> 32:
+                # Jumped outside the address space; the line still shows it as is
+                fields[0] = f"0b{next_pc_value:032b} "
+            else:
+                fields[0] = f"0b{binary_halfwords[next_pc_value >> 16]}{binary_halfwords[next_pc_value & 0xFFFF]} "
+            trace_lines.append(join_fields(fields))
+            pc_value = next_pc_value
+    except MachineLevelInstruction:
+        pass
+    
+    return pc_value, steps_executed, None
 
-        elif instruction_type == 'J':
-            # J-type instruction
-            immediate_value = current_instruction[0] + current_instruction[12:20] + current_instruction[11] + current_instruction[1:11] + '0'
-            rd_value = current_instruction[20:25]
+def run_delta_program(decoded_program, registers, memory, trace_deltas, pc_value=0, max_steps=None):
+    """Interpreter engine recording a (PC, rd, value of rd) delta per instruction instead of a trace line (see BinaryTrace)"""
+    program_end_address = len(decoded_program) * 4
+    step_limit = sys.maxsize if max_steps is None else max_steps
+    steps_executed = 0
+    
+    try:
+        while steps_executed < step_limit and 0 <= pc_value < program_end_address and not pc_value & 3:
+            handler, rd_value, rs1_value, rs2_value, immediate_value = decoded_program[pc_value >> 2]
+            next_pc_value = handler(registers, memory, rd_value, rs1_value, rs2_value, immediate_value, pc_value)
+            steps_executed += 1
             
-            if not validate_J_type_instruction(opcode_value):
-                raise ValueError("Invalid J-type instruction")
-                
-            if rd_value not in register_name_mapping:
-                raise ValueError("Invalid destination register")
-                
-            pc_value = execute_J_type_instruction(opcode_value, immediate_value, rd_value, pc_value)
-        
+            if next_pc_value is HALT:
+                trace_deltas.append((pc_value, 0, 0))
+                return HALT, steps_executed, pc_value
+            
+            registers[0] = 0
+            trace_deltas.append((next_pc_value, rd_value, registers[rd_value]))
+            pc_value = next_pc_value
+    except MachineLevelInstruction:
+        pass
+    
+    return pc_value, steps_executed, None
+
+# Program files read as images rather than text (see ProgramLoader); .bin is
+# raw little-endian words, the others Intel HEX or $readmemh-style hex
+PROGRAM_IMAGE_EXTENSIONS = ('.bin', '.hex', '.ihex', '.mem')
+# Text programs at least this long are converted and decoded in bulk with
+# NumPy; both ways take about 0.11 s at this length
+BULK_LOADING_MINIMUM_LINES = 49152
+# The interpreter renders trace lines through a TraceRenderer once a run has
+# retired this many instructions; shorter runs do not repay building its table
+TRACE_RENDERING_MINIMUM_STEPS = 4096
+
+# Engines selectable with --engine=NAME; 'compiled' runs the program's cached
+# AheadOfTimeCompiler module when there is one and interprets otherwise
+SIMULATION_ENGINES = ['compiled', 'interpreter', 'blocks']
+# Trace files selectable with --trace-format=NAME; 'binary' is BinaryTrace's
+# packed delta format, converted back to text with BinaryTrace.py; 'final' turns
+# the trace off and writes only the final state line and the memory dump
+TRACE_FORMATS = ['text', 'binary', 'final']
+
+class Machine:
+    """One simulated processor (hart) owning its registers and PC; harts of one system share memory"""
+    __slots__ = ('registers', 'memory', 'pc', 'halted', 'instructions_retired', 'hart_id', 'reservation_address', 'reservation_page',
+                 'instruction_list', 'decoded_program', 'block_engine', 'hooks', 'performance_counters', 'trace_renderer',
+                 'trace_deltas', 'trace_steps')
+
+    def __init__(self, memory=None, hart_id=0):
+        # Register file holds masked 32-bit ints indexed by register number (x0..x31);
+        # binary strings are only produced when a trace line is written
+        self.registers = [0] * len(register_name_mapping)
+        self.registers[2] = INITIAL_VALUE_FOR_STACK_POINTER
+        # Harts start with their id in a0 (also readable as mhartid)
+        self.hart_id = hart_id
+        self.registers[10] = hart_id
+        # Word address held by lr.w until a store to it or the next sc.w, and
+        # the page whose stores are being watched for it
+        self.reservation_address = None
+        self.reservation_page = None
+
+        # Byte-addressable paged memory covering the whole 32-bit address space
+        # (program, stack, data and everything else)
+        self.memory = PagedMemory() if memory is None else memory
+
+        self.pc = 0
+        self.halted = False
+        self.instructions_retired = 0
+        # Program text lines, or the word array of a .bin / hex image
+        self.instruction_list = []
+        self.decoded_program = []
+        self.block_engine = None
+        self.hooks = None
+        self.performance_counters = None
+        self.trace_renderer = None
+        # Set before the first run to have the engines record (PC, rd, value)
+        # deltas instead of trace lines, for BinaryTrace's writer; cleared when
+        # nobody reads the per-step records, so counted loops can skip them
+        self.trace_deltas = False
+        self.trace_steps = True
+
+    def load_program(self, instruction_list):
+        """Decode the program once and place it in memory at address 0"""
+        self.instruction_list = instruction_list
+        # The instruction at PC p lives at index p >> 2; stores into it are re-decoded
+        self.decoded_program = decode_and_load_program(instruction_list, self.memory)
+        track_code_stores(self.decoded_program, self.memory)
+        self.block_engine = None
+
+    def get_block_engine(self, render_trace_fields=True):
+        """The block engine, built on first use; blocks from the ahead-of-time cache format their own lines, so it then gets no TraceRenderer"""
+        if self.block_engine is None:
+            from BlockTranslator import BlockTranslator
+            trace_renderer = self.get_trace_renderer() if render_trace_fields and not self.trace_deltas else None
+            self.block_engine = BlockTranslator(self.decoded_program, format_trace_line, HALT, trace_renderer=trace_renderer,
+                                                trace_deltas=self.trace_deltas)
+            self.block_engine.track_code_stores(self.memory)
+        return self.block_engine
+
+    def get_trace_renderer(self):
+        if self.trace_renderer is None:
+            from TraceRenderer import TraceRenderer
+            self.trace_renderer = TraceRenderer()
+        return self.trace_renderer
+
+    def get_hooks(self):
+        """ExecutionHooks to register step/load/store/branch/jump observers with"""
+        if self.hooks is None:
+            from ExecutionHooks import ExecutionHooks
+            self.hooks = ExecutionHooks(format_trace_line, HALT)
+        return self.hooks
+
+    def get_performance_counters(self):
+        if self.performance_counters is None:
+            from PerformanceCounters import PerformanceCounters
+            self.performance_counters = PerformanceCounters()
+        return self.performance_counters
+
+    def left_program(self):
+        """True once the PC is outside the program, which ends a run without a halt"""
+        return not self.halted and not (0 <= self.pc < len(self.decoded_program) * 4 and not self.pc & 3)
+
+    def capture_state(self):
+        """PC, registers and reservation, for spotting a run that repeats itself"""
+        return (self.pc, tuple(self.registers), self.reservation_address)
+
+    def execute_machine_level_instruction(self, trace_sink):
+        """Run the csrrs, lr.w or sc.w at the current PC (engines stop in front of them)"""
+        handler, rd, rs1, rs2, immediate = self.decoded_program[self.pc >> 2]
+        operation_name = MACHINE_LEVEL_OPERATIONS[handler]
+        address = self.registers[rs1]
+        stored_value = self.registers[rs2]
+        if operation_name == 'csrrs':
+            result = self.get_performance_counters().read_csr(immediate, self.instructions_retired, self.hart_id)
+        elif operation_name == 'lr':
+            result = self.load_reserved(address)
         else:
-            raise ValueError("Unknown instruction type")
+            result = self.store_conditional(address, stored_value)
+        self.registers[rd] = result
+        self.registers[0] = 0
+        self.instructions_retired += 1
+        if self.hooks is not None:
+            # lr.w is a load and a successful sc.w a store, as for lw and sw
+            if operation_name == 'lr':
+                for callback in self.hooks.load_hooks:
+                    callback(self.pc, address, result)
+            elif operation_name == 'sc' and result == 0:
+                for callback in self.hooks.store_hooks:
+                    callback(self.pc, address, stored_value)
+            for callback in self.hooks.step_hooks:
+                callback(self.pc, self.pc + 4, operation_name, rd, rs1, rs2, immediate, self.registers)
+        self.pc += 4
+        if self.trace_deltas:
+            trace_sink.append((self.pc, rd, self.registers[rd]))
+        else:
+            trace_sink.append(format_trace_line(self.pc, *self.registers))
+
+    def load_reserved(self, address):
+        """lr.w: load the word and reserve it; a store to it from any hart drops the reservation"""
+        if address & 3:
+            raise ValueError(f"Misaligned atomic memory access at 0x{address:08X}")
+        self.drop_reservation()
+        self.reservation_address = address
+        self.reservation_page = address >> PAGE_SHIFT
+        self.memory.add_store_listener(self.reservation_page, self.break_reservation)
+        return self.memory.load_word(address)
+
+    def store_conditional(self, address, value):
+        """sc.w: store only if the reservation on address still holds; 0 on success, 1 on failure"""
+        if address & 3:
+            raise ValueError(f"Misaligned atomic memory access at 0x{address:08X}")
+        reservation_held = self.reservation_address == address
+        self.drop_reservation()
+        if not reservation_held:
+            return 1
+        self.memory.store_word(address, value)
+        return 0
+
+    def break_reservation(self, address, length):
+        """Store listener on the reserved page"""
+        if self.reservation_address is not None and address < self.reservation_address + 4 and self.reservation_address < address + length:
+            self.reservation_address = None
+        return False
+
+    def drop_reservation(self):
+        # The listener stays registered until here, as it may not be removed while stores are being reported
+        if self.reservation_page is not None:
+            self.memory.remove_store_listener(self.reservation_page, self.break_reservation)
+        self.reservation_address = None
+        self.reservation_page = None
+
+    def run(self, program=None, trace_sink=None, max_steps=None, engine='interpreter', fast_forward_loops=False):
+        """Run program (or carry on with the loaded one) until halt, the end of the program or max_steps instructions"""
+        if program is not None:
+            self.load_program(program)
+        # One trace line (or delta, with trace_deltas) per instruction goes to
+        # trace_sink through append/extend; it is returned so a fresh list can be
+        # used by default
+        if trace_sink is None:
+            trace_sink = []
+        if self.halted:
+            return trace_sink
 
-        # Generate output line
-        if pc_value == 'HALT':
-            simulation_output += "0b" + format(int(previous_pc_value), "032b") + " "
+        # Hooks that only count hpmcounter events need not see every step; the
+        # block engine counts those events per block instead
+        counting_only = (self.hooks is not None and self.performance_counters is not None and self.hooks.is_active()
+                         and not self.hooks.is_active(self.performance_counters.counting_callbacks))
+
+        # Cached compiled blocks format text lines, so delta runs translate their own
+        if engine == 'compiled' and self.block_engine is None and not self.trace_deltas:
+            from AheadOfTimeCompiler import load_compiled_program
+            compiled_blocks = load_compiled_program(self.instruction_list, format_trace_line, HALT)
+            if compiled_blocks is None:
+                engine = 'blocks' if fast_forward_loops or counting_only else 'interpreter'
+            else:
+                block_engine = self.get_block_engine(render_trace_fields=False)
+                for block_start, block_function in compiled_blocks.items():
+                    block_engine.add_translated_block(block_start, block_function)
+
+        # Counted loops are fast-forwarded at block boundaries, so only the block engine can do it
+        if fast_forward_loops:
+            if engine == 'interpreter':
+                raise ValueError("Loop fast-forwarding needs the blocks or compiled engine")
+            block_engine = self.get_block_engine()
+            if block_engine.loop_accelerator is None:
+                from LoopAccelerator import LoopAccelerator
+                block_engine.loop_accelerator = LoopAccelerator(self.decoded_program, self.trace_deltas, self.trace_steps)
+
+        if engine not in SIMULATION_ENGINES:
+            raise ValueError(f"Unknown engine: {engine}")
+        program_end_address = len(self.decoded_program) * 4
+        steps_left = sys.maxsize if max_steps is None else max_steps
+        counting_blocks = counting_only and engine != 'interpreter'
+        event_counts = self.performance_counters.event_counts if counting_blocks else None
+        while True:
+            # A long interpreter run stops at the rendering threshold and carries on through the renderer
+            reaching_rendering_threshold = False
+            if self.hooks is not None and self.hooks.is_active() and not counting_blocks:
+                # Observers must see every instruction, so hooked runs step one at a time
+                next_pc, steps_executed, halt_pc = self.hooks.run(self.decoded_program, self.registers, self.memory, trace_sink, self.pc, steps_left,
+                                                                  self.trace_deltas)
+            elif engine == 'interpreter' and self.trace_deltas:
+                next_pc, steps_executed, halt_pc = run_delta_program(self.decoded_program, self.registers, self.memory, trace_sink, self.pc, steps_left)
+            elif engine == 'interpreter' and self.trace_renderer is None and self.instructions_retired < TRACE_RENDERING_MINIMUM_STEPS:
+                plain_steps = TRACE_RENDERING_MINIMUM_STEPS - self.instructions_retired
+                reaching_rendering_threshold = steps_left > plain_steps
+                next_pc, steps_executed, halt_pc = run_decoded_program(self.decoded_program, self.registers, self.memory, trace_sink, self.pc,
+                                                                       min(steps_left, plain_steps))
+            elif engine == 'interpreter':
+                next_pc, steps_executed, halt_pc = run_rendered_program(self.decoded_program, self.registers, self.memory, trace_sink,
+                                                               self.get_trace_renderer(), self.pc, steps_left)
+            else:
+                block_engine = self.get_block_engine()
+                block_engine.event_counts = event_counts
+                next_pc, steps_executed, halt_pc = block_engine.run(self.registers, self.memory, trace_sink, self.pc, steps_left)
+
+            self.instructions_retired += steps_executed
+            steps_left -= steps_executed
+            if next_pc is HALT:
+                # The PC stays on the halting instruction
+                self.pc = halt_pc
+                self.halted = True
+                break
+            self.pc = next_pc
+
+            # Engines stop in front of counter reads and lr/sc, which run here
+            if (steps_left > 0 and 0 <= next_pc < program_end_address and not next_pc & 3
+                    and self.decoded_program[next_pc >> 2][0] in MACHINE_LEVEL_OPERATIONS):
+                self.execute_machine_level_instruction(trace_sink)
+                steps_left -= 1
+            elif not (reaching_rendering_threshold and self.instructions_retired >= TRACE_RENDERING_MINIMUM_STEPS):
+                break
+        return trace_sink
+
+    def format_memory_dump(self):
+        """Lines of the data memory dump written after the trace"""
+        return [f"0x{mem_address:08X}:0b{self.memory.load_word(mem_address):032b}\n"
+                for mem_address in range(STARTING_MEMORY_ADDRESS, ENDING_MEMORY_ADDRESS + 1, MEMORY_ADDRESS_INCREMENT)]
+
+def read_program_file(input_file_path):
+    """Program lines of a text program, or the uint32 word array of a .bin / hex image, which loads without a text round trip"""
+    if input_file_path.lower().endswith(PROGRAM_IMAGE_EXTENSIONS):
+        from ProgramLoader import read_binary_program, read_hex_program
+        if input_file_path.lower().endswith('.bin'):
+            return read_binary_program(input_file_path)
+        return read_hex_program(input_file_path)
+    with open(input_file_path, "r") as input_file:
+        return input_file.readlines()
+
+def parse_data_image_argument(argument):
+    """'FILE@ADDR' -> (file path, load address); ADDR may be decimal or 0x-prefixed hex"""
+    file_path, separator, address_text = argument.rpartition('@')
+    if not separator or not file_path:
+        raise ValueError(f"Data image must be given as FILE@ADDR: {argument}")
+    return file_path, int(address_text, 0)
+
+def simulate_program(instruction_list, output_file_path, engine='compiled', data_images=(), fast_forward_loops=False,
+                     max_steps=None, time_limit=None, checkpoint_path=None, checkpoint_interval=None, resume_path=None,
+                     execution_hooks=None, counter_events=(), summary_path=None,
+                     hart_count=1, hart_quantum=None, hart_traces=False, trace_buffer_lines=None, trace_flush_interval=None,
+                     trace_format='text'):
+    """Main simulation function: decode once, run the chosen engine under the watchdog, write the trace; returns why the run ended"""
+    from Watchdog import RUN_STEP_BUDGET, RUN_TIME_BUDGET, Watchdog
+
+    if trace_format not in TRACE_FORMATS:
+        raise ValueError(f"Unknown trace format: {trace_format}")
+    if trace_format != 'text' and (checkpoint_path is not None or resume_path is not None):
+        raise ValueError("Checkpointed runs write text traces")
+    if trace_format == 'final' and hart_count > 1:
+        raise ValueError("The final-state trace needs a single hart")
+    if hart_count > 1:
+        if checkpoint_path is not None or resume_path is not None or execution_hooks is not None:
+            raise ValueError("Checkpoints and execution hooks need a single hart")
+        from MultiHart import DEFAULT_HART_QUANTUM, MultiHartSystem
+
+        # Every hart runs the same program over one shared memory
+        shared_memory = PagedMemory()
+        harts = []
+        for hart_id in range(hart_count):
+            hart = Machine(shared_memory, hart_id)
+            hart.load_program(instruction_list)
+            harts.append(hart)
+        machine = MultiHartSystem(harts, hart_quantum or DEFAULT_HART_QUANTUM, hart_traces)
+    else:
+        machine = Machine()
+        machine.load_program(instruction_list)
+        # Observers registered on an ExecutionHooks (see Machine.get_hooks) watch the run live
+        machine.hooks = execution_hooks
+        harts = [machine]
+    # hpmcounter events, as (counter number, event name) pairs
+    for hart in harts:
+        for counter_number, event_name in counter_events:
+            hart.get_performance_counters().configure_event(counter_number, event_name, hart.get_hooks())
+
+    # Map preloaded data images (copy-on-write) before the program starts
+    for image_path, image_address in data_images:
+        machine.memory.map_file(image_path, image_address)
+
+    # Runaway programs are stopped by the budgets or livelock detection; whatever
+    # was traced up to that point is still written out below
+    simulation_output = []
+    watchdog = Watchdog(max_steps, time_limit)
+
+    trace_writer_options = {}
+    if trace_format == 'binary':
+        from BinaryTrace import BinaryTraceWriter as TraceWriter
+        if hart_count == 1:
+            # The engines record deltas for the writer to pack; interleaved
+            # harts' lines are still re-encoded from text
+            machine.trace_deltas = True
+            trace_writer_options['delta_registers'] = list(machine.registers)
+    elif trace_format == 'final':
+        from TraceWriter import FinalStateWriter as TraceWriter
+        # Deltas are the cheapest records to throw away
+        machine.trace_deltas = True
+        machine.trace_steps = False
+        trace_writer_options['machine'] = machine
+    else:
+        from TraceWriter import TraceWriter
+
+    if checkpoint_path is not None or resume_path is not None:
+        from Checkpoint import CheckpointedTrace, load_checkpoint
+
+        # Checkpointed runs stream the trace like any other and record in each
+        # checkpoint how far it was written; resuming carries on from the
+        # checkpoint's state and trace position
+        trace_resume_point = load_checkpoint(resume_path, machine) if resume_path is not None else None
+        trace_writer = TraceWriter(output_file_path, simulation_output, trace_buffer_lines, trace_flush_interval,
+                                   resume_point=trace_resume_point)
+        checkpointed_trace = CheckpointedTrace(trace_writer, checkpoint_path or resume_path, checkpoint_interval)
+        run_end_reason = watchdog.run(machine, simulation_output, after_slice=checkpointed_trace.after_slice,
+                                      engine=engine, fast_forward_loops=fast_forward_loops)
+        if run_end_reason in (RUN_STEP_BUDGET, RUN_TIME_BUDGET):
+            # Out of budget but not stuck: leave a checkpoint to carry on from
+            checkpointed_trace.save(machine)
+        checkpointed_trace.finish(machine.format_memory_dump())
+    else:
+        # The trace streams to the file between watchdog slices, so memory use
+        # stays flat however long the run; per-hart streams (each hart's own
+        # lines in the single-hart format) are written the same way
+        trace_writers = [TraceWriter(output_file_path, simulation_output, trace_buffer_lines, trace_flush_interval,
+                                     **trace_writer_options)]
+        if hart_count > 1 and hart_traces:
+            for hart, hart_trace_lines in zip(harts, machine.hart_traces):
+                trace_writers.append(TraceWriter(f"{output_file_path}.hart{hart.hart_id}", hart_trace_lines,
+                                                 trace_buffer_lines, trace_flush_interval))
+
+        def write_traces(machine):
+            for trace_writer in trace_writers:
+                trace_writer.after_slice(machine)
+
+        try:
+            run_end_reason = watchdog.run(machine, simulation_output, after_slice=write_traces,
+                                          engine=engine, fast_forward_loops=fast_forward_loops)
+        except Exception:
+            # A failed run leaves no output, as before streaming
+            for trace_writer in trace_writers:
+                trace_writer.abandon()
+            raise
+
+        # Memory dump after the trace, then the files are complete
+        memory_dump_lines = harts[0].format_memory_dump()
+        for trace_writer in trace_writers:
+            trace_writer.finish(memory_dump_lines)
+
+    # Counter summary goes to its own file so the graded trace is unchanged
+    if summary_path is not None:
+        if hart_count > 1:
+            summary_lines = [f"stop reason: {run_end_reason}\n"]
+            for hart in harts:
+                summary_lines += [f"hart{hart.hart_id} {summary_line}" for summary_line in
+                                  hart.get_performance_counters().format_summary(hart.instructions_retired)]
         else:
-            simulation_output += "0b" + format(int(pc_value), "032b") + " "
-        
-        # Ensure zero register stays zero
-        register_current_values['00000'] = "0" * 32
-        
-        # Add register values to output
-        for reg_code in register_current_values.keys():
-            simulation_output += "0b" + register_current_values[reg_code] + " "
-        
-        simulation_output += "\n"
+            summary_lines = machine.get_performance_counters().format_summary(machine.instructions_retired, run_end_reason)
+        if summary_path == '-':
+            sys.stderr.write("".join(summary_lines))
+        else:
+            with open(summary_path, "w") as summary_file:
+                summary_file.write("".join(summary_lines))
+    return run_end_reason
 
-    # Add memory dump to output
-    for mem_address in range(65536, 65660 + 1, 4):
-        mem_address_hex = f"0x{mem_address:08X}"
-        simulation_output += f"{mem_address_hex}:0b{format(memory_data_storage[mem_address_hex], '032b')}\n"
+def simulate_batch(instruction_lists, output_file_paths, data_images=(), max_steps=None):
+    """Run many programs (or copies of one) in lock step with the NumPy batch engine; returns each run's end reason"""
+    from BatchEngine import LockStepBatch
+    from Watchdog import RUN_HALTED, RUN_LEFT_PROGRAM, RUN_STEP_BUDGET
 
-    # Write output to file
-    with open(output_file_path, "w") as output_file:
-        output_file.write(simulation_output.strip())
+    batch = LockStepBatch(instruction_lists, decode_instruction, format_trace_line)
+    # Same images in every machine; batch.registers / batch.memory_words can be
+    # filled in per machine before run() for different inputs
+    for image_path, image_address in data_images:
+        for machine_index in range(len(instruction_lists)):
+            batch.load_data_image(machine_index, image_path, image_address)
+    batch.run(max_steps)
+
+    run_end_reasons = []
+    for machine_index, machine_trace_lines in enumerate(batch.trace_lines()):
+        if batch.errors[machine_index] is not None:
+            # Like simulate_program raising: no output file, the error is the reason
+            run_end_reasons.append(batch.errors[machine_index])
+            continue
+        memory_dump_lines = [f"0x{mem_address:08X}:0b{batch.memory_word(machine_index, mem_address):032b}\n"
+                             for mem_address in range(STARTING_MEMORY_ADDRESS, ENDING_MEMORY_ADDRESS + 1, MEMORY_ADDRESS_INCREMENT)]
+        with open(output_file_paths[machine_index], "w") as output_file:
+            output_file.write("".join(machine_trace_lines + memory_dump_lines).strip())
+        if batch.halted[machine_index]:
+            run_end_reasons.append(RUN_HALTED)
+        elif batch.running[machine_index]:
+            run_end_reasons.append(RUN_STEP_BUDGET)
+        else:
+            run_end_reasons.append(RUN_LEFT_PROGRAM)
+    return run_end_reasons
 
 if __name__ == "__main__":
-    input_file_path = sys.argv[1]
-    output_file_path = sys.argv[2]
+    # Positional arguments: input file (text, or a .bin / .hex / .ihex / .mem
+    # program image), output file (the grader also passes a
+    # readable-trace path, which is ignored); options: --engine=NAME,
+    # --fast-forward-loops, --max-steps=N, --time-limit=SECONDS,
+    # --checkpoint=FILE, --checkpoint-every=N, --resume=FILE,
+    # --hpm-event=N:EVENT (hpmcounterN counts EVENT), --summary=FILE (counter
+    # summary, '-' for stderr), --harts=N (harts sharing memory), --hart-quantum=N,
+    # --hart-traces (also write OUTPUT.hartN per hart), --trace-buffer=LINES
+    # (trace lines held before being written), --trace-flush=SECONDS,
+    # --trace-format=binary (packed delta trace, see BinaryTrace.py) or final (only
+    # the final state line and the memory dump), --verify (report every
+    # illegal instruction before running), --cfg=FILE (basic blocks, '-' for
+    # stdout) and any number of --data-image FILE@ADDR. With --batch the positional arguments are
+    # input/output pairs, all run together on the NumPy lock-step engine
+    usage_message = ("Usage: python3 Simulator5.py input_machine_code_file output_trace_file"
+                     " [--engine=" + "|".join(SIMULATION_ENGINES) + "] [--fast-forward-loops]"
+                     " [--max-steps=N] [--time-limit=SECONDS] [--checkpoint=FILE] [--checkpoint-every=N]"
+                     " [--resume=FILE] [--hpm-event=N:EVENT ...] [--summary=FILE|-] [--harts=N] [--hart-quantum=N]"
+                     " [--hart-traces] [--trace-buffer=LINES] [--trace-flush=SECONDS] [--trace-format=text|binary|final] [--verify] [--cfg=FILE|-] [--data-image FILE@ADDR ...]\n"
+                     "       python3 Simulator5.py --batch input_file output_file [input_file output_file ...]"
+                     " [--max-steps=N] [--data-image FILE@ADDR ...]")
+    positional_arguments = []
+    selected_engine = 'compiled'
+    fast_forward_loops = False
+    run_as_batch = False
+    max_steps = None
+    time_limit = None
+    checkpoint_path = None
+    checkpoint_interval = None
+    resume_path = None
+    counter_events = []
+    summary_path = None
+    hart_count = 1
+    hart_quantum = None
+    hart_traces = False
+    trace_buffer_lines = None
+    trace_flush_interval = None
+    trace_format = 'text'
+    verify_before_running = False
+    control_flow_graph_path = None
+    data_images = []
+    command_line_arguments = sys.argv[1:]
+    try:
+        while command_line_arguments:
+            argument = command_line_arguments.pop(0)
+            if argument.startswith('--engine='):
+                selected_engine = argument[len('--engine='):]
+            elif argument.startswith('--data-image='):
+                data_images.append(parse_data_image_argument(argument[len('--data-image='):]))
+            elif argument == '--fast-forward-loops':
+                fast_forward_loops = True
+            elif argument == '--batch':
+                run_as_batch = True
+            elif argument.startswith('--max-steps='):
+                max_steps = int(argument[len('--max-steps='):])
+            elif argument.startswith('--time-limit='):
+                time_limit = float(argument[len('--time-limit='):])
+            elif argument.startswith('--checkpoint='):
+                checkpoint_path = argument[len('--checkpoint='):]
+            elif argument.startswith('--checkpoint-every='):
+                checkpoint_interval = int(argument[len('--checkpoint-every='):])
+                if checkpoint_interval <= 0:
+                    raise ValueError(f"Checkpoint interval must be positive: {checkpoint_interval}")
+            elif argument.startswith('--resume='):
+                resume_path = argument[len('--resume='):]
+            elif argument.startswith('--hpm-event='):
+                from PerformanceCounters import parse_hpm_event_argument
+                counter_events.append(parse_hpm_event_argument(argument[len('--hpm-event='):]))
+            elif argument.startswith('--summary='):
+                summary_path = argument[len('--summary='):]
+            elif argument.startswith('--harts='):
+                hart_count = int(argument[len('--harts='):])
+                if hart_count <= 0:
+                    raise ValueError(f"Hart count must be positive: {hart_count}")
+            elif argument.startswith('--hart-quantum='):
+                hart_quantum = int(argument[len('--hart-quantum='):])
+                if hart_quantum <= 0:
+                    raise ValueError(f"Hart quantum must be positive: {hart_quantum}")
+            elif argument == '--hart-traces':
+                hart_traces = True
+            elif argument.startswith('--trace-buffer='):
+                trace_buffer_lines = int(argument[len('--trace-buffer='):])
+                if trace_buffer_lines <= 0:
+                    raise ValueError(f"Trace buffer must be positive: {trace_buffer_lines}")
+            elif argument.startswith('--trace-flush='):
+                trace_flush_interval = float(argument[len('--trace-flush='):])
+            elif argument.startswith('--trace-format='):
+                trace_format = argument[len('--trace-format='):]
+                if trace_format not in TRACE_FORMATS:
+                    raise ValueError(f"Unknown trace format: {trace_format}")
+            elif argument == '--verify':
+                verify_before_running = True
+            elif argument.startswith('--cfg='):
+                control_flow_graph_path = argument[len('--cfg='):]
+            elif argument == '--data-image':
+                data_images.append(parse_data_image_argument(command_line_arguments.pop(0) if command_line_arguments else ''))
+            else:
+                positional_arguments.append(argument)
+    except ValueError as error:
+        print(error)
+        print(usage_message)
+        sys.exit(1)
     
-    with open(input_file_path, "r") as input_file:
-        instructions_to_execute = input_file.readlines()
+    if len(positional_arguments) < 2 or selected_engine not in SIMULATION_ENGINES or (fast_forward_loops and selected_engine == 'interpreter'):
+        print(usage_message)
+        sys.exit(1)
+    
+    if run_as_batch:
+        if len(positional_arguments) % 2:
+            print(usage_message)
+            sys.exit(1)
+        batch_programs = []
+        for input_file_path in positional_arguments[0::2]:
+            batch_programs.append(read_program_file(input_file_path))
+        from Watchdog import RUN_EXIT_STATUSES
+        batch_end_reasons = simulate_batch(batch_programs, positional_arguments[1::2], data_images, max_steps)
+        batch_exit_status = 0
+        for input_file_path, run_end_reason in zip(positional_arguments[0::2], batch_end_reasons):
+            if run_end_reason not in RUN_EXIT_STATUSES:
+                print(f"{input_file_path}: {run_end_reason}")
+                batch_exit_status = 1
+            elif RUN_EXIT_STATUSES[run_end_reason]:
+                print(f"{input_file_path}: stopped, {run_end_reason}", file=sys.stderr)
+                batch_exit_status = batch_exit_status or RUN_EXIT_STATUSES[run_end_reason]
+        sys.exit(batch_exit_status)
+    
+    input_file_path = positional_arguments[0]
+    output_file_path = positional_arguments[1]
+    if checkpoint_interval is not None and checkpoint_path is None and resume_path is None:
+        checkpoint_path = output_file_path + ".checkpoint"
+    
+    try:
+        instructions_to_execute = read_program_file(input_file_path)
+    except ValueError as error:
+        # Malformed .bin / hex image
+        print(error)
+        sys.exit(1)
     
-    simulate_program(instructions_to_execute, output_file_path)
\ No newline at end of file
+    # Load-time pass over the whole program; the engines themselves only fail
+    # on an illegal instruction once it is reached
+    if verify_before_running or control_flow_graph_path is not None:
+        from ProgramVerifier import ControlFlowGraph, format_program_issues, verify_program
+        program_lines = instructions_to_execute
+        if is_program_image(instructions_to_execute):
+            from ProgramLoader import format_text_program
+            program_lines = format_text_program(instructions_to_execute)
+        program_issues = verify_program(program_lines, decode_instruction)
+        if verify_before_running and program_issues:
+            print("".join(format_program_issues(program_issues)), end="")
+            sys.exit(1)
+        if control_flow_graph_path is not None:
+            graph_lines = ControlFlowGraph(decode_program(program_lines)).format_lines()
+            if control_flow_graph_path == '-':
+                sys.stdout.write("".join(graph_lines))
+            else:
+                with open(control_flow_graph_path, "w") as graph_file:
+                    graph_file.write("".join(graph_lines))
+    
+    from Watchdog import RUN_EXIT_STATUSES, RUN_LIVELOCK, RUN_STEP_BUDGET, RUN_TIME_BUDGET
+    
+    try:
+        run_end_reason = simulate_program(instructions_to_execute, output_file_path, selected_engine, data_images,
+                                          fast_forward_loops, max_steps, time_limit,
+                                          checkpoint_path, checkpoint_interval, resume_path,
+                                          counter_events=counter_events, summary_path=summary_path,
+                                          hart_count=hart_count, hart_quantum=hart_quantum, hart_traces=hart_traces,
+                                          trace_buffer_lines=trace_buffer_lines, trace_flush_interval=trace_flush_interval,
+                                          trace_format=trace_format)
+    except ValueError as error:
+        # Unusable checkpoint (wrong program or not a checkpoint file) or
+        # options that do not go together
+        print(error)
+        sys.exit(1)
+    if checkpoint_path is not None or resume_path is not None:
+        resume_hint = f"; resume with --resume={checkpoint_path or resume_path}"
+    else:
+        resume_hint = ""
+    if run_end_reason == RUN_STEP_BUDGET:
+        print(f"Stopped: instruction budget of {max_steps} used up; partial trace written to {output_file_path}{resume_hint}", file=sys.stderr)
+    elif run_end_reason == RUN_TIME_BUDGET:
+        print(f"Stopped: time limit of {time_limit} s reached; partial trace written to {output_file_path}{resume_hint}", file=sys.stderr)
+    elif run_end_reason == RUN_LIVELOCK:
+        print(f"Stopped: livelock detected (machine state repeats); partial trace written to {output_file_path}", file=sys.stderr)
+    sys.exit(RUN_EXIT_STATUSES[run_end_reason])
\ No newline at end of file
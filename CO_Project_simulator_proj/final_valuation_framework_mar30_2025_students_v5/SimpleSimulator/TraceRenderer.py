@@ -0,0 +1,46 @@
+# Trace-line rendering from a table of 16-bit binary strings
+#
+# A trace line is 33 fields "0b<32 binary digits> " (PC, then x0..x31) and a
+# newline. format_trace_line renders all 33 numbers for every line, although an
+# instruction changes at most one register. A TraceRenderer keeps the rendered
+# fields of one register file in a list; after each instruction an engine
+# re-renders only the PC and the destination register, each from two lookups
+# in BINARY_HALFWORDS (all 65,536 16-bit binary strings), and joins the list.
+# Lines are byte for byte what format_trace_line gives.
+#
+# Building the table takes a few milliseconds, so Simulator5 only uses it once
+# a run has gone on long enough to pay for it.
+
+_BINARY_BYTES = [f"{byte_value:08b}" for byte_value in range(256)]
+BINARY_HALFWORDS = [high_byte + low_byte for high_byte in _BINARY_BYTES for low_byte in _BINARY_BYTES]
+
+NUMBER_OF_REGISTERS = 32
+
+def render_field(value):
+    """'0b<32 digits> ' for a 32-bit value; anything else (a PC that left the address space) goes through format"""
+    if value >> 32:
+        return f"0b{value:032b} "
+    return f"0b{BINARY_HALFWORDS[value >> 16]}{BINARY_HALFWORDS[value & 0xFFFF]} "
+
+def field_expression(value_expression):
+    """Source of an expression rendering a register value (always 32-bit) the way render_field does"""
+    return f'f"0b{{BINARY_HALFWORDS[{value_expression} >> 16]}}{{BINARY_HALFWORDS[{value_expression} & 0xFFFF]}} "'
+
+class TraceRenderer:
+    """Rendered trace-line fields for one register file: [PC, x0 .. x31, newline]"""
+
+    binary_halfwords = BINARY_HALFWORDS
+    render_field = staticmethod(render_field)
+
+    def __init__(self):
+        self.fields = [render_field(0)] * (NUMBER_OF_REGISTERS + 1) + ["\n"]
+
+    def render_registers(self, registers):
+        """Re-render every register field, after registers changed behind the renderer's back"""
+        self.fields[1:NUMBER_OF_REGISTERS + 1] = map(render_field, registers)
+
+    def render_line(self, pc, registers):
+        """A whole trace line, the same as format_trace_line(pc, *registers)"""
+        self.render_registers(registers)
+        self.fields[0] = render_field(pc)
+        return "".join(self.fields)
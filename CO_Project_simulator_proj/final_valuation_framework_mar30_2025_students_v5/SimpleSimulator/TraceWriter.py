@@ -0,0 +1,125 @@
+# Streaming trace output with bounded memory
+#
+# The engines append trace lines to a plain list (the fastest sink they can
+# have). Between Watchdog slices the TraceWriter moves those lines to the
+# output file once at least buffer_lines have built up, so memory use is set
+# by the buffer size and the slice length whatever the length of the run. The
+# file itself is flushed to the operating system every flush_interval seconds,
+# so a run that dies leaves the trace up to roughly that point on disk.
+#
+# The file ends up byte for byte what "".join(all lines).strip() gave: leading
+# whitespace is never written and trailing whitespace is held back until more
+# text follows it, so whatever is left over when the writer finishes is dropped.
+#
+# FinalStateWriter is the trace-off counterpart: it drops the engines' records
+# and writes only the line for the machine's final state and the memory dump.
+#
+# sync() gives the point a checkpoint records: the file position after the
+# text written so far and the whitespace still held back. A writer created
+# with that resume_point truncates the file there and carries on as if the
+# run had never stopped; it refuses a trace file that is gone or shorter.
+
+import os
+import time
+
+TRACE_BUFFER_LINES = 8192        # lines collected before they are written out
+TRACE_FLUSH_INTERVAL = 1.0       # seconds between flushes to the operating system
+
+class TraceWriter:
+    """Trace lines written to output_file_path as they are produced, with the output of .strip()"""
+
+    def __init__(self, output_file_path, trace_lines, buffer_lines=None, flush_interval=None, file_buffer_size=-1,
+                 resume_point=None):
+        self.output_file_path = output_file_path
+        self.trace_lines = trace_lines
+        self.buffer_lines = TRACE_BUFFER_LINES if buffer_lines is None else buffer_lines
+        self.flush_interval = TRACE_FLUSH_INTERVAL if flush_interval is None else flush_interval
+        self.last_flush_time = time.monotonic()
+        # Nothing but whitespace written so far / whitespace not yet written
+        self.at_start = True
+        self.pending_whitespace = ""
+        if resume_point is None:
+            self.output_file = open(output_file_path, "w", buffering=file_buffer_size)
+        else:
+            # Drop whatever was written after the resume point
+            file_position, self.pending_whitespace = resume_point
+            if not os.path.isfile(output_file_path):
+                raise ValueError(f"Cannot resume: the trace written before the checkpoint is missing: {output_file_path}")
+            if os.path.getsize(output_file_path) < file_position:
+                raise ValueError(f"Cannot resume: the trace is shorter than when the checkpoint was saved: {output_file_path}")
+            self.output_file = open(output_file_path, "r+", buffering=file_buffer_size)
+            self.output_file.seek(file_position)
+            self.output_file.truncate()
+            self.at_start = file_position == 0
+
+    def write_text(self, text):
+        if self.at_start:
+            text = text.lstrip()
+            if not text:
+                return
+            self.at_start = False
+        content = text.rstrip()
+        if content:
+            self.output_file.write(self.pending_whitespace)
+            self.output_file.write(content)
+            self.pending_whitespace = text[len(content):]
+        else:
+            self.pending_whitespace += text
+
+    def write_buffered(self):
+        """Write out and clear the buffered trace lines"""
+        if self.trace_lines:
+            self.write_text("".join(self.trace_lines))
+            self.trace_lines.clear()
+
+    def after_slice(self, machine=None):
+        """Watchdog callback: write the buffer once it is full, flush the file every flush_interval seconds"""
+        if len(self.trace_lines) >= self.buffer_lines:
+            self.write_buffered()
+        if time.monotonic() - self.last_flush_time >= self.flush_interval:
+            self.output_file.flush()
+            self.last_flush_time = time.monotonic()
+
+    def sync(self):
+        """Write out the buffered lines and flush the file; returns the resume point (file position, held-back whitespace)"""
+        self.write_buffered()
+        self.output_file.flush()
+        self.last_flush_time = time.monotonic()
+        return self.output_file.tell(), self.pending_whitespace
+
+    def finish(self, final_lines=()):
+        """Write the rest of the trace and final_lines and close the file"""
+        self.write_buffered()
+        self.write_text("".join(final_lines))
+        self.output_file.close()
+
+    def abandon(self):
+        """Close and remove the file, for a run that failed"""
+        self.output_file.close()
+        os.remove(self.output_file_path)
+
+class FinalStateWriter:
+    """Trace off: only machine's final trace line and the final_lines go to output_file_path; used like a TraceWriter"""
+
+    def __init__(self, output_file_path, trace_lines, buffer_lines=None, flush_interval=None, machine=None):
+        self.output_file_path = output_file_path
+        self.trace_lines = trace_lines
+        self.machine = machine
+
+    def after_slice(self, machine=None):
+        """Watchdog callback: drop the records of the slice"""
+        self.trace_lines.clear()
+
+    def finish(self, final_lines=()):
+        """Write the final state line (if anything ran) and final_lines"""
+        from Simulator5 import format_trace_line
+
+        machine = self.machine
+        # The PC is the next one, or the halting instruction's, as on the last trace line
+        state_lines = [format_trace_line(machine.pc, *machine.registers)] if machine.instructions_retired else []
+        with open(self.output_file_path, "w") as output_file:
+            output_file.write("".join(state_lines + list(final_lines)).strip())
+
+    def abandon(self):
+        """Nothing was written yet"""
+        self.trace_lines.clear()
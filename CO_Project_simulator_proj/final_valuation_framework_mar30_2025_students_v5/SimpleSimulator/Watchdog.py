@@ -0,0 +1,95 @@
+# Instruction/time budget watchdog for Machine (or MultiHartSystem) runs
+#
+# The machine is run in slices of WATCHDOG_SLICE_STEPS instructions. Between
+# slices the watchdog checks the instruction and wall-time budgets and looks for
+# a livelock: the whole machine state (PC, registers and memory) repeating, which
+# means the program can never make progress again. Repeats are found with
+# Brent's cycle detection over the states seen at slice boundaries, so only a
+# logarithmic number of states is ever saved. Only pages that have been stored
+# to are saved and compared; pages that were only mapped (data images) or read
+# are the same in every state. A page first written after a state was saved
+# makes the states differ, which can only delay finding a livelock until every
+# page of the cycle has been written once.
+
+import time
+
+WATCHDOG_SLICE_STEPS = 4096
+
+# Reasons a watched run ends
+RUN_HALTED = 'halted'                     # virtual halt (beq zero,zero,0) reached
+RUN_LEFT_PROGRAM = 'left_program'         # PC moved outside the program
+RUN_STEP_BUDGET = 'step_budget'           # instruction budget used up
+RUN_TIME_BUDGET = 'time_budget'           # wall-time budget used up
+RUN_LIVELOCK = 'livelock'                 # machine state repeats; it will never finish
+
+# Process exit status for each reason (1 is taken by usage errors)
+RUN_EXIT_STATUSES = {
+    RUN_HALTED: 0,
+    RUN_LEFT_PROGRAM: 0,
+    RUN_STEP_BUDGET: 2,
+    RUN_TIME_BUDGET: 3,
+    RUN_LIVELOCK: 4,
+}
+
+class Watchdog:
+
+    def __init__(self, max_steps=None, time_limit=None, detect_livelock=True, slice_steps=WATCHDOG_SLICE_STEPS):
+        self.max_steps = max_steps
+        self.time_limit = time_limit
+        self.detect_livelock = detect_livelock
+        self.slice_steps = slice_steps
+        # Filled in by run: why it stopped and, for a livelock, the PC it was caught at
+        self.reason = None
+        self.livelock_pc = None
+
+    def capture_state(self, machine):
+        return machine.capture_state()
+
+    def run(self, machine, trace_sink, after_slice=None, **run_options):
+        """Run machine under the budgets, appending to trace_sink and calling after_slice(machine) between slices; returns a RUN_* reason"""
+        start_time = time.monotonic()
+        steps_allowed = machine.instructions_retired + self.max_steps if self.max_steps is not None else None
+
+        # Brent's algorithm: compare each boundary state with one saved at a
+        # power-of-two distance back; memory is only compared when PC and
+        # registers already match
+        saved_state = None
+        saved_memory = None
+        cycle_power = 1
+        cycle_length = 0
+
+        while True:
+            if machine.halted:
+                self.reason = RUN_HALTED
+                break
+            if machine.left_program():
+                self.reason = RUN_LEFT_PROGRAM
+                break
+            if steps_allowed is not None and machine.instructions_retired >= steps_allowed:
+                self.reason = RUN_STEP_BUDGET
+                break
+            if self.time_limit is not None and time.monotonic() - start_time >= self.time_limit:
+                self.reason = RUN_TIME_BUDGET
+                break
+
+            if self.detect_livelock:
+                current_state = self.capture_state(machine)
+                if current_state == saved_state and machine.memory.written_pages_match(saved_memory):
+                    self.reason = RUN_LIVELOCK
+                    self.livelock_pc = machine.pc
+                    break
+                if saved_state is None or cycle_length == cycle_power:
+                    saved_state = current_state
+                    saved_memory = machine.memory.written_page_contents()
+                    cycle_power *= 2
+                    cycle_length = 0
+                cycle_length += 1
+
+            slice_steps = self.slice_steps
+            if steps_allowed is not None:
+                slice_steps = min(slice_steps, steps_allowed - machine.instructions_retired)
+            machine.run(trace_sink=trace_sink, max_steps=slice_steps, **run_options)
+            if after_slice is not None:
+                after_slice(machine)
+
+        return self.reason
@@ -0,0 +1,34 @@
+# Machine-code text lines for the programs the tests build
+
+HALT = "00000000000000000000000001100011\n"      # beq x0, x0, 0
+
+def encode_r(funct7, rs2, rs1, funct3, rd, opcode):
+    return f"{funct7:07b}{rs2:05b}{rs1:05b}{funct3:03b}{rd:05b}{opcode:07b}\n"
+
+def encode_i(immediate, rs1, funct3, rd, opcode):
+    return f"{immediate & 0xFFF:012b}{rs1:05b}{funct3:03b}{rd:05b}{opcode:07b}\n"
+
+def encode_s(immediate, rs2, rs1):
+    return f"{immediate >> 5 & 0x7F:07b}{rs2:05b}{rs1:05b}010{immediate & 0x1F:05b}0100011\n"
+
+def encode_b(offset, rs1, rs2, funct3):
+    offset &= 0x1FFF
+    return (f"{offset >> 12 & 1:01b}{offset >> 5 & 0x3F:06b}{rs2:05b}{rs1:05b}{funct3:03b}"
+            f"{offset >> 1 & 0xF:04b}{offset >> 11 & 1:01b}1100011\n")
+
+def encode_addi(rd, rs1, immediate):
+    return encode_i(immediate, rs1, 0b000, rd, 0b0010011)
+
+def encode_add(rd, rs1, rs2):
+    return encode_r(0, rs2, rs1, 0b000, rd, 0b0110011)
+
+def encode_bne(rs1, rs2, offset):
+    return encode_b(offset, rs1, rs2, 0b001)
+
+def encode_atomic(funct5, rs2, rs1, rd):
+    return encode_r(funct5 << 2, rs2, rs1, 0b010, rd, 0b0101111)
+
+def encode_jal(rd, offset):
+    offset &= 0x1FFFFF
+    return (f"{offset >> 20 & 1:01b}{offset >> 1 & 0x3FF:010b}{offset >> 11 & 1:01b}{offset >> 12 & 0xFF:08b}"
+            f"{rd:05b}1101111\n")
@@ -0,0 +1,69 @@
+# Machines run in lock step trace exactly like the scalar engine, whatever path each one takes
+
+import random
+
+import pytest
+
+from instruction_encoding import HALT, encode_add, encode_addi, encode_bne, encode_i, encode_r, encode_s
+from Simulator5 import simulate_batch, simulate_program
+from Watchdog import RUN_HALTED
+
+PROGRAM_COUNT = 12
+DATA_BASE_REGISTER = 20
+LOOP_REGISTER = 21
+
+# (funct7, funct3) of the R-type operations both engines run
+R_TYPE_OPERATIONS = [(0, 0b000), (0x20, 0b000), (0, 0b010), (0, 0b101), (0, 0b110), (0, 0b111)]
+R_TYPE_OPERATIONS += [(1, funct3) for funct3 in range(8)]       # RV32M
+
+def generate_program(seed):
+    """A loop of random ALU, RV32M, load and store instructions writing x5-x15; loop counts differ between seeds"""
+    generator = random.Random(seed)
+    program = [encode_addi(DATA_BASE_REGISTER, 0, 1024)] + [encode_add(DATA_BASE_REGISTER, DATA_BASE_REGISTER, DATA_BASE_REGISTER)] * 6
+    program += [encode_addi(rd, 0, generator.randrange(-2048, 2048)) for rd in range(5, 16)]
+    # Read-only operands for the divide edge cases: x16 = 0, x17 = -1, x18 = INT_MIN
+    program += [encode_addi(17, 0, -1), encode_addi(18, 0, 1)] + [encode_add(18, 18, 18)] * 31
+    program.append(encode_addi(LOOP_REGISTER, 0, generator.randrange(1, 9)))
+    loop_start = len(program)
+    for _ in range(generator.randrange(4, 16)):
+        rd, rs1, rs2 = generator.randrange(5, 16), generator.randrange(5, 19), generator.randrange(5, 19)
+        kind = generator.randrange(4)
+        if kind == 0:
+            funct7, funct3 = generator.choice(R_TYPE_OPERATIONS)
+            program.append(encode_r(funct7, rs2, rs1, funct3, rd, 0b0110011))
+        elif kind == 1:
+            program.append(encode_addi(rd, rs1, generator.randrange(-2048, 2048)))
+        elif kind == 2:
+            # Aligned and unaligned words in the dumped data area
+            program.append(encode_s(generator.randrange(0, 121), rs2, DATA_BASE_REGISTER))
+        else:
+            program.append(encode_i(generator.randrange(0, 121), DATA_BASE_REGISTER, 0b010, rd, 0b0000011))
+    program.append(encode_addi(LOOP_REGISTER, LOOP_REGISTER, -1))
+    program.append(encode_bne(LOOP_REGISTER, 0, (loop_start - len(program)) * 4))
+    program.append(HALT)
+    return program
+
+def test_batch_traces_match_scalar_engine(tmp_path):
+    programs = [generate_program(seed) for seed in range(PROGRAM_COUNT)]
+    batch_paths = [str(tmp_path / f"batch_{index}.txt") for index in range(PROGRAM_COUNT)]
+    assert simulate_batch(programs, batch_paths) == [RUN_HALTED] * PROGRAM_COUNT
+    for index, program in enumerate(programs):
+        scalar_path = tmp_path / f"scalar_{index}.txt"
+        assert simulate_program(program, str(scalar_path), engine='interpreter') == RUN_HALTED
+        assert open(batch_paths[index]).read() == scalar_path.read_text()
+
+def test_invalid_instruction_stops_only_its_machine(tmp_path):
+    # An all-zero word is not an instruction
+    broken_program = [encode_addi(5, 0, 1), "0" * 32 + "\n", HALT]
+    programs = [generate_program(0), broken_program, generate_program(1)]
+    batch_paths = [str(tmp_path / f"batch_{index}.txt") for index in range(len(programs))]
+    run_end_reasons = simulate_batch(programs, batch_paths)
+    assert run_end_reasons[0] == run_end_reasons[2] == RUN_HALTED
+    # The machine's end reason is the error the scalar engine raises
+    with pytest.raises(ValueError) as scalar_error:
+        simulate_program(broken_program, str(tmp_path / "broken.txt"), engine='interpreter')
+    assert run_end_reasons[1] == str(scalar_error.value)
+    for index in (0, 2):
+        scalar_path = tmp_path / f"scalar_{index}.txt"
+        simulate_program(programs[index], str(scalar_path), engine='interpreter')
+        assert open(batch_paths[index]).read() == scalar_path.read_text()
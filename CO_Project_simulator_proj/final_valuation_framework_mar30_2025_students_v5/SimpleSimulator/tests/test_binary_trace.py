@@ -0,0 +1,34 @@
+# Binary traces packed from the engines' deltas convert back to the text trace
+
+from BinaryTrace import convert_binary_trace, convert_text_trace
+from instruction_encoding import HALT, encode_addi, encode_bne, encode_s
+from Simulator5 import simulate_program
+
+LOOP_COUNT = 200
+
+# x5 = LOOP_COUNT; loop: x6 += 3; sw x6, 0(x0); x6 += 0 (unchanged register);
+# x5 -= 1; bne x5, x0, loop; halt
+STORING_LOOP_PROGRAM = [
+    encode_addi(5, 0, LOOP_COUNT),
+    encode_addi(6, 6, 3),
+    encode_s(0, 6, 0),
+    encode_addi(6, 6, 0),
+    encode_addi(5, 5, -1),
+    encode_bne(5, 0, -16),
+    HALT,
+]
+
+def test_binary_trace_matches_text_trace(tmp_path):
+    text_path = tmp_path / "trace.txt"
+    simulate_program(STORING_LOOP_PROGRAM, str(text_path), engine='interpreter')
+    for engine in ('interpreter', 'blocks'):
+        binary_path = tmp_path / f"{engine}.bin"
+        converted_path = tmp_path / f"{engine}.txt"
+        simulate_program(STORING_LOOP_PROGRAM, str(binary_path), engine=engine, trace_format='binary')
+        convert_binary_trace(str(binary_path), str(converted_path))
+        assert converted_path.read_bytes() == text_path.read_bytes()
+
+        # Encoding the text trace gives the very same file
+        reencoded_path = tmp_path / f"{engine}.reencoded.bin"
+        convert_text_trace(str(text_path), str(reencoded_path))
+        assert reencoded_path.read_bytes() == binary_path.read_bytes()
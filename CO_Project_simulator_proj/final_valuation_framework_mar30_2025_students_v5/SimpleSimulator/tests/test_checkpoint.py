@@ -0,0 +1,50 @@
+# Resuming from a checkpoint gives the same trace as an uninterrupted run
+
+import pytest
+
+from instruction_encoding import HALT, encode_addi, encode_bne, encode_i
+from Simulator5 import simulate_program
+from Watchdog import RUN_HALTED, RUN_STEP_BUDGET
+
+LOAD_COUNT = 20
+COUNTER_EVENTS = [(3, 'loads')]
+
+# x9 = LOAD_COUNT; loop: lw x5, 0(x0); x9 -= 1; bne x9, x0, loop;
+# csrr x6, hpmcounter3 (loads); halt
+COUNTED_LOADS_PROGRAM = [
+    encode_addi(9, 0, LOAD_COUNT),
+    encode_i(0, 0, 0b010, 5, 0b0000011),
+    encode_addi(9, 9, -1),
+    encode_bne(9, 0, -8),
+    encode_i(0xC03, 0, 0b010, 6, 0b1110011),
+    HALT,
+]
+
+def read_register(trace_line, register_number):
+    return int(trace_line.split()[register_number + 1], 0)
+
+def test_resumed_run_keeps_hpm_counts(tmp_path):
+    full_trace_path = tmp_path / "full.txt"
+    resumed_trace_path = tmp_path / "resumed.txt"
+    checkpoint_path = tmp_path / "run.checkpoint"
+
+    assert simulate_program(COUNTED_LOADS_PROGRAM, str(full_trace_path), engine='interpreter',
+                            counter_events=COUNTER_EVENTS) == RUN_HALTED
+    # Stop halfway through the loop, after some of the loads were counted
+    assert simulate_program(COUNTED_LOADS_PROGRAM, str(resumed_trace_path), engine='interpreter', max_steps=30,
+                            checkpoint_path=str(checkpoint_path), counter_events=COUNTER_EVENTS) == RUN_STEP_BUDGET
+    assert simulate_program(COUNTED_LOADS_PROGRAM, str(resumed_trace_path), engine='interpreter',
+                            resume_path=str(checkpoint_path), counter_events=COUNTER_EVENTS) == RUN_HALTED
+
+    full_trace_lines = full_trace_path.read_text().splitlines()
+    assert read_register(full_trace_lines[-33], 6) == LOAD_COUNT
+    assert resumed_trace_path.read_text() == full_trace_path.read_text()
+
+def test_resume_without_trace_file_is_refused(tmp_path):
+    trace_path = tmp_path / "trace.txt"
+    checkpoint_path = tmp_path / "run.checkpoint"
+    assert simulate_program(COUNTED_LOADS_PROGRAM, str(trace_path), engine='interpreter', max_steps=30,
+                            checkpoint_path=str(checkpoint_path)) == RUN_STEP_BUDGET
+    trace_path.unlink()
+    with pytest.raises(ValueError, match="Cannot resume"):
+        simulate_program(COUNTED_LOADS_PROGRAM, str(trace_path), engine='interpreter', resume_path=str(checkpoint_path))
@@ -0,0 +1,43 @@
+# The PC stays on the halting instruction, and the debugger keeps a bounded history
+
+from Debugger import Debugger
+from instruction_encoding import HALT, encode_addi, encode_bne
+from Simulator5 import Machine
+from Watchdog import RUN_HALTED
+
+LOOP_COUNT = 200
+HALT_PC = 12
+
+# x5 = LOOP_COUNT; loop: x5 -= 1; bne x5, x0, loop; halt
+COUNTDOWN_PROGRAM = [
+    encode_addi(5, 0, LOOP_COUNT),
+    encode_addi(5, 5, -1),
+    encode_bne(5, 0, -4),
+    HALT,
+]
+
+def test_halted_machine_points_at_halt():
+    for engine in ('interpreter', 'blocks'):
+        machine = Machine()
+        machine.load_program(COUNTDOWN_PROGRAM)
+        machine.run(engine=engine)
+        assert machine.halted and machine.pc == HALT_PC
+
+def test_debugger_continue_stops_at_halt():
+    machine = Machine()
+    machine.load_program(COUNTDOWN_PROGRAM)
+    assert Debugger(machine).continue_running() == RUN_HALTED
+    assert machine.pc == HALT_PC
+
+def test_snapshot_history_is_bounded():
+    machine = Machine()
+    machine.load_program(COUNTDOWN_PROGRAM)
+    debugger = Debugger(machine, snapshot_interval=16, history_depth=4)
+    debugger.continue_running()
+    assert len(debugger.snapshots) == len(debugger.snapshot_counts) == 4
+
+    # Going back stops at the oldest snapshot kept
+    oldest_count = debugger.snapshot_counts[0]
+    steps_back = debugger.reverse_step(machine.instructions_retired)
+    assert machine.instructions_retired == oldest_count
+    assert steps_back == 2 * LOOP_COUNT + 2 - oldest_count
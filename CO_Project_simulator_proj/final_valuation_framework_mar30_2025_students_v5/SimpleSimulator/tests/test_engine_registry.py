@@ -0,0 +1,21 @@
+# Registered engines either agree on the sample tests or say why they cannot run
+
+import os
+
+import pytest
+
+from EngineRegistry import SIMULATOR_DIRECTORY, UNSUPPORTED_ENGINES, compare_engines, run_engine
+
+TEST_DIRECTORY = os.path.join(SIMULATOR_DIRECTORY, "..", "automatedTesting", "tests", "bin", "simple")
+
+def test_unsupported_engines_refuse_to_run(tmp_path):
+    for engine_name, reason in UNSUPPORTED_ENGINES.items():
+        with pytest.raises(ValueError, match=reason):
+            run_engine(engine_name, os.path.join(TEST_DIRECTORY, "simple_1.txt"), str(tmp_path / "trace.txt"))
+
+def test_comparison_reports_unsupported_engines():
+    comparison_rows = compare_engines(TEST_DIRECTORY, ['simulator1', 'simulator4', 'interpreter'])
+    rows = {row[0]: row for row in comparison_rows}
+    assert rows['simulator1'][5] == [f"unsupported: {UNSUPPORTED_ENGINES['simulator1']}"]
+    for engine_name in ('simulator4', 'interpreter'):
+        assert rows[engine_name][1] == rows[engine_name][2] and not rows[engine_name][5]
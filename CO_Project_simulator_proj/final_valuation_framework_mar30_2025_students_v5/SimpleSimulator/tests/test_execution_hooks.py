@@ -0,0 +1,48 @@
+# Load and store hooks see every memory access, atomics included
+
+from instruction_encoding import HALT, encode_add, encode_addi, encode_atomic, encode_s
+from Simulator5 import Machine
+
+DATA_ADDRESS = 0x10000
+
+# x8 = DATA_ADDRESS; mem[x8] = 7; amoadd.w x7, x6 (5), (x8); lr.w x9, (x8);
+# sc.w x10, x6, (x8); halt
+ATOMICS_PROGRAM = (
+    [encode_addi(8, 0, 1024)]
+    + [encode_add(8, 8, 8)] * 6
+    + [encode_addi(5, 0, 7),
+       encode_s(0, 5, 8),
+       encode_addi(6, 0, 5),
+       encode_atomic(0b00000, 6, 8, 7),
+       encode_atomic(0b00010, 0, 8, 9),
+       encode_atomic(0b00011, 6, 8, 10),
+       HALT]
+)
+STORE_PC = 32
+AMOADD_PC = 40
+LR_PC = 44
+SC_PC = 48
+
+def run_hooked(engine):
+    machine = Machine()
+    machine.load_program(ATOMICS_PROGRAM)
+    loads = []
+    stores = []
+    hooks = machine.get_hooks()
+    hooks.on_load(lambda pc, address, value: loads.append((pc, address, value)))
+    hooks.on_store(lambda pc, address, value: stores.append((pc, address, value)))
+    performance_counters = machine.get_performance_counters()
+    performance_counters.configure_event(3, 'loads', hooks)
+    performance_counters.configure_event(4, 'stores', hooks)
+    machine.run(engine=engine)
+    return machine, loads, stores
+
+def test_atomics_call_load_and_store_hooks():
+    for engine in ('interpreter', 'blocks'):
+        machine, loads, stores = run_hooked(engine)
+        assert machine.halted
+        assert machine.registers[7] == 7 and machine.registers[9] == 12 and machine.registers[10] == 0
+        assert loads == [(AMOADD_PC, DATA_ADDRESS, 7), (LR_PC, DATA_ADDRESS, 12)]
+        assert stores == [(STORE_PC, DATA_ADDRESS, 7), (AMOADD_PC, DATA_ADDRESS, 12), (SC_PC, DATA_ADDRESS, 5)]
+        assert machine.performance_counters.event_counts['loads'] == 2
+        assert machine.performance_counters.event_counts['stores'] == 3
@@ -0,0 +1,43 @@
+# Fast-forwarded loops trace exactly like the block engine and end in the same state
+
+from instruction_encoding import HALT, encode_add, encode_addi, encode_bne
+from Simulator5 import Machine, simulate_program
+
+LOOP_COUNT = 1000
+
+# x5 = LOOP_COUNT; x8 = 5; loop: x6 += 3; x7 += x8; x5 -= 1; bne x5, x0, loop; halt
+COUNTED_LOOP_PROGRAM = [
+    encode_addi(5, 0, LOOP_COUNT),
+    encode_addi(8, 0, 5),
+    encode_addi(6, 6, 3),
+    encode_add(7, 7, 8),
+    encode_addi(5, 5, -1),
+    encode_bne(5, 0, -12),
+    HALT,
+]
+
+def test_fast_forwarded_trace_matches_blocks(tmp_path):
+    blocks_path = tmp_path / "blocks.txt"
+    fast_forward_path = tmp_path / "fast_forward.txt"
+    simulate_program(COUNTED_LOOP_PROGRAM, str(blocks_path), engine='blocks')
+    simulate_program(COUNTED_LOOP_PROGRAM, str(fast_forward_path), engine='blocks', fast_forward_loops=True)
+    assert fast_forward_path.read_bytes() == blocks_path.read_bytes()
+
+    # With the trace off only the final state line and the memory dump are written
+    final_path = tmp_path / "final.txt"
+    simulate_program(COUNTED_LOOP_PROGRAM, str(final_path), engine='blocks', fast_forward_loops=True, trace_format='final')
+    blocks_lines = blocks_path.read_text().split("\n")
+    trace_line_count = sum(line.startswith("0b") for line in blocks_lines)
+    assert final_path.read_text().split("\n") == blocks_lines[trace_line_count - 1:]
+
+def test_trace_off_jumps_to_exit_state():
+    machine = Machine()
+    machine.load_program(COUNTED_LOOP_PROGRAM)
+    machine.trace_deltas = True
+    machine.trace_steps = False
+    trace_deltas = machine.run(engine='blocks', fast_forward_loops=True)
+    assert machine.halted and machine.pc == 24
+    assert machine.instructions_retired == 2 + 4 * LOOP_COUNT + 1
+    assert machine.registers[5:9] == [0, 3 * LOOP_COUNT, 5 * LOOP_COUNT, 5]
+    # The loop left no per-step records behind
+    assert len(trace_deltas) < LOOP_COUNT
@@ -0,0 +1,58 @@
+# Harts racing on one shared word through AMOs and lr.w/sc.w never lose an update
+
+from instruction_encoding import HALT, encode_add, encode_addi, encode_atomic, encode_bne
+from MultiHart import MultiHartSystem
+from PagedMemory import PagedMemory
+from Simulator5 import Machine
+
+HART_COUNT = 3
+INCREMENT_COUNT = 50
+COUNTER_ADDRESS = 0x10000
+AMOADD, LR, SC = 0b00000, 0b00010, 0b00011
+
+# x8 = COUNTER_ADDRESS; x9 = INCREMENT_COUNT; x6 = 1
+SETUP = [encode_addi(8, 0, 1024)] + [encode_add(8, 8, 8)] * 6 + [encode_addi(9, 0, INCREMENT_COUNT), encode_addi(6, 0, 1)]
+# loop: amoadd.w x7, x6, (x8); x9 -= 1; bne x9, x0, loop; halt
+AMOADD_PROGRAM = SETUP + [encode_atomic(AMOADD, 6, 8, 7), encode_addi(9, 9, -1), encode_bne(9, 0, -8), HALT]
+# retry: lr.w x7, (x8); x7 += 1; sc.w x11, x7, (x8); x12 += x11 (failures);
+# bne x11, x0, retry; x9 -= 1; bne x9, x0, retry; halt
+LR_SC_PROGRAM = SETUP + [
+    encode_atomic(LR, 0, 8, 7),
+    encode_addi(7, 7, 1),
+    encode_atomic(SC, 7, 8, 11),
+    encode_add(12, 12, 11),
+    encode_bne(11, 0, -16),
+    encode_addi(9, 9, -1),
+    encode_bne(9, 0, -24),
+    HALT,
+]
+
+def run_harts(program, quantum, engine):
+    shared_memory = PagedMemory()
+    harts = []
+    for hart_id in range(HART_COUNT):
+        hart = Machine(shared_memory, hart_id)
+        hart.load_program(program)
+        harts.append(hart)
+    system = MultiHartSystem(harts, quantum)
+    system.run(engine=engine)
+    assert system.halted
+    return shared_memory.load_word(COUNTER_ADDRESS), harts
+
+def test_amoadd_race_loses_no_update():
+    for engine in ('interpreter', 'blocks'):
+        for quantum in (1, 2, 5, 64):
+            counter, harts = run_harts(AMOADD_PROGRAM, quantum, engine)
+            assert counter == HART_COUNT * INCREMENT_COUNT
+
+def test_interleaved_lr_sc_fails_and_retries():
+    for engine in ('interpreter', 'blocks'):
+        # Harts switching between lr.w and sc.w break each other's reservations
+        counter, harts = run_harts(LR_SC_PROGRAM, 1, engine)
+        assert counter == HART_COUNT * INCREMENT_COUNT
+        assert sum(hart.registers[12] for hart in harts) > 0
+
+        # A quantum long enough for the whole loop never interleaves them
+        counter, harts = run_harts(LR_SC_PROGRAM, 1 << 20, engine)
+        assert counter == HART_COUNT * INCREMENT_COUNT
+        assert [hart.registers[12] for hart in harts] == [0] * HART_COUNT
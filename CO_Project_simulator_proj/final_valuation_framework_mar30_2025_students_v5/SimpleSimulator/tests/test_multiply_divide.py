@@ -0,0 +1,55 @@
+# RV32M results in every engine, including division by zero and INT_MIN / -1
+
+from instruction_encoding import HALT, encode_r
+from Simulator5 import Machine
+
+MASK = 0xFFFFFFFF
+INT_MIN = 0x80000000
+
+# mul, mulh, mulhsu, mulhu, div, divu, rem, remu of x5 and x6 into x10-x17
+MULTIPLY_DIVIDE_PROGRAM = [encode_r(1, 6, 5, funct3, 10 + funct3, 0b0110011) for funct3 in range(8)] + [HALT]
+
+OPERAND_PAIRS = [
+    (7, 3), (-7 & MASK, 3), (7, -3 & MASK), (-7 & MASK, -3 & MASK),
+    (12345, 0), (-12345 & MASK, 0), (0, 0),
+    (INT_MIN, MASK), (INT_MIN, 1), (MASK, MASK), (0x7FFFFFFF, 0x7FFFFFFF), (INT_MIN, INT_MIN),
+    (0xDEADBEEF, 0x12345678),
+]
+
+def to_signed(value):
+    return value - (1 << 32) if value & INT_MIN else value
+
+def expected_results(first, second):
+    """mul ... remu of first and second as the RISC-V spec defines them"""
+    signed_first, signed_second = to_signed(first), to_signed(second)
+    if second == 0:
+        quotient, remainder = -1, signed_first
+        unsigned_quotient, unsigned_remainder = MASK, first
+    else:
+        quotient = abs(signed_first) // abs(signed_second)
+        if (signed_first < 0) != (signed_second < 0):
+            quotient = -quotient
+        remainder = signed_first - quotient * signed_second
+        unsigned_quotient, unsigned_remainder = first // second, first % second
+    return [value & MASK for value in (
+        first * second, signed_first * signed_second >> 32, signed_first * second >> 32, first * second >> 32,
+        quotient, unsigned_quotient, remainder, unsigned_remainder)]
+
+def run_operands(engine, first, second):
+    machine = Machine()
+    machine.load_program(MULTIPLY_DIVIDE_PROGRAM)
+    machine.registers[5], machine.registers[6] = first, second
+    machine.run(engine=engine)
+    assert machine.halted
+    return machine.registers[10:18]
+
+def test_edge_cases_follow_the_spec():
+    # Division by zero gives all ones and the dividend; INT_MIN / -1 overflows to INT_MIN remainder 0
+    assert expected_results(12345, 0)[4:] == [MASK, MASK, 12345, 12345]
+    assert expected_results(INT_MIN, MASK)[4:] == [INT_MIN, 0, 0, INT_MIN]
+    assert expected_results(-7 & MASK, 3)[4:] == [-2 & MASK, 0x55555553, -1 & MASK, 0]
+
+def test_every_engine_gives_spec_results():
+    for engine in ('interpreter', 'blocks', 'compiled'):
+        for first, second in OPERAND_PAIRS:
+            assert run_operands(engine, first, second) == expected_results(first, second), (engine, hex(first), hex(second))
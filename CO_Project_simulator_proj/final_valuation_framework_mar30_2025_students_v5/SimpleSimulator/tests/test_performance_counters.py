@@ -0,0 +1,67 @@
+# hpmcounter events are counted exactly on every engine, without stepping the translated ones
+
+from instruction_encoding import HALT, encode_add, encode_addi, encode_atomic, encode_b, encode_bne, encode_i, encode_jal, encode_s
+from PerformanceCounters import HPM_EVENTS
+from Simulator5 import Machine
+
+LOOP_COUNT = 30
+COUNTED_LOOP_COUNT = 100
+
+# x8 = 0x10000; x9 = LOOP_COUNT; x6 = 1
+# loop: lw x5, 0(x8); sw x6, 4(x8); amoadd.w x7, x6, (x8); jal x1, +8; (skipped);
+#       blt x9, x0, +8 (never taken); x9 -= 1; bne x9, x0, loop
+# x10 = COUNTED_LOOP_COUNT; countdown: x10 -= 1; bne x10, x0, countdown
+# lr.w x11, (x8); sc.w x12, x6, (x8); halt
+EVENTS_PROGRAM = [encode_addi(8, 0, 1024)] + [encode_add(8, 8, 8)] * 6 + [
+    encode_addi(9, 0, LOOP_COUNT),
+    encode_addi(6, 0, 1),
+    encode_i(0, 8, 0b010, 5, 0b0000011),
+    encode_s(4, 6, 8),
+    encode_atomic(0b00000, 6, 8, 7),
+    encode_jal(1, 8),
+    encode_addi(0, 0, 0),
+    encode_b(8, 9, 0, 0b100),
+    encode_addi(9, 9, -1),
+    encode_bne(9, 0, -28),
+    encode_addi(10, 0, COUNTED_LOOP_COUNT),
+    encode_addi(10, 10, -1),
+    encode_bne(10, 0, -4),
+    encode_atomic(0b00010, 0, 8, 11),
+    encode_atomic(0b00011, 6, 8, 12),
+    HALT,
+]
+# The halt is a taken branch too
+EXPECTED_EVENT_COUNTS = {
+    'loads': 2 * LOOP_COUNT + 1,
+    'stores': 2 * LOOP_COUNT + 1,
+    'taken_branches': LOOP_COUNT - 1 + COUNTED_LOOP_COUNT - 1 + 1,
+    'jumps': LOOP_COUNT,
+}
+
+def run_counted(engine, fast_forward_loops=False, observe_steps=False):
+    machine = Machine()
+    machine.load_program(EVENTS_PROGRAM)
+    hooks = machine.get_hooks()
+    performance_counters = machine.get_performance_counters()
+    for counter_number, event_name in enumerate(HPM_EVENTS, 3):
+        performance_counters.configure_event(counter_number, event_name, hooks)
+    if observe_steps:
+        hooks.on_step(lambda *step: None)
+    trace_lines = machine.run(engine=engine, fast_forward_loops=fast_forward_loops)
+    assert machine.halted
+    return machine, trace_lines
+
+def test_engines_count_the_same_events():
+    reference_machine, reference_lines = run_counted('interpreter')
+    assert reference_machine.performance_counters.event_counts == EXPECTED_EVENT_COUNTS
+    for engine, fast_forward_loops in (('blocks', False), ('blocks', True), ('compiled', False)):
+        machine, trace_lines = run_counted(engine, fast_forward_loops)
+        assert machine.performance_counters.event_counts == EXPECTED_EVENT_COUNTS, (engine, fast_forward_loops)
+        assert trace_lines == reference_lines
+        # Counting did not fall back to the step-by-step hooked loop
+        assert machine.block_engine.translated_blocks
+
+def test_other_observers_still_see_every_step():
+    machine, trace_lines = run_counted('blocks', observe_steps=True)
+    assert machine.performance_counters.event_counts == EXPECTED_EVENT_COUNTS
+    assert machine.block_engine is None
@@ -0,0 +1,58 @@
+# .bin and hex images load straight from their words and trace like the text program
+
+import pytest
+
+from instruction_encoding import HALT, encode_add, encode_addi, encode_bne
+from Simulator5 import is_program_image, read_program_file, simulate_program
+
+# x5 = 20; x8 = 5; loop: x6 += 3; x7 += x8; x5 -= 1; bne x5, x0, loop; halt
+LOOP_PROGRAM = [
+    encode_addi(5, 0, 20),
+    encode_addi(8, 0, 5),
+    encode_addi(6, 6, 3),
+    encode_add(7, 7, 8),
+    encode_addi(5, 5, -1),
+    encode_bne(5, 0, -12),
+    HALT,
+]
+PROGRAM_WORDS = [int(instruction_line, 2) for instruction_line in LOOP_PROGRAM]
+HALT_BYTES = int(HALT, 2).to_bytes(4, "little")
+
+def format_intel_hex_record(record_type, address, data):
+    record = bytes([len(data), address >> 8 & 0xFF, address & 0xFF, record_type]) + data
+    return ":" + (record + bytes([-sum(record) & 0xFF])).hex().upper() + "\n"
+
+def test_images_trace_like_text(tmp_path):
+    text_path = tmp_path / "program.txt"
+    text_path.write_text("".join(LOOP_PROGRAM))
+    binary_path = tmp_path / "program.bin"
+    binary_path.write_bytes(b"".join(word.to_bytes(4, "little") for word in PROGRAM_WORDS))
+    readmemh_path = tmp_path / "program.mem"
+    readmemh_path.write_text("@0\n" + "\n".join(f"{word:08x}" for word in PROGRAM_WORDS) + "\n")
+    intel_hex_path = tmp_path / "program.hex"
+    intel_hex_path.write_text(format_intel_hex_record(0x00, 0, binary_path.read_bytes())
+                              + format_intel_hex_record(0x01, 0, b""))
+
+    expected_path = tmp_path / "expected.txt"
+    simulate_program(read_program_file(str(text_path)), str(expected_path), engine='interpreter')
+    for image_path in (binary_path, readmemh_path, intel_hex_path):
+        program_words = read_program_file(str(image_path))
+        assert is_program_image(program_words) and program_words.tolist() == PROGRAM_WORDS
+        for engine in ('interpreter', 'blocks'):
+            trace_path = tmp_path / f"{image_path.name}.{engine}.txt"
+            simulate_program(program_words, str(trace_path), engine=engine)
+            assert trace_path.read_bytes() == expected_path.read_bytes()
+
+def test_far_hex_addresses_are_rejected(tmp_path):
+    # Extended linear address 0x1000_0000 would otherwise zero-fill 256 MiB
+    intel_hex_path = tmp_path / "far.hex"
+    intel_hex_path.write_text(format_intel_hex_record(0x04, 0, b"\x10\x00")
+                              + format_intel_hex_record(0x00, 0, HALT_BYTES)
+                              + format_intel_hex_record(0x01, 0, b""))
+    with pytest.raises(ValueError, match="past the program area"):
+        read_program_file(str(intel_hex_path))
+
+    readmemh_path = tmp_path / "far.mem"
+    readmemh_path.write_text("@4000000\n00000063\n")
+    with pytest.raises(ValueError, match="past the program area"):
+        read_program_file(str(readmemh_path))
@@ -0,0 +1,39 @@
+# Long interpreter runs switch to the TraceRenderer part way through one run() without changing the trace
+
+from instruction_encoding import HALT, encode_add, encode_addi, encode_bne, encode_s
+from Simulator5 import TRACE_RENDERING_MINIMUM_STEPS, Machine
+
+LOOP_COUNT = 1500
+
+# x8 = 0x10000; x9 = LOOP_COUNT; loop: x5 += 7; sw x5, 4(x8); x9 -= 1; bne x9, x0, loop; halt
+LOOP_PROGRAM = [encode_addi(8, 0, 1024)] + [encode_add(8, 8, 8)] * 6 + [
+    encode_addi(9, 0, LOOP_COUNT),
+    encode_addi(5, 5, 7),
+    encode_s(4, 5, 8),
+    encode_addi(9, 9, -1),
+    encode_bne(9, 0, -12),
+    HALT,
+]
+PROGRAM_STEPS = 8 + 4 * LOOP_COUNT + 1
+
+def run_machine(engine, max_steps=None):
+    machine = Machine()
+    machine.load_program(LOOP_PROGRAM)
+    return machine, machine.run(engine=engine, max_steps=max_steps)
+
+def test_single_long_run_switches_to_renderer():
+    assert PROGRAM_STEPS > TRACE_RENDERING_MINIMUM_STEPS
+    machine, trace = run_machine('interpreter')
+    assert machine.halted and machine.instructions_retired == PROGRAM_STEPS
+    assert machine.trace_renderer is not None
+    assert trace == run_machine('blocks')[1]
+
+def test_short_and_split_runs_trace_the_same():
+    machine, trace = run_machine('interpreter', max_steps=100)
+    assert machine.trace_renderer is None
+    # Runs ending at, just before and past the threshold
+    for split_steps in (TRACE_RENDERING_MINIMUM_STEPS - 1, TRACE_RENDERING_MINIMUM_STEPS, TRACE_RENDERING_MINIMUM_STEPS + 1):
+        machine, trace = run_machine('interpreter', max_steps=split_steps)
+        assert machine.instructions_retired == split_steps
+        trace = machine.run(trace_sink=trace, engine='interpreter')
+        assert machine.halted and trace == run_machine('blocks')[1]
@@ -0,0 +1,59 @@
+# Watchpoints stop right after the access, reporting its PC and the old and new values
+
+from Debugger import STOP_WATCHPOINT, Debugger
+from instruction_encoding import HALT, encode_add, encode_addi, encode_bne, encode_i, encode_s
+from Simulator5 import Machine
+from Watchdog import RUN_HALTED
+
+LOOP_COUNT = 20
+WATCHED_ADDRESS = 0x10008
+SETUP_STEPS = 8
+STORE_PC = 36
+LOAD_PC = 40
+
+# x8 = 0x10000; x9 = LOOP_COUNT; loop: x5 += 3; sw x5, 8(x8); lw x6, 8(x8);
+# x9 -= 1; bne x9, x0, loop; halt
+WATCHED_STORE_PROGRAM = [encode_addi(8, 0, 1024)] + [encode_add(8, 8, 8)] * 6 + [
+    encode_addi(9, 0, LOOP_COUNT),
+    encode_addi(5, 5, 3),
+    encode_s(8, 5, 8),
+    encode_i(8, 8, 0b010, 6, 0b0000011),
+    encode_addi(9, 9, -1),
+    encode_bne(9, 0, -16),
+    HALT,
+]
+
+def make_debugger():
+    machine = Machine()
+    machine.load_program(WATCHED_STORE_PROGRAM)
+    # Small snapshot interval so hits are found by replaying from a snapshot
+    return machine, Debugger(machine, snapshot_interval=16)
+
+def test_store_watchpoint_reports_every_store():
+    machine, debugger = make_debugger()
+    debugger.add_watchpoint(WATCHED_ADDRESS)
+    for iteration in range(LOOP_COUNT):
+        assert debugger.continue_running() == STOP_WATCHPOINT
+        assert debugger.watch_hits == [(STORE_PC, True, WATCHED_ADDRESS, 4, 3 * iteration, 3 * iteration + 3)]
+        assert machine.pc == STORE_PC + 4
+        assert machine.instructions_retired == SETUP_STEPS + 5 * iteration + 2
+    assert debugger.continue_running() == RUN_HALTED
+
+def test_load_watchpoint_on_part_of_a_word():
+    machine, debugger = make_debugger()
+    # One byte inside the stored word: the lw reading it stops, the sw does not
+    debugger.add_watchpoint(WATCHED_ADDRESS + 2, length=1, on_load=True, on_store=False)
+    assert debugger.continue_running() == STOP_WATCHPOINT
+    assert debugger.watch_hits == [(LOAD_PC, False, WATCHED_ADDRESS, 4, 3, 3)]
+    assert machine.pc == LOAD_PC + 4 and machine.registers[6] == 3
+
+def test_step_stops_at_watchpoint_and_unwatched_memory_runs_through():
+    machine, debugger = make_debugger()
+    debugger.add_watchpoint(WATCHED_ADDRESS)
+    assert debugger.step(100) == SETUP_STEPS + 2
+    assert debugger.watch_hits == [(STORE_PC, True, WATCHED_ADDRESS, 4, 0, 3)]
+
+    debugger.remove_watchpoint(WATCHED_ADDRESS)
+    debugger.add_watchpoint(WATCHED_ADDRESS + 4)
+    assert debugger.continue_running() == RUN_HALTED
+    assert debugger.watch_hits == []
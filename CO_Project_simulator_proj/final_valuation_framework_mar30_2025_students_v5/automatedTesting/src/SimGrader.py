@@ -19,10 +19,12 @@ class SimGrader(Grader):
 	TRACE_SIMPLE_DIR = "simple"
 
 
-	def __init__(self, verb, enable,operating_system):
+	def __init__(self, verb, enable,operating_system,engine=None):
 		super().__init__(verb, enable,operating_system)
 		self.enable = enable
 		self.operating_system = operating_system
+		# Simulator.py engine to grade; None runs its default
+		self.engine = engine
 		
 		if self.operating_system == 'linux':
 			self.SIM_RUN_DIR = "../SimpleSimulator/"
@@ -58,6 +60,8 @@ class SimGrader(Grader):
 				os.remove(output_trace_file) if os.path.exists(output_trace_file) else None; 
 				os.remove(output_read_trace_file) if os.path.exists(output_read_trace_file) else None;
 			command = python_command + machine_code_file + output_trace_file + output_read_trace_file
+			if self.engine is not None:
+				command += ' --engine=' + self.engine
 			os.system(command)
 			
 			
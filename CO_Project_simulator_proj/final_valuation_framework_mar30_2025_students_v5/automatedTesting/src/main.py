@@ -10,6 +10,7 @@ from Results import Results
 VERBOSE = False
 GRADE_ASSEMBLER = True
 GRADE_SIMULATOR = True
+SIMULATOR_ENGINE = None
 
 def printHelp():
 	print('----Please enter in correct format----')
@@ -18,6 +19,7 @@ def printHelp():
 	print("--no-sim to not grade simulator")
 	print("--linux for Linux operating system")
 	print("--windows for windows operating system")
+	print("--engine=NAME to grade one simulator engine (see Simulator.py --list-engines)")
 	print("Example_linux: $python3 src/main.py --linux --no-sim")
 	print("Example_windows: >python3 src\main.py --windows --no-sim")
 
@@ -26,6 +28,7 @@ def setupArgs():
 	global GRADE_ASSEMBLER
 	global GRADE_SIMULATOR
 	global OPERATING_SYSTEM
+	global SIMULATOR_ENGINE
 
 	if len(sys.argv) < 3:
 		printHelp()
@@ -40,6 +43,8 @@ def setupArgs():
 			GRADE_SIMULATOR = False
 		elif ((arg == "--linux") | (arg == "--windows")):
 			OPERATING_SYSTEM = arg[2:]
+		elif arg.startswith("--engine="):
+			SIMULATOR_ENGINE = arg[len("--engine="):]
 		else:
 			printHelp()
 			exit()
@@ -49,7 +54,7 @@ def main():
 	setupArgs()
 
 	asmGrader = AsmGrader(VERBOSE, GRADE_ASSEMBLER,OPERATING_SYSTEM)
-	simGrader = SimGrader(VERBOSE, GRADE_SIMULATOR,OPERATING_SYSTEM)
+	simGrader = SimGrader(VERBOSE, GRADE_SIMULATOR,OPERATING_SYSTEM,SIMULATOR_ENGINE)
 
 	asmRes = asmGrader.grade()
 	simRes = simGrader.grade()	